@@ -0,0 +1,216 @@
+"""Recency aging: recompute last_open_days from each user's last_seen time.
+
+A visit resets last_open_days to 0 and nothing else ever moves it, so
+without this job the model's recency input stays at 0 for users who stopped
+coming back. Every backend stores last_seen (epoch seconds) next to the
+counters: set to now on a visit, and back-dated by last_open_days when
+counters are put directly (signups, imports). age_activity() on a backend
+walks users in chunks, computes the day counts for a whole chunk at once
+with NumPy, and writes (and re-scores) only the rows whose value changed.
+Each write is conditional on last_seen not having moved since it was read,
+so a visit that lands mid-run is never overwritten with a stale count.
+
+Users stored before last_seen existed are back-dated the same way: SQLite
+files when the column is added, DynamoDB tables by running
+migrate_last_seen.py once.
+
+The memory backend ages itself from the app (ACTIVITY_AGING_INTERVAL), as
+does the state server. For SQLite and DynamoDB run this nightly, from cron
+or any single host:
+
+    python activity_aging.py [--backend dynamodb] [--segments 4] [--workers 8]
+    python activity_aging.py --backend sqlite --sqlite-path campaigns.db
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from dynamo_batch import with_retries
+from dynamo_scan import FEATURE_PROJECTION, SCAN_SEGMENTS, parallel_scan
+from event_log import events
+from scoring import DEFAULT_ACTIVITY, FEATURES, load_model
+from segment_index import SEGMENT_SHARDS, segment_attributes
+from storage import create_backend
+
+DAY = 86400
+
+# Seconds between runs of the in-process job
+AGING_INTERVAL = DAY
+
+# last_open_days of a user never seen; aging stops there too
+NEVER_SEEN_DAYS = DEFAULT_ACTIVITY["last_open_days"]
+
+# Concurrent conditional updates per DynamoDB aging run
+AGING_WORKERS = 8
+
+AGING_PROJECTION = FEATURE_PROJECTION + ", last_seen"
+
+
+def aged_days(last_seen, current, now):
+    """(days, changed) arrays for a chunk: last_open_days as of now, and where it differs from current.
+
+    last_seen is a float array with NaN for users never seen, who are left alone.
+    """
+    known = ~np.isnan(last_seen)
+    days = np.zeros(len(last_seen), dtype=np.int64)
+    days[known] = np.clip((now - last_seen[known]) // DAY, 0, NEVER_SEEN_DAYS)
+    return days, known & (days != current)
+
+
+def seen_at(activity, now):
+    """last_seen to store with directly-put counters, or None if the user was never seen."""
+    if activity.get("last_seen") is not None:
+        return float(activity["last_seen"])
+    days = activity.get("last_open_days")
+    if days is None:
+        return None
+    days = float(days)  # a Decimal when read through boto3
+    if days >= NEVER_SEEN_DAYS:
+        return None
+    return now - days * DAY
+
+
+# DynamoDB
+
+def age_table(activity_table, model, now, segments=SCAN_SEGMENTS, shards=SEGMENT_SHARDS, workers=AGING_WORKERS):
+    """Age every UserActivity item; returns {scanned, updated, skipped}.
+
+    Pages come from a parallel scan of users that have a last_seen. Changed
+    rows are re-scored and sent as conditional UpdateItems from a worker
+    pool, a page at a time; the condition is that last_seen and the counters
+    still hold what was scanned, so an update that raced a visit or an
+    increment is skipped (the user has just been re-scored by that write).
+    """
+    result = {"scanned": 0, "updated": 0, "skipped": 0}
+    lock = threading.Lock()
+
+    def update(item, placement):
+        profile, send, target = placement
+        values = {":d": item["last_open_days"], ":p": profile, ":s": send}
+        expression = "SET last_open_days = :d, customer_profile = :p, send_campaign = :s"
+        if target is None:
+            expression += " REMOVE target_segment"
+        else:
+            expression += ", target_segment = :t"
+            values[":t"] = target
+        guards = []
+        for name in ("last_seen",) + FEATURES:
+            if name == "last_open_days":
+                continue
+            if name in item:
+                guards.append(f"{name} = :old_{name}")
+                values[f":old_{name}"] = item[name]
+            else:
+                guards.append(f"attribute_not_exists({name})")
+        try:
+            with_retries(lambda: activity_table.update_item(
+                Key={"user_id": item["user_id"]}, UpdateExpression=expression,
+                ConditionExpression=" AND ".join(guards), ExpressionAttributeValues=values))
+            outcome = "updated"
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            outcome = "skipped"
+        with lock:
+            result[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aging") as pool:
+        for page in parallel_scan(activity_table, segments, ProjectionExpression=AGING_PROJECTION,
+                                  FilterExpression="attribute_exists(last_seen)"):
+            result["scanned"] += len(page)
+            last_seen = np.array([float(item["last_seen"]) for item in page])
+            current = np.array([int(item.get("last_open_days", NEVER_SEEN_DAYS)) for item in page])
+            days, changed = aged_days(last_seen, current, now)
+            items = []
+            for i in np.flatnonzero(changed).tolist():
+                items.append(dict(page[i], last_open_days=int(days[i])))
+            if not items:
+                continue
+            placements = segment_attributes(model, items, shards)
+            # Finish a page before scanning far ahead, so memory stays bounded
+            list(pool.map(lambda item: update(item, placements[item["user_id"]]), items))
+    return result
+
+
+class AgingJob:
+    """Runs backend.age_activity() every interval seconds on a daemon thread.
+
+    Runs line up on multiples of the interval since the epoch, so with the
+    default day they happen just after midnight UTC.
+    """
+
+    def __init__(self, backend, interval=AGING_INTERVAL, clock=time.time):
+        self.backend = backend
+        self.interval = interval
+        self.clock = clock
+        self.runs = 0
+        self.last_run = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self, now=None):
+        now = self.clock() if now is None else now
+        started = time.perf_counter()
+        result = self.backend.age_activity(now)
+        self.runs += 1
+        self.last_run = dict(result, at=now, seconds=round(time.perf_counter() - started, 3))
+        events.info("activity_aged", **self.last_run)
+        return result
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="activity-aging", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            now = self.clock()
+            if self._stopped.wait(self.interval - now % self.interval):
+                return
+            try:
+                self.run_once()
+            except Exception as e:
+                events.error("activity_aging_failed", error=str(e))
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        return {"interval": self.interval, "runs": self.runs, "last_run": self.last_run}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("dynamodb", "sqlite"), default="dynamodb")
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument("--sqlite-path", default=os.environ.get("SQLITE_PATH", "campaigns.db"))
+    parser.add_argument("--segments", type=int, default=SCAN_SEGMENTS, help="dynamodb: parallel scan segments")
+    parser.add_argument("--workers", type=int, default=AGING_WORKERS, help="dynamodb: concurrent updates")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("SEGMENT_SHARDS", SEGMENT_SHARDS)))
+    parser.add_argument("--model", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        "campaign_model.pkl"))
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        config = {"path": args.sqlite_path}
+    else:
+        config = {"region": args.region, "shards": args.shards, "aging_segments": args.segments,
+                  "aging_workers": args.workers}
+    backend = create_backend(args.backend, load_model(args.model), **config)
+    try:
+        started = time.perf_counter()
+        result = backend.age_activity()
+        print(f"Scanned {result['scanned']:,} users, updated {result['updated']:,} "
+              f"({result.get('skipped', 0):,} skipped by a concurrent visit) in {time.perf_counter() - started:.1f}s")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import atexit
+import threading
+import time
+
+from event_log import events
+
+
+# Activity counters the aggregator coalesces
+COUNTERS = ("total_visits", "offers_opened", "offers_clicked", "purchases")
+
+
+class ActivityAggregator:
+    """Write-behind buffer for UserActivity counter increments.
+
+    Deltas are summed per user in memory and written as one
+    `ADD ... SET last_open_days = 0, last_seen = <now>` update per user. A background thread
+    flushes when max_pending users are buffered or when the oldest buffered
+    delta is max_staleness seconds old, so no increment waits longer than that.
+    With max_staleness=0 every add() is written through immediately.
+
+    If on_flush is given, updates return the new items and on_flush(items)
+    is called once per flush with all of them.
+    """
+
+    def __init__(self, table, max_pending=1000, max_staleness=5.0, on_flush=None):
+        self.table = table
+        self.on_flush = on_flush
+        self.max_pending = max_pending
+        self.max_staleness = max_staleness
+        self.adds = 0
+        self.writes = 0
+        self.flushes = 0
+        self.errors = 0
+        self._pending = {}
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, user_id, seen=False, **deltas):
+        """Buffer counter deltas for a user; seen=True also resets last_open_days."""
+        if not self.max_staleness:
+            self.adds += 1
+            self._flushed([self._write(user_id, dict(deltas, seen=seen))])
+            return
+
+        with self._lock:
+            self.adds += 1
+            entry = self._pending.setdefault(user_id, {'seen': False})
+            entry['seen'] = entry['seen'] or seen
+            for name, delta in deltas.items():
+                entry[name] = entry.get(name, 0) + delta
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._pending) >= self.max_pending
+
+        self._ensure_started()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every buffered delta now."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._oldest = None
+            if pending:
+                self.flushes += 1
+            self._flushed([self._write(user_id, entry) for user_id, entry in pending.items()])
+
+    def _flushed(self, items):
+        items = [item for item in items if item]
+        if self.on_flush and items:
+            try:
+                self.on_flush(items)
+            except Exception as e:
+                events.error("activity_flush_hook_failed", error=str(e))
+
+    def _write(self, user_id, entry):
+        counters = [name for name in COUNTERS if entry.get(name)]
+        actions = []
+        values = {}
+        if counters:
+            actions.append("ADD " + ", ".join(f"{name} :{name}" for name in counters))
+            values.update({f":{name}": entry[name] for name in counters})
+        if entry.get('seen'):
+            actions.append("SET last_open_days = :zero, last_seen = :now")
+            values.update({':zero': 0, ':now': int(time.time())})
+        if not actions:
+            return None
+
+        try:
+            response = self.table.update_item(
+                Key={'user_id': user_id},
+                UpdateExpression=" ".join(actions),
+                ExpressionAttributeValues=values,
+                ReturnValues='ALL_NEW' if self.on_flush else 'NONE'
+            )
+            self.writes += 1
+            return response.get('Attributes')
+        except Exception as e:
+            self.errors += 1
+            events.error("activity_flush_failed", user_id=user_id, error=str(e))
+            if self.max_staleness:
+                self._requeue(user_id, entry)
+            return None
+
+    def _requeue(self, user_id, entry):
+        with self._lock:
+            current = self._pending.setdefault(user_id, {'seen': False})
+            current['seen'] = current['seen'] or entry.get('seen', False)
+            for name in COUNTERS:
+                if entry.get(name):
+                    current[name] = current.get(name, 0) + entry[name]
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="activity-flush", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                oldest = self._oldest
+            timeout = self.max_staleness if oldest is None else oldest + self.max_staleness - time.monotonic()
+            self._wake.wait(max(timeout, 0))
+            self._wake.clear()
+            with self._lock:
+                due = self._oldest is not None and (
+                    len(self._pending) >= self.max_pending
+                    or time.monotonic() - self._oldest >= self.max_staleness
+                )
+            if due:
+                self.flush()
+
+    def stop(self):
+        """Stop the background thread and drain whatever is still buffered."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+
+    def stats(self):
+        return {
+            "pending_users": len(self._pending),
+            "adds": self.adds,
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "errors": self.errors
+        }
@@ -0,0 +1,160 @@
+import sys
+import threading
+import time
+
+import numpy as np
+
+from activity_aging import aged_days
+from concurrency import LockStripes
+from scoring import CHUNK_SIZE, DEFAULT_ACTIVITY, FEATURES
+
+
+# Rows allocated up front; capacity doubles when full
+INITIAL_CAPACITY = 1024
+
+_COLUMNS = {name: i for i, name in enumerate(FEATURES)}
+
+
+class ActivityStore:
+    """Columnar activity counters for the in-memory app.
+
+    One int32 (capacity, 5) array in Fortran order, so each feature is a
+    contiguous column and view() is an (n, 5) model input with no copy,
+    plus a user_id -> row index. Rows are never reused or moved, only the
+    backing array is reallocated (doubling) as users are added. A parallel
+    float64 array holds each user's last_seen time (NaN if never seen), which
+    age() turns into last_open_days.
+
+    Counter updates lock only their row's stripe, so concurrent requests
+    for different users don't queue behind one lock; adding users takes
+    _lock, and growing the array takes every stripe as well so no update
+    lands in the array being replaced.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self._data = np.zeros((capacity, len(FEATURES)), dtype=np.int32, order="F")
+        self._last_seen = np.full(capacity, np.nan)
+        self._rows = {}
+        self._user_ids = []
+        self._lock = threading.Lock()
+        self._stripes = LockStripes()
+
+    def __len__(self):
+        return len(self._user_ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._rows
+
+    @property
+    def user_ids(self):
+        """User ids in row order, matching view()."""
+        return list(self._user_ids)
+
+    def _grow(self):
+        with self._stripes.all():
+            data = np.zeros((len(self._data) * 2, len(FEATURES)), dtype=np.int32, order="F")
+            data[:len(self._data)] = self._data
+            last_seen = np.full(len(data), np.nan)
+            last_seen[:len(self._last_seen)] = self._last_seen
+            self._data, self._last_seen = data, last_seen
+
+    def add(self, user_id, last_seen=None, **values):
+        """Add a user (no-op if present); unspecified counters get DEFAULT_ACTIVITY. Returns True if added."""
+        with self._lock:
+            if user_id in self._rows:
+                return False
+            row = len(self._user_ids)
+            if row == len(self._data):
+                self._grow()
+            self._data[row] = [values.get(name, DEFAULT_ACTIVITY[name]) for name in FEATURES]
+            self._last_seen[row] = np.nan if last_seen is None else last_seen
+            self._rows[user_id] = row
+            self._user_ids.append(user_id)
+            return True
+
+    def increment(self, user_id, seen=False, **deltas):
+        """Atomically add deltas to a user's counters; seen=True also resets last_open_days and last_seen.
+
+        Returns False for unknown users.
+        """
+        row = self._rows.get(user_id)
+        if row is None:
+            return False
+        with self._stripes(row):
+            for name, delta in deltas.items():
+                self._data[row, _COLUMNS[name]] += delta
+            if seen:
+                self._data[row, _COLUMNS["last_open_days"]] = 0
+                self._last_seen[row] = time.time()
+            return True
+
+    def set(self, user_id, last_seen=None, **values):
+        row = self._rows.get(user_id)
+        if row is None:
+            return False
+        with self._stripes(row):
+            for name, value in values.items():
+                self._data[row, _COLUMNS[name]] = value
+            if last_seen is not None:
+                self._last_seen[row] = last_seen
+            return True
+
+    def age(self, now, chunk_size=CHUNK_SIZE):
+        """Recompute last_open_days from last_seen, chunk_size rows at a time. Returns the user ids changed.
+
+        Each chunk is computed and written under every stripe, so no visit
+        lands between reading a chunk's last_seen and writing its days.
+        """
+        with self._lock:
+            user_ids = list(self._user_ids)
+        col = _COLUMNS["last_open_days"]
+        changed = []
+        for start in range(0, len(user_ids), chunk_size):
+            stop = min(start + chunk_size, len(user_ids))
+            with self._stripes.all():
+                days, mask = aged_days(self._last_seen[start:stop], self._data[start:stop, col], now)
+                rows = np.flatnonzero(mask)
+                self._data[start + rows, col] = days[rows]
+            changed.extend(user_ids[start + row] for row in rows.tolist())
+        return changed
+
+    def get(self, user_id, default=None):
+        """A user's counters as a dict, or default."""
+        row = self._rows.get(user_id)
+        if row is None:
+            return default
+        with self._stripes(row):
+            return dict(zip(FEATURES, self._data[row].tolist()))
+
+    def view(self):
+        """(n, 5) int32 view of every user's counters in FEATURES order (no copy).
+
+        Later updates show through the view; added users do not.
+        """
+        with self._lock:
+            return self._data[:len(self._user_ids)]
+
+    def snapshot(self):
+        """(user_ids, view()) taken together, so row i of the view belongs to user_ids[i]."""
+        with self._lock:
+            n = len(self._user_ids)
+            return list(self._user_ids), self._data[:n]
+
+    def column(self, name):
+        with self._lock:
+            return self._data[:len(self._user_ids), _COLUMNS[name]]
+
+    def features(self, user_ids):
+        """(len(user_ids), 5) copy of the given users' counters; unknown users get DEFAULT_ACTIVITY."""
+        with self._lock:
+            rows = [self._rows.get(user_id, -1) for user_id in user_ids]
+            out = self._data[rows] if rows else np.empty((0, len(FEATURES)), dtype=np.int32)
+            missing = [i for i, row in enumerate(rows) if row < 0]
+        if missing:
+            out[missing] = [DEFAULT_ACTIVITY[name] for name in FEATURES]
+        return out
+
+    def nbytes(self):
+        """Approximate memory: the counter and last_seen arrays plus the row index."""
+        return (self._data.nbytes + self._last_seen.nbytes + sys.getsizeof(self._rows) + sys.getsizeof(self._user_ids)
+                + sum(sys.getsizeof(user_id) for user_id in self._user_ids))
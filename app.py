@@ -1,33 +1,222 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # for the import-to-first-response log
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
+import hashlib
+import json
 import os
-import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from activity_aging import AGING_INTERVAL, AgingJob
+from assignments import HOME_OFFERS_LIMIT, utc_now
+from cache import TTLCache
+from catalog import REFRESH_INTERVAL, ProductCatalog
+from campaign_scheduler import (ACTIVE, EXPIRED, SYNC_INTERVAL, CampaignScheduler, campaign_zone, localize_form_time,
+                                parse_campaign_time)
+from delivery import DELIVERY_WORKERS, SEND_RATE, CampaignDelivery
+from event_log import DEFAULT_SAMPLE_RATE, events
+from launch_jobs import SCHEDULED, TARGETING, LaunchJobRunner, LaunchProgress
+from metrics import (CONTENT_TYPE, HTTP_EXCEPTIONS, HTTP_REQUESTS, HTTP_SECONDS, REGISTRY, InstrumentedClient,
+                     InstrumentedModel)
+from model_registry import KEEP_VERSIONS, BackgroundRescore, ModelRegistry
+from prediction_cache import PREDICTION_CACHE_SIZE, CachedModel
+from product_index import SORTS, ProductIndex
+from recommendations import REBUILD_INTERVAL, RECENT_PURCHASES, RecommendationJob
+from scoring import load_dataset_features
+from segment_index import SEGMENT_SHARDS
+from static_assets import StaticAssets
+from storage import create_backend
+
+
+# ML MODEL LOADING
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "campaign_model.pkl")
 
-model = pickle.load(open(MODEL_PATH, "rb"))
+# The model is unpickled on first use, not at import, and hot-swapped when
+# the file changes; MODEL_VERSIONS versions stay loaded for A/B scoring.
+# MODEL_PRELOAD=1 loads it at import instead.
+model_registry = ModelRegistry(MODEL_PATH, keep=int(os.environ.get('MODEL_VERSIONS', KEEP_VERSIONS)))
+if os.environ.get('MODEL_PRELOAD') == '1':
+    model_registry.current()
+
+# Predictions are memoized per (model version, feature tuple).
+# PREDICTION_BUCKETS=1 also clips last_open_days/total_visits where the
+# model output saturates on the training data. Calls are timed for /metrics.
+model = InstrumentedModel(CachedModel(
+    model_registry,
+    maxsize=int(os.environ.get('PREDICTION_CACHE_SIZE', PREDICTION_CACHE_SIZE)),
+    bucket_rows=load_dataset_features() if os.environ.get('PREDICTION_BUCKETS') == '1' else None
+))
+
+
+# STORAGE
+
+# memory (default), sqlite, dynamodb or state_server; see storage/__init__.py
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'memory')
+
+
+def storage_config(name):
+    if name == 'sqlite':
+        return {'path': os.environ.get('SQLITE_PATH', os.path.join(BASE_DIR, 'campaigns.db'))}
+    if name == 'dynamodb':
+        return {
+            'region': os.environ.get('AWS_REGION', 'us-east-1'),
+            # Shards of each segment on the UserActivity target_segment GSI
+            'shards': int(os.environ.get('SEGMENT_SHARDS', SEGMENT_SHARDS)),
+            # Activity increments are written behind, at most this many seconds late
+            'activity_max_pending': int(os.environ.get('ACTIVITY_MAX_PENDING', 1000)),
+            'activity_max_staleness': float(os.environ.get('ACTIVITY_MAX_STALENESS', 5))
+        }
+    if name == 'state_server':
+        # Several worker processes sharing one in-memory dataset; see storage/state_server.py
+        return {
+            'address': os.environ.get('STATE_SERVER_ADDRESS', '127.0.0.1:7070'),
+            'authkey': os.environ.get('STATE_SERVER_AUTHKEY', 'campaign-state')
+        }
+    return {}
+
+
+backend = create_backend(STORAGE_BACKEND, model, **storage_config(STORAGE_BACKEND))
+
 
+# A new model can move anyone between segments. Every user is re-placed on
+# a background thread, not on the request that noticed the new file.
+rescorer = BackgroundRescore(lambda: backend.rescore_all())
+model_registry.on_swap(lambda model_version: events.info("model_swapped", version=model_version.version))
+model_registry.on_swap(rescorer)
+
+
+# FLASK APP
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
 
+# Templates link static files through the manifest `python static_assets.py`
+# writes: resized WebP images and content-hashed names cached for a year
+assets = StaticAssets(app.static_folder).init_app(app)
+
+# Structured JSON-lines log on stderr, written by a background thread.
+# Per-request events are sampled at EVENT_LOG_SAMPLE_RATE; errors never are.
+events.sample_rate = float(os.environ.get('EVENT_LOG_SAMPLE_RATE', DEFAULT_SAMPLE_RATE))
+
+first_response_ms = None
+
+
+@app.after_request
+def log_first_response(response):
+    global first_response_ms
+    if first_response_ms is None:
+        first_response_ms = (time.perf_counter() - IMPORT_STARTED) * 1000
+        events.info("first_response", ms=round(first_response_ms))
+    return response
+
+
+# REQUEST METRICS
+
+def request_endpoint():
+    # The route pattern, not the path, so /campaign/<id> is one series
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request_endpoint()
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=str(response.status_code))
+        HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, endpoint=endpoint)
+    return response
+
+
+@app.teardown_request
+def record_request_exception(exc):
+    if exc is not None:
+        HTTP_EXCEPTIONS.inc(endpoint=request_endpoint(), exception=type(exc).__name__)
+        events.error("request_failed", method=request.method, path=request.path, error=repr(exc))
+
+
 EMAIL_REGEX = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
 
-# In-memory database (dictionary)
-users = []
-admin_users = {}
-campaign = {} 
-campaigns = [] #all campaigns
-user_activity = {} #user behavioir data
-user_campaigns = {} #campaign data per user
-
-SEGMENT_MAP = {
-    0: "Engaged",
-    1: "Frequent Visitor",
-    2: "Loyal",
-    3: "New"
-}
+# Campaign launches run on a background worker pool; a launch whose progress
+# has not been saved for LAUNCH_STALE_SECONDS is treated as interrupted
+launch_runner = LaunchJobRunner(workers=int(os.environ.get('LAUNCH_WORKERS', 2)))
+LAUNCH_STALE_SECONDS = int(os.environ.get('LAUNCH_STALE_SECONDS', 60))
+
+# Process-local caches for the /home read path
+campaign_cache = TTLCache(maxsize=10000, ttl=int(os.environ.get('CAMPAIGN_CACHE_TTL', 300)))
+
+# Product pages and /home render from this snapshot; storage is only read by
+# the background reload every CATALOG_REFRESH_INTERVAL seconds
+catalog = ProductCatalog(lambda: backend.list_products(),
+                         refresh_interval=float(os.environ.get('CATALOG_REFRESH_INTERVAL', REFRESH_INTERVAL))).start()
+
+# /products/search runs on this index; the catalog passes it just the products
+# that changed on each reload
+product_index = ProductIndex()
+catalog.on_change(lambda changed, removed: product_index.update(changed.values(), removed))
+
+# Most results /products/search returns per page
+SEARCH_LIMIT = 100
+
+# The /home shelf: recommendations are rebuilt in the background every
+# RECOMMENDATIONS_INTERVAL seconds (0 turns the shelf off); a user's recent
+# purchases and segment are cached so most /home reads don't fetch them
+recommender = RecommendationJob(backend, catalog, interval=float(
+    os.environ.get('RECOMMENDATIONS_INTERVAL', REBUILD_INTERVAL))).start()
+purchase_cache = TTLCache(maxsize=10000, ttl=int(os.environ.get('PURCHASE_CACHE_TTL', 300)))
+segment_cache = TTLCache(maxsize=10000, ttl=int(os.environ.get('SEGMENT_CACHE_TTL', 300)))
+
+# Assignment pages /home reads looking for live offers before it gives up
+HOME_SCAN_PAGES = 3
+
+
+# CAMPAIGN SCHEDULE
+
+# Expired campaigns' assignment rows are deleted off the request path
+assignment_pruner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assignment-pruner")
+
+
+def prune_expired_assignments(campaign_ids):
+    deleted = backend.prune_assignments(campaign_ids)
+    events.info("assignments_pruned", campaign_ids=campaign_ids, deleted=deleted)
+
+
+def expire_campaigns(campaign_ids):
+    # Every process's scheduler sees the expiry; only the one that flips the
+    # status prunes
+    claimed = [cid for cid in campaign_ids if backend.expire_campaign(cid)]
+    if claimed:
+        assignment_pruner.submit(prune_expired_assignments, claimed)
+
+
+# Activates/expires campaigns on their start_time/end_time, and launches
+# campaigns as they start (start_due_launches, with the launch jobs below);
+# campaigns other processes create are picked up on the next sync, or when
+# /home first sees them
+scheduler = CampaignScheduler(on_expire=expire_campaigns,
+                              on_activate=lambda campaign_ids: start_due_launches(campaign_ids)).start(
+    lambda: backend.list_campaigns(), sync_interval=float(os.environ.get('CAMPAIGN_SYNC_INTERVAL', SYNC_INTERVAL)))
+
+# The launch form's start/end times are in the admin's browser time zone;
+# CAMPAIGN_TIMEZONE (an IANA name) is used when the browser doesn't send one
+CAMPAIGN_TIMEZONE = os.environ.get('CAMPAIGN_TIMEZONE', 'UTC')
+campaign_timezone = campaign_zone(CAMPAIGN_TIMEZONE)
+
+# Nightly recency aging (last_open_days from last_seen). Only the memory
+# backend's state is private to this process, so only it ages here by
+# default; the state server ages its own, and for sqlite/dynamodb run
+# activity_aging.py from cron (or set ACTIVITY_AGING_INTERVAL on one worker)
+aging_job = AgingJob(backend, float(os.environ.get(
+    'ACTIVITY_AGING_INTERVAL', AGING_INTERVAL if STORAGE_BACKEND == 'memory' else 0))).start()
+
+
+# SEGMENTS
 
 HTML_TO_INT = {
     "engaged": 0,
@@ -35,23 +224,269 @@ HTML_TO_INT = {
     "loyal": 2,
     "new_users": 3
 }
+SEGMENT_MAP = {v: k for k, v in HTML_TO_INT.items()}
+
 
-def get_user_features(user_id):
-    activity = user_activity.get(user_id, {
-        "offers_opened": 0,
-        "offers_clicked": 0,
-        "purchases": 0,
-        "last_open_days": 999,
-        "total_visits": 1
+# NOTIFICATIONS
+
+# sns (default with the dynamodb backend) or none
+NOTIFICATIONS = os.environ.get('NOTIFICATIONS', 'sns' if STORAGE_BACKEND == 'dynamodb' else 'none')
+
+# Replace with your SNS topic ARN if you want notifications
+SNS_TOPIC_ARN = 'arn:aws:sns:us-east-1:xxxxxxxxxxxx:campaign_topic'
+
+notifier = None
+if NOTIFICATIONS == 'sns':
+    import boto3
+    from notifications import NotificationDispatcher
+
+    # Notifications are queued and published in batches by background workers,
+    # so request handlers never wait on SNS
+    notifier = NotificationDispatcher(
+        InstrumentedClient(boto3.client('sns', region_name=os.environ.get('AWS_REGION', 'us-east-1')), 'sns',
+                           SNS_TOPIC_ARN.rsplit(':', 1)[-1]),
+        SNS_TOPIC_ARN,
+        workers=int(os.environ.get('SNS_WORKERS', 2)),
+        max_queue=int(os.environ.get('SNS_MAX_QUEUE', 10000))
+    )
+
+
+def send_notification(subject, message):
+    if notifier is not None:
+        notifier.send(subject, message)
+
+
+# Launches send each targeted user the campaign through SNS (when
+# notifications are on), on the topic's subscription filter policies
+DELIVERY_TOPIC_ARN = os.environ.get('DELIVERY_TOPIC_ARN', SNS_TOPIC_ARN)
+delivery_workers = int(os.environ.get('DELIVERY_WORKERS', DELIVERY_WORKERS))
+
+# Messages per second per campaign unless the launch form sets one; 0 is uncapped
+DELIVERY_RATE = int(os.environ.get('DELIVERY_RATE', SEND_RATE))
+
+
+# SCRAPE-TIME METRICS (read from the stats the app already keeps)
+
+def cache_stat(name):
+    return lambda: {(cache,): stats[name] for cache, stats in (
+        ("campaigns", campaign_cache.stats()),
+        ("predictions", model.stats())
+    )}
+
+
+REGISTRY.callback("cache_hits_total", "Cache hits", cache_stat("hits"), ("cache",), kind="counter")
+REGISTRY.callback("cache_misses_total", "Cache misses", cache_stat("misses"), ("cache",), kind="counter")
+REGISTRY.callback("cache_entries", "Entries held per cache", cache_stat("size"), ("cache",))
+REGISTRY.callback("launch_jobs_running", "Campaign launches in progress",
+                  lambda: sum(launch_runner.running(cid) for cid in list(launch_runner.jobs)))
+REGISTRY.callback("catalog_version", "Product catalog versions seen by this process",
+                  lambda: catalog.stats()["version"] or 0)
+REGISTRY.callback("campaigns_active", "Campaigns inside their start/end window",
+                  lambda: len(scheduler.active_ids))
+REGISTRY.callback("event_log_dropped_total", "Log events dropped because the writer fell behind",
+                  lambda: events.dropped, kind="counter")
+if notifier is not None:
+    REGISTRY.callback("notification_queue_depth", "Notifications waiting to be published",
+                      lambda: notifier.stats()["queue_depth"])
+    REGISTRY.callback("notifications_total", "Notifications by outcome",
+                      lambda: {(outcome,): notifier.stats()[outcome] for outcome in ("sent", "failed", "dropped")},
+                      ("outcome",), kind="counter")
+
+
+# HELPER FUNCTIONS
+
+def product_view(product):
+    # The templates link products by id
+    return dict(product, id=product['product_id'])
+
+
+def not_modified(etag, last_modified=None):
+    """True if the browser's copy (If-None-Match, else If-Modified-Since) is current."""
+    if session.get('_flashes'):
+        return False  # the page has a flash message to show once
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return bool(since and last_modified and int(last_modified) <= since.timestamp())
+
+
+def conditional_response(body, etag, last_modified=None):
+    # body=None answers 304 Not Modified. Pages are per-session, so private;
+    # no-cache makes the browser revalidate every time
+    response = app.make_response(body if body is not None else ('', 304))
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = int(last_modified)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def recommended_products(user_id):
+    """Product ids for the user's /home shelf; empty until the first recommendations build."""
+    if recommender.current is None:
+        return []
+    purchased = purchase_cache.get(user_id)
+    if purchased is None:
+        purchased = backend.recent_purchases(user_id, RECENT_PURCHASES)
+        purchase_cache.set(user_id, purchased)
+    segment = segment_cache.get_many([user_id], backend.get_segments).get(user_id)
+    return recommender.shelf(purchased, segment)
+
+
+# CAMPAIGN LAUNCH JOBS
+
+def save_launch_progress(progress):
+    # A launch still running when its campaign ends must not un-expire it
+    status = EXPIRED if scheduler.state(progress.campaign_id) == EXPIRED else progress.status
+    backend.save_launch_progress(progress.campaign_id, status, {
+        'processed': progress.processed,
+        'targeted': progress.targeted,
+        'checkpoint': progress.checkpoint,
+        'delivered': progress.delivered,
+        'failed': progress.failed,
+        'assigned_at': progress.params['assigned_at'],
+        'started_at': progress.started_at,
+        'finished_at': progress.finished_at
     })
 
-    return [[
-        activity["offers_opened"],
-        activity["offers_clicked"],
-        activity["purchases"],
-        activity["last_open_days"],
-        activity["total_visits"]
-    ]]
+
+def launch_progress_from_campaign(campaign):
+    saved = campaign.get('launch_progress') or {}
+    return LaunchProgress(
+        campaign['campaign_id'],
+        params={
+            'segment': int(campaign['segment']),
+            'assigned_at': saved.get('assigned_at') or utc_now()
+        },
+        save=save_launch_progress,
+        status=campaign.get('status', SCHEDULED),
+        processed=int(saved.get('processed', 0)),
+        targeted=int(saved.get('targeted', 0)),
+        checkpoint=saved.get('checkpoint'),
+        delivered=int(saved.get('delivered', 0)),
+        failed=int(saved.get('failed', 0)),
+        started_at=float(saved['started_at']) if saved.get('started_at') is not None else None
+    )
+
+
+def run_launch(progress):
+    """Assign the campaign to the segment's targets, page by page.
+
+    Users are scored when their activity changes, not here, so a launch only
+    reads the backend's segment placement. The checkpoint after each page is
+    saved, so a resumed launch skips what is already done, and assignment
+    writes are idempotent (same assigned_at), so a replayed page is harmless.
+    With notifications on, each page is also sent to its users; the delivery
+    ledger skips anyone a replayed page already reached.
+    """
+    params = progress.params
+    state = scheduler.state(progress.campaign_id)
+    if state == EXPIRED:
+        return  # ended before it was delivered
+
+    # Launches are only started once the campaign is live, but never send
+    # an offer early whatever queued this one
+    sender = None
+    if notifier is not None and state == ACTIVE:
+        campaign = backend.get_campaigns([progress.campaign_id]).get(progress.campaign_id)
+        if campaign is not None:
+            sender = CampaignDelivery(backend, notifier.client, DELIVERY_TOPIC_ARN, campaign,
+                                      rate=int(campaign.get('send_rate', DELIVERY_RATE)), workers=delivery_workers,
+                                      heartbeat=progress.touch)
+
+    if rescorer.running:
+        # Users not re-placed yet are still in the old model's segments
+        events.info("launch_during_rescore", campaign_id=progress.campaign_id)
+
+    # Pending counter changes can move users in or out of the segment
+    backend.flush_activity()
+
+    for user_ids, checkpoint in backend.segment_target_pages(params['segment'], progress.checkpoint):
+        backend.assign_campaign(user_ids, progress.campaign_id, params['assigned_at'])
+        delivered, failed = sender.deliver(user_ids) if sender is not None else (0, 0)
+        progress.advance(len(user_ids), len(user_ids), checkpoint, delivered, failed)
+    if sender is not None:
+        events.info("campaign_delivered", **sender.stats())
+
+
+def start_due_launches(campaign_ids):
+    """Launch campaigns whose start_time just came (the scheduler's on_activate).
+
+    Every process's scheduler sees the activation. A launch nobody has
+    touched since it became due (progress last saved before start_time) is
+    claimed, so exactly one process runs it; one already claimed is left to
+    resume_interrupted_launches if its process dies.
+    """
+    now = time.time()
+    for campaign in backend.get_campaigns(campaign_ids).values():
+        if campaign.get('status') != SCHEDULED or launch_runner.running(campaign['campaign_id']):
+            continue
+        start = parse_campaign_time(campaign.get('start_time'))
+        seen = campaign.get('progress_updated_at')
+        if start is None or (seen is not None and float(seen) >= start):
+            continue  # launched when it was created, already live
+        if backend.claim_launch(campaign['campaign_id'], seen, now):
+            launch_runner.submit(launch_progress_from_campaign(campaign), run_launch)
+
+
+def resume_interrupted_launches(campaigns):
+    """Re-queue live launches another process left unfinished and stopped updating."""
+    now = time.time()
+    scheduler.sync(campaigns)
+    for campaign in campaigns:
+        if campaign.get('status') not in (SCHEDULED, TARGETING) or launch_runner.running(campaign['campaign_id']):
+            continue
+        if scheduler.state(campaign['campaign_id']) != ACTIVE:
+            continue  # upcoming: start_due_launches runs it when it starts
+        seen = campaign.get('progress_updated_at')
+        if seen is not None and now - float(seen) < LAUNCH_STALE_SECONDS:
+            continue
+        # Claim the launch so only one process resumes it
+        if backend.claim_launch(campaign['campaign_id'], seen, now):
+            launch_runner.submit(launch_progress_from_campaign(campaign), run_launch)
+
+
+def active_assignments(user_id, before=None):
+    """The user's newest assigned campaign ids that are live right now, and the next-page key.
+
+    Offers that haven't started or have expired are dropped before anything
+    is fetched. A page left short reads on, up to HOME_SCAN_PAGES pages.
+    """
+    campaign_ids = []
+    for _ in range(HOME_SCAN_PAGES):
+        page, before = backend.newest_assignments(user_id, HOME_OFFERS_LIMIT - len(campaign_ids), before=before)
+        # Campaigns launched by another process since the last sync
+        unknown = [cid for cid in page if scheduler.state(cid) is None]
+        if unknown:
+            scheduler.sync(campaign_cache.get_many(unknown, backend.get_campaigns).values())
+        active = scheduler.active_ids
+        campaign_ids += [cid for cid in page if cid in active]
+        if len(campaign_ids) >= HOME_OFFERS_LIMIT or before is None:
+            break
+    return campaign_ids, before
+
+
+def dashboard_campaigns(campaigns):
+    scheduler.sync(campaigns)
+    campaigns_list = []
+    for campaign in campaigns:
+        saved = campaign.get('launch_progress') or {}
+        campaigns_list.append({
+            "id": campaign.get("campaign_id"),
+            "name": campaign.get("name"),
+            "status": campaign.get("status"),
+            "window": scheduler.state(campaign.get("campaign_id")),
+            "processed": saved.get("processed", 0),
+            "targeted": saved.get("targeted", 0),
+            "delivered": saved.get("delivered", 0),
+            "failed": saved.get("failed", 0),
+            "start_time": campaign.get("start_time"),
+            "end_time": campaign.get("end_time")
+        })
+    return campaigns_list
+
+
+# ROUTES
 
 
 @app.route('/')
@@ -65,284 +500,189 @@ def about():
     return render_template('about.html')
 
 
+# USER SIGNUP
+
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
-        # check if user already exists
-        for user in users:
-            if user['username'] == username:
-                return "User already exists!"
-
-        user_id = len(users) + 1  # auto-increment ID
-
-        user = {
-            "user_id": user_id,
-            "username": username,
-            "password": password
-        }
-
-        users.append(user)
-
-        # 🔹 ML INITIALIZATION (THIS WAS MISSING)
-        user_activity[user_id] = {
-            "offers_opened": 0,
-            "offers_clicked": 0,
-            "purchases": 0,
-            "last_open_days": 0,
-            "total_visits": 1
-        }
-
-        user_campaigns[user_id] = []
+        # Also initializes the user's ML activity and segment placement
+        user = backend.create_user(username, password)
+        if user is None:
+            return "User already exists!"
 
-        session['user_id'] = user_id
+        session['user_id'] = user['user_id']
         session['username'] = username
 
+        send_notification("New User Signup", f"User {username} signed up.")
+
         return redirect(url_for('home'))
 
     return render_template('signup.html')
 
 
+# USER LOGIN
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        
-        for user in users:
-            if user['username'] == username and user['password'] == password:
-                session['user_id'] = user['user_id']
-                session['username'] = user['username']
-
-                # Initialize user activity for ML 
-                user_activity.setdefault(user['user_id'], {
-                    "offers_opened": 0,
-                    "offers_clicked": 0,
-                    "purchases": 0,
-                    "last_open_days": 1,
-                    "total_visits": 1
-                })
-
-                return redirect(url_for('home'))
-            
-        return "Invalid credentials!"
-    
-    return render_template('login.html')
 
+        user = backend.get_user_by_username(username)
 
-@app.route('/home')
-def home():
-    if 'user_id' in session:
-        user_id = session['user_id']
-
-        # Ensure user_activity exists
-        if user_id not in user_activity:
-            user_activity[user_id] = {
-                "offers_opened": 0,
-                "offers_clicked": 0,
-                "purchases": 0,
-                "last_open_days": 0,
-                "total_visits": 1
-            }
-
-        # Track visit
-        user_activity[user_id]["total_visits"] += 1
-        user_activity[user_id]["last_open_days"] = 0
-
-
-        #Get campaigns for this user
-        user_campaign_list = user_campaigns.get(user_id, [])
-
-        #Track offers shown (opened)
-        if user_campaign_list:
-            user_activity[user_id]["offers_opened"] += len(user_campaign_list)
-
-        # 🔍 Optional: debug print (VERY useful)
-        print(f" User {user_id} activity:", user_activity[user_id])
-        print(f" Campaigns shown:", [c["name"] for c in user_campaign_list])
-
-        return render_template(
-            'home.html',
-            username=session['username'],
-            products=products,
-            campaigns=user_campaign_list
-        )
+        if user and user['password'] == password:
+            session['user_id'] = user['user_id']
+            session['username'] = user['username']
 
-    return redirect(url_for('login'))
+            # Count the visit (creates the activity if it is missing)
+            backend.increment_activity(user['user_id'], seen=True, total_visits=1)
 
-@app.route('/campaign/<int:campaign_id>')
-def campaign_click(campaign_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-
-    user_id = session['user_id']
+            send_notification("User Login", f"User {username} logged in.")
 
-    # Increment offer click count
-    if user_id in user_activity:
-        user_activity[user_id]["offers_clicked"] += 1
+            return redirect(url_for('home'))
 
-    print(f" Campaign {campaign_id} clicked by user {user_id}")
-    print(" Updated activity:", user_activity[user_id])
+        return "Invalid credentials!"
 
-    # Optional: redirect user somewhere meaningful
-    return redirect(url_for('home'))
+    return render_template('login.html')
 
 
+# USER HOME
 
-products = {
-    1: {
-        "id": 1,
-        "name": "Boat Headphones",
-        "price": 2500,
-        "description": "Wireless headphones with deep bass and long battery life",
-        "category": "Electronics",
-        "tags": ["audio", "headphones", "wireless"],
-        "target_audience": ["students", "working"],
-        "image": "product1.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    2: {
-        "id": 2,
-        "name": "Smart Watch",
-        "price": 2000,
-        "description": "Fitness smartwatch with heart rate monitoring",
-        "category": "Wearables",
-        "tags": ["fitness", "watch", "health"],
-        "target_audience": ["working"],
-        "image": "product2.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    3: {
-        "id": 3,
-        "name": "JBL Bluetooth Speaker",
-        "price": 3000,
-        "description": "Portable Bluetooth speaker with powerful sound and deep bass",
-        "category": "Electronics",
-        "tags": ["audio", "speaker", "bluetooth", "portable"],
-        "target_audience": ["students", "working"],
-        "image": "product3.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    4: {
-        "id": 4,
-        "name": "Dell Laptop",
-        "price": 55000,
-        "description": "High-performance Dell laptop suitable for work, study, and programming",
-        "category": "Computers",
-        "tags": ["laptop", "dell", "computer", "work"],
-        "target_audience": ["students", "working"],
-        "image": "product4.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    5: {
-        "id": 5,
-        "name": "Dell Bluetooth Mouse",
-        "price": 1500,
-        "description": "Wireless Bluetooth mouse with smooth tracking and ergonomic design",
-        "category": "Computer Accessories",
-        "tags": ["mouse", "bluetooth", "dell", "accessories"],
-        "target_audience": ["students", "working"],
-        "image": "product5.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    6: {
-        "id": 6,
-        "name": "Classmate Pens",
-        "price": 100,
-        "description": "Hardcover writing journal for notes, planning, and daily journaling",
-        "category": "Stationery",
-        "tags": ["journal", "writing", "notes", "planner"],
-        "target_audience": ["students", "working"],
-        "image": "product6.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    7: {
-        "id": 7,
-        "name": "Writing Journal",
-        "price": 300,
-        "description": "Smooth writing pens ideal for exams, notes, and everyday use",
-        "category": "Stationery",
-        "tags": ["pens", "writing", "classmate", "stationery"],
-        "target_audience": ["students"],
-        "image": "product7.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    8: {
-        "id": 8,
-        "name": "Camel Water Colours",
-        "price": 250,
-        "description": "Water colour set perfect for painting, sketching, and art projects",
-        "category": "Art Supplies",
-        "tags": ["art", "painting", "watercolours", "camel"],
-        "target_audience": ["students", "artists"],
-        "image": "product8.jpg",
-        "views": 0,
-        "purchases": 0
-    },
-    9: {
-        "id": 9,
-        "name": "Laptop Bag",
-        "price": 700,
-        "description": "Durable and stylish laptop bag with padded compartments",
-        "category": "Accessories",
-        "tags": ["laptop", "bag", "travel", "office"],
-        "target_audience": ["students", "working"],
-        "image": "product9.jpg",
-        "views": 0,
-        "purchases": 0
-    }
-}
+@app.route('/home')
+def home():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
 
+    user_id = session['user_id']
 
-@app.route('/product/<int:product_id>')
+    # Get the newest live campaigns for this user (?before=<key> pages back through older ones)
+    campaign_ids, next_offers = active_assignments(user_id, before=request.args.get('before'))
+
+    # Campaign records never change once launched, so they are served from the
+    # cache and only misses go to storage, in one batch get
+    campaign_items = campaign_cache.get_many(campaign_ids, backend.get_campaigns)
+
+    campaigns_list = []
+    for cid in campaign_ids:
+        item = campaign_items.get(cid)
+        if item is None:
+            continue
+        campaigns_list.append({
+            "id": item.get("campaign_id"),
+            "name": item.get("name"),
+            "offer": item.get("offer"),
+            "start_time": item.get("start_time"),
+            "end_time": item.get("end_time")
+        })
+
+    # Track visit and offers shown (opened)
+    backend.increment_activity(user_id, seen=True, total_visits=1, offers_opened=len(campaigns_list))
+    events.log("home", user_id=user_id, campaigns_shown=[c["id"] for c in campaigns_list])
+
+    snapshot = catalog.current()
+    shelf = [pid for pid in recommended_products(user_id) if pid in snapshot.products]
+
+    # The page only depends on these, so repeat views with nothing new get a 304
+    etag = hashlib.sha1(json.dumps([snapshot.digest, assets.version(), session['username'], campaigns_list,
+                                    next_offers, shelf], default=str).encode()).hexdigest()[:20]
+    if not_modified(etag):
+        return conditional_response(None, etag)
+
+    return conditional_response(
+        render_template('home.html', username=session['username'], campaigns=campaigns_list,
+                        recommended={pid: snapshot.products[pid] for pid in shelf},
+                        products=snapshot.products, next_offers=next_offers),
+        etag
+    )
+
+
+# PRODUCT ROUTES
+
+@app.route('/product/<product_id>')
 def product(product_id):
-    product = products.get(product_id)
-    if not product:
-        return "Product not found", 404
-    return render_template('product.html', product=product)
-
-
-@app.route('/buy/<int:product_id>', methods=['POST'])
+    item = catalog.product(product_id)
+    if item is None:
+        # Added since the last catalog reload, or no such product
+        item = backend.get_product(product_id)
+        if not item:
+            return "Product not found", 404
+        return render_template('product.html', product=product_view(item))
+
+    etag = f"{catalog.product_etag(product_id)}-{assets.version()}"
+    last_modified = catalog.product_modified(product_id)
+    if not_modified(etag, last_modified):
+        return conditional_response(None, etag, last_modified)
+    return conditional_response(render_template('product.html', product=product_view(item)), etag, last_modified)
+
+@app.route('/products/search')
+def search_products():
+    # ?q=<words>&category=&tag=&audience=&min_price=&max_price=&sort=price|-price&limit=&offset=
+    args = request.args
+    try:
+        min_price = float(args['min_price']) if args.get('min_price') else None
+        max_price = float(args['max_price']) if args.get('max_price') else None
+        limit = min(int(args.get('limit', 20)), SEARCH_LIMIT)
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        return jsonify(error="min_price, max_price, limit and offset must be numbers"), 400
+    if args.get('sort', '') not in SORTS or limit < 0 or offset < 0:
+        return jsonify(error=f"sort must be one of {', '.join(s for s in SORTS if s)}; limit and offset >= 0"), 400
+
+    catalog.current()  # the first search loads the catalog, and with it the index
+    total, product_ids = product_index.search(args.get('q', ''), category=args.get('category'), tag=args.get('tag'),
+                                              audience=args.get('audience'), min_price=min_price,
+                                              max_price=max_price, sort=args.get('sort', ''),
+                                              limit=limit, offset=offset)
+    products = [catalog.product(product_id) for product_id in product_ids]
+    return jsonify(total=total, products=[product_view(p) for p in products if p is not None])
+
+@app.route('/buy/<product_id>', methods=['POST'])
 def buy_product(product_id):
-    product = products.get(product_id)
     user_id = session.get('user_id')
+    if not user_id:
+        return redirect(url_for('login'))
 
-    if product:
-        product["purchases"] += 1
-        if user_id in user_activity:
-            user_activity[user_id]["purchases"] += 1
-
+    if backend.increment_product_purchases(product_id):
+        catalog.bump(product_id)  # other processes see it on their next reload
+        backend.record_purchase(user_id, product_id, utc_now())
+        purchase_cache.pop(user_id)
+        backend.increment_activity(user_id, purchases=1)
         flash("Item purchased successfully.")
 
     return redirect(url_for('product', product_id=product_id))
 
 
-@app.route('/logout')
-def logout():
-    session.pop('username', None)
-    return redirect(url_for('index'))
+# CAMPAIGN CLICK
+
+@app.route('/campaign/<campaign_id>')
+def campaign_click(campaign_id):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+
+    # Increment offer click count
+    backend.increment_activity(session['user_id'], offers_clicked=1)
+    events.log("campaign_click", user_id=session['user_id'], campaign_id=campaign_id)
+
+    return redirect(url_for('home'))
+
+
+# ADMIN SIGNUP/LOGIN
 
-# Admin Routes
 @app.route('/admin/signup', methods=['GET', 'POST'])
 def admin_signup():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        
-        if username in admin_users:
+
+        if not backend.create_admin(username, password):
             return "Admin already exists!"
-        
-        admin_users[username] = password
+
+        send_notification("Admin Signup", f"Admin {username} registered.")
         return redirect(url_for('admin_login'))
+
     return render_template('admin_signup.html')
 
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -350,71 +690,139 @@ def admin_login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        
-        if username in admin_users and admin_users[username] == password:
+
+        admin = backend.get_admin(username)
+        if admin and admin['password'] == password:
             session['admin'] = username
             return redirect(url_for('admin_dashboard'))
+
         return "Invalid admin credentials!"
+
     return render_template('admin_login.html')
 
+
+# ADMIN DASHBOARD
+
 @app.route('/admin/dashboard')
 def admin_dashboard():
-    if 'admin' in session:
-        return render_template('admin_dashboard.html', username=session['admin'], campaigns=campaigns)
-    return redirect(url_for('admin_login'))
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
 
+    campaigns = backend.list_campaigns()
+    resume_interrupted_launches(campaigns)
 
-@app.route('/launch-campaign', methods=['GET','POST'])
-def launch_campaign_submit():
+    return render_template('admin_dashboard.html', username=session['admin'],
+                           campaigns=dashboard_campaigns(campaigns))
+
+@app.route('/admin-dashboard')
+def admin_dashboard_status():
+    return render_template('admin_dashboard.html', campaigns=dashboard_campaigns(backend.list_campaigns()))
+
+@app.route('/admin/campaign/<campaign_id>/progress')
+def campaign_progress(campaign_id):
+    if 'admin' not in session:
+        return jsonify(error="Admin login required"), 401
+
+    progress = launch_runner.get(campaign_id)
+    if progress is None:
+        campaign = backend.get_campaigns([campaign_id]).get(campaign_id)
+        if campaign is None:
+            return jsonify(error="Campaign not found"), 404
+        progress = launch_progress_from_campaign(campaign)
+    return jsonify(progress.to_dict())
+
+@app.route('/admin/cache-stats')
+def cache_stats():
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
+    return jsonify(campaigns=campaign_cache.stats(), catalog=catalog.stats(), product_index=product_index.stats(),
+                   purchases=purchase_cache.stats(), segments=segment_cache.stats(), predictions=model.stats())
+
+@app.route('/admin/model', methods=['GET', 'POST'])
+def model_admin():
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
     if request.method == 'POST':
-        html_segment = request.form['segment']  # keep as string from HTML
+        # {"split": {"<version>": weight, ...}} for A/B scoring, {"split": null} to stop
+        try:
+            model_registry.set_split((request.get_json(silent=True) or {}).get('split'))
+        except KeyError as e:
+            return jsonify(error=str(e)), 400
+    return jsonify(dict(model_registry.stats(), rescore=rescorer.stats()))
+
+@app.route('/admin/notification-stats')
+def notification_stats():
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
+    return jsonify(notifier.stats() if notifier is not None else {"enabled": False})
 
-        # Convert HTML string to ML integer
-        selected_segment = HTML_TO_INT[html_segment]
+@app.route('/metrics')
+def metrics():
+    # Prometheus scrape target
+    return app.response_class(REGISTRY.render(), content_type=CONTENT_TYPE)
 
-        campaign = {
-            "id": len(campaigns) + 1,  # unique auto-increment ID
-            "name": request.form['name'],
-            "type": request.form['type'],
-            "subject": request.form['subject'],
-            "offer": request.form['offer'],
-            # "segment": int(request.form['segment']),
-            "segment": selected_segment, 
-            "start_time": request.form['start_time'],
-            "end_time": request.form['end_time'],
-            "status": "Scheduled"
-        }
+@app.route('/admin/schedule-stats')
+def schedule_stats():
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
+    return jsonify(dict(scheduler.stats(), activity_aging=aging_job.stats(), recommendations=recommender.stats()))
 
-        campaigns.append(campaign)
+@app.route('/admin/storage-stats')
+def storage_stats():
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
+    return jsonify(backend.stats())
 
-        # selected_segment = campaign["segment"]
 
-        # ML LOGIC STARTS HERE
-        for user_id in user_activity.keys():
-            features = get_user_features(user_id)
+# LAUNCH CAMPAIGN
 
-            prediction = model.predict(features)
+@app.route('/launch-campaign', methods=['GET', 'POST'])
+def launch_campaign_submit():
+    if request.method == 'POST':
+        html_segment = request.form['segment']  # keep as string from HTML
 
-            print("User:", user_id)
-            print("Features:", features)
-            print("Prediction:", prediction)
+        # Convert HTML string to ML integer
+        selected_segment = HTML_TO_INT[html_segment]
 
-            send_campaign = prediction[0][0]
-            customer_profile = prediction[0][1]
+        send_rate = request.form.get('send_rate', '').strip()
+        try:
+            send_rate = int(send_rate) if send_rate else DELIVERY_RATE
+        except ValueError:
+            flash("Send rate must be a whole number of messages per second.")
+            return render_template('launch_campaign.html', timezone=CAMPAIGN_TIMEZONE), 400
+
+        campaign = backend.create_campaign({
+            'name': request.form['name'],
+            'type': request.form['type'],
+            'subject': request.form['subject'],
+            'offer': request.form['offer'],
+            'segment': selected_segment,
+            'start_time': localize_form_time(request.form['start_time'], request.form.get('start_time_offset'),
+                                             campaign_timezone),
+            'end_time': localize_form_time(request.form['end_time'], request.form.get('end_time_offset'),
+                                           campaign_timezone),
+            'send_rate': max(send_rate, 0),
+            'status': SCHEDULED
+        })
+        campaign_id = campaign['campaign_id']
+
+        progress = LaunchProgress(
+            campaign_id,
+            params={'segment': selected_segment, 'assigned_at': utc_now()},
+            save=save_launch_progress
+        )
+        save_launch_progress(progress)
+        campaign_cache.set(campaign_id, campaign)
+        send_notification("New Campaign", f"Campaign '{campaign['name']}' launched.")
 
-            # if send_campaign == 1 and customer_profile == selected_segment:
-            #     user_campaigns.setdefault(user_id, []).append(campaign)
-            if customer_profile == selected_segment:
-                if send_campaign == 1 or user_activity[user_id]["total_visits"] >= 2:
-                    user_campaigns.setdefault(user_id, []).append(campaign)
+        # ML logic: assign campaigns to users, on the launch worker pool. A
+        # campaign starting later is launched by the scheduler when it starts
+        if scheduler.add(campaign) == ACTIVE:
+            launch_runner.submit(progress, run_launch)
 
         return redirect(url_for('admin_dashboard'))
 
-    return render_template('launch_campaign.html')
-
-@app.route('/admin-dashboard')
-def admin_dashboard_status():
-    return render_template('admin_dashboard.html', campaigns=campaigns)
+    return render_template('launch_campaign.html', timezone=CAMPAIGN_TIMEZONE)
 
 
 @app.route('/admin/logout')
@@ -422,6 +830,19 @@ def admin_logout():
     session.pop('admin', None)
     return redirect(url_for('index'))
 
-if __name__ == '__main__':
-    app.run(debug=True, port=5000)
 
+# LOGOUT
+
+@app.route('/logout')
+def logout():
+    session.pop('username', None)
+    session.pop('user_id', None)
+    session.pop('admin', None)
+    return redirect(url_for('index'))
+
+
+# RUN APP
+
+if __name__ == '__main__':
+    resume_interrupted_launches(backend.list_campaigns())
+    app.run(host='0.0.0.0', port=5000, debug=True)
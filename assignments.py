@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+
+
+# One item per (user_id, campaign_id):
+#   user_id      partition key
+#   assigned_key sort key, "<assigned_at ISO timestamp>#<campaign_id>", so a
+#                descending Query returns the newest offers first
+ASSIGNMENTS_TABLE = 'CampaignAssignments'
+
+# Offers shown per /home page
+HOME_OFFERS_LIMIT = 20
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+def assignment_key(campaign_id, assigned_at):
+    return f"{assigned_at}#{campaign_id}"
+
+
+def assignment_item(user_id, campaign_id, assigned_at):
+    return {
+        'user_id': user_id,
+        'assigned_key': assignment_key(campaign_id, assigned_at),
+        'campaign_id': campaign_id,
+        'assigned_at': assigned_at
+    }
+
+
+def write_assignments(table, user_ids, campaign_id, assigned_at=None):
+    """Write one assignment item per user through batch_writer (25 puts per request).
+
+    Returns the number of users assigned.
+    """
+    assigned_at = assigned_at or utc_now()
+    count = 0
+    with table.batch_writer(overwrite_by_pkeys=['user_id', 'assigned_key']) as batch:
+        for user_id in user_ids:
+            batch.put_item(Item=assignment_item(user_id, campaign_id, assigned_at))
+            count += 1
+    return count
+
+
+def newest_assignments(table, user_id, limit=HOME_OFFERS_LIMIT, before=None):
+    """Return (campaign_ids newest first, sort key to pass as `before` for the next page or None)."""
+    query = {
+        'KeyConditionExpression': "user_id = :u",
+        'ExpressionAttributeValues': {':u': user_id},
+        'ProjectionExpression': "user_id, assigned_key, campaign_id",
+        'ScanIndexForward': False,
+        'Limit': limit
+    }
+    if before:
+        query['ExclusiveStartKey'] = {'user_id': user_id, 'assigned_key': before}
+
+    response = table.query(**query)
+    campaign_ids = [item['campaign_id'] for item in response.get('Items', [])]
+    last_key = response.get('LastEvaluatedKey')
+    return campaign_ids, last_key['assigned_key'] if last_key else None
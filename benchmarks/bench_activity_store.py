@@ -0,0 +1,78 @@
+"""Memory and scoring cost of the dict-of-dicts activity layout vs ActivityStore.
+
+Builds both layouts for the same synthetic users, measures their memory with
+tracemalloc, and times turning all of them into model input and scoring it:
+build_feature_matrix over the dicts vs the store's zero-copy view().
+
+Run from the repository root:
+    python -m benchmarks.bench_activity_store --users 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from activity_store import ActivityStore
+from benchmarks.synthetic import synthetic_features
+from scoring import FEATURES, build_feature_matrix, load_model
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    rows = synthetic_features(args.users).tolist()
+    model = load_model("campaign_model.pkl")
+
+    def build_dicts():
+        return {user_id: dict(zip(FEATURES, row)) for user_id, row in enumerate(rows, start=1)}
+
+    def build_store():
+        store = ActivityStore()
+        for user_id, row in enumerate(rows, start=1):
+            store.add(user_id, **dict(zip(FEATURES, row)))
+        return store
+
+    dicts, dict_bytes = measure(build_dicts)
+    store, store_bytes = measure(build_store)
+    per_million = 1000000 / args.users
+    print(f"{args.users:,} users")
+    print(f"{'layout':>12} {'MB/1M users':>12} {'bytes/user':>11}")
+    print(f"{'dict':>12} {dict_bytes * per_million / 2**20:>12.1f} {dict_bytes / args.users:>11.0f}")
+    print(f"{'store':>12} {store_bytes * per_million / 2**20:>12.1f} {store_bytes / args.users:>11.0f}")
+    print(f"  of which counter array: {store._data.nbytes / args.users:.0f} bytes/user (capacity {len(store._data):,})")
+
+    start = time.perf_counter()
+    dict_predictions = model.predict(build_feature_matrix(dicts.values()))
+    dict_score = time.perf_counter() - start
+
+    start = time.perf_counter()
+    view = store.view()
+    store_predictions = model.predict(view)
+    store_score = time.perf_counter() - start
+    assert np.shares_memory(view, store._data)
+    assert np.array_equal(dict_predictions, store_predictions)
+    print(f"score every user: dicts {dict_score:.2f}s, store view {store_score:.2f}s")
+
+    start = time.perf_counter()
+    for user_id in range(1, 100001):
+        store.increment(user_id, seen=True, total_visits=1)
+    print(f"increment: {(time.perf_counter() - start) / 100000 * 1e6:.2f} us per call")
+
+
+if __name__ == "__main__":
+    main()
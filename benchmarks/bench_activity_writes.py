@@ -0,0 +1,74 @@
+"""UserActivity write calls per 1,000 requests, write-through vs write-behind.
+
+Drives a /home, /campaign/<id> and /buy/<id> mix through the dynamodb backend against
+the in-memory tables and checks both modes end with the same counters.
+
+Run from the repository root:
+    python -m benchmarks.bench_activity_writes --requests 1000 --users 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import warnings
+
+from benchmarks.fake_aws import install_fakes, total_calls
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aws_app  # noqa: E402
+from activity_buffer import COUNTERS  # noqa: E402
+
+
+def run(requests, users, max_staleness, seed=0):
+    dynamodb = install_fakes(aws_app, activity_max_staleness=max_staleness)
+    dynamodb.Table('Products').load([{'product_id': '1', 'name': 'Pen', 'price': 10, 'image': 'product1.jpg'}])
+
+    rng = random.Random(seed)
+    clients = []
+    for i in range(users):
+        client = aws_app.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = f"u{i}"
+            session['username'] = f"user{i}"
+        clients.append(client)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        client = rng.choice(clients)
+        roll = rng.random()
+        if roll < 0.6:
+            client.get('/home')
+        elif roll < 0.8:
+            client.get('/campaign/c1')
+        else:
+            client.post('/buy/1')
+    elapsed = time.perf_counter() - start
+    aws_app.backend.close()
+
+    writes = total_calls(dynamodb)['UserActivity.update_item']
+    table = dynamodb.Table('UserActivity')
+    counters = {f"u{i}": tuple(table.get_item(Key={'user_id': f"u{i}"}).get('Item', {}).get(c, 0)
+                               for c in COUNTERS) for i in range(users)}
+    return writes * 1000 / requests, requests / elapsed, counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--max-staleness", type=float, default=5.0)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    before, before_rps, before_counters = run(args.requests, args.users, 0)
+    after, after_rps, after_counters = run(args.requests, args.users, args.max_staleness)
+    assert before_counters == after_counters, "write-behind lost or duplicated increments"
+
+    print(f"{'mode':>14} {'writes/1k req':>14} {'req/s':>8}")
+    print(f"{'write-through':>14} {before:>14.0f} {before_rps:>8.0f}")
+    print(f"{'write-behind':>14} {after:>14.0f} {after_rps:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
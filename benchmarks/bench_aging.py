@@ -0,0 +1,75 @@
+"""Runtime and write volume of the nightly recency aging job.
+
+Loads --users synthetic users into each backend (a --never-seen fraction
+have last_open_days 999 and no last_seen), then runs age_activity() twice:
+a day later, when every seen user's count moves on by one, and again at
+the same time, when nothing has changed and nothing should be written.
+DynamoDB runs on the in-memory fake tables.
+
+Run from the repository root:
+    python -m benchmarks.bench_aging --users 1000000 --backends memory,sqlite
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from activity_aging import DAY, NEVER_SEEN_DAYS
+from benchmarks.bench_backends import make_backend
+from benchmarks.synthetic import synthetic_features
+from prediction_cache import CachedModel
+from scoring import FEATURES
+
+LOAD_CHUNK = 50000
+
+
+def load(backend, users, never_seen, seed=0):
+    features = synthetic_features(users, seed)
+    rng = np.random.default_rng(seed)
+    features[rng.random(users) < never_seen, FEATURES.index("last_open_days")] = NEVER_SEEN_DAYS
+    for start in range(0, users, LOAD_CHUNK):
+        rows = features[start:start + LOAD_CHUNK].tolist()
+        backend.put_activity({f"u{start + i}": dict(zip(FEATURES, row)) for i, row in enumerate(rows)})
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--backends", default="memory,sqlite,dynamodb")
+    parser.add_argument("--never-seen", type=float, default=0.2, help="fraction of users with no last_seen")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    model = CachedModel("campaign_model.pkl")
+    model.registry.current()
+    print(f"{args.users:,} users, {args.never_seen:.0%} never seen")
+    print(f"{'backend':>10} {'run':>9} {'seconds':>8} {'scanned':>10} {'written':>10} {'rows/s':>10}")
+    for name in args.backends.split(","):
+        workdir = tempfile.mkdtemp()
+        backend = make_backend(name, model, workdir, 0.0)
+        try:
+            _, seconds = timed(lambda: load(backend, args.users, args.never_seen))
+            print(f"{name:>10} {'load':>9} {seconds:>8.1f}")
+            now = time.time() + DAY
+            for run in ("next day", "rerun"):
+                result, seconds = timed(lambda: backend.age_activity(now))
+                print(f"{name:>10} {run:>9} {seconds:>8.1f} {result['scanned']:>10,} {result['updated']:>10,} "
+                      f"{result['scanned'] / seconds:>10,.0f}")
+        finally:
+            backend.close()
+            if hasattr(backend, "server"):
+                backend.server.close()
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
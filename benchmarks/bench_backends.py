@@ -0,0 +1,145 @@
+"""The same storage workload against every backend.
+
+Each backend gets identical calls through the StorageBackend interface:
+signups, logins, /home reads (newest assignments + batch campaign get +
+activity increment), clicks and buys, then a launch to every segment.
+Reports ops/s per phase and checks every backend targeted the same users.
+DynamoDB runs on the in-memory fake tables, with an optional per-call latency.
+
+Run from the repository root:
+    python -m benchmarks.bench_backends --users 2000 --requests 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import warnings
+
+from assignments import HOME_OFFERS_LIMIT, utc_now
+from benchmarks.fake_aws import TABLE_INDEXES, TABLES, FakeDynamoDB, FakeTable
+from prediction_cache import CachedModel
+from storage import BACKENDS, create_backend
+from storage.memory import MemoryBackend
+from storage.seed import PRODUCTS
+from storage.state_server import StateServer
+
+SEGMENTS = (0, 1, 2, 3)
+
+
+def make_backend(name, model, workdir, latency):
+    if name == "sqlite":
+        return create_backend(name, model, path=os.path.join(workdir, "bench.db"))
+    if name == "dynamodb":
+        dynamodb = FakeDynamoDB([FakeTable(table, *keys, latency=latency, indexes=TABLE_INDEXES.get(table))
+                                 for table, keys in TABLES.items()], latency=latency)
+        backend = create_backend(name, model, dynamodb=dynamodb)
+        backend.put_products(PRODUCTS)
+        return backend
+    if name == "state_server":
+        # The server runs on a thread here, but every call still crosses a Unix socket
+        server = StateServer(MemoryBackend(model), os.path.join(workdir, "bench.sock")).start()
+        backend = create_backend(name, model, address=server.address)
+        backend.server = server  # closed along with the backend
+        return backend
+    return create_backend(name, model)
+
+
+def run(backend, users, requests, seed=0):
+    rng = random.Random(seed)
+    timings = {}
+
+    def phase(label, count, fn):
+        start = time.perf_counter()
+        fn()
+        timings[label] = count / (time.perf_counter() - start)
+
+    user_ids = []
+    phase("signup", users, lambda: user_ids.extend(
+        backend.create_user(f"user{i}", "pw")["user_id"] for i in range(users)))
+
+    def logins():
+        for _ in range(users):
+            user = backend.get_user_by_username(f"user{rng.randrange(users)}")
+            backend.increment_activity(user["user_id"], seen=True, total_visits=1)
+    phase("login", users, logins)
+
+    # A launch to every segment; the first one gives /home offers to read
+    def launch_all():
+        for segment in SEGMENTS:
+            campaign = backend.create_campaign({"name": f"seg{segment}", "offer": "10% off", "segment": segment,
+                                                "start_time": "", "end_time": "", "status": "Scheduled"})
+            assigned_at = utc_now()
+            backend.flush_activity()
+            for page, _ in backend.segment_target_pages(segment):
+                backend.assign_campaign(page, campaign["campaign_id"], assigned_at)
+    phase("launch", 4, launch_all)
+
+    product_ids = [p["product_id"] for p in PRODUCTS]
+
+    def traffic():
+        for _ in range(requests):
+            user_id = rng.choice(user_ids)
+            roll = rng.random()
+            if roll < 0.6:
+                campaign_ids, _ = backend.newest_assignments(user_id, HOME_OFFERS_LIMIT)
+                campaigns = backend.get_campaigns(campaign_ids)
+                backend.increment_activity(user_id, seen=True, total_visits=1, offers_opened=len(campaigns))
+            elif roll < 0.8:
+                backend.increment_activity(user_id, offers_clicked=1)
+            else:
+                if backend.increment_product_purchases(rng.choice(product_ids)):
+                    backend.increment_activity(user_id, purchases=1)
+    phase("requests", requests, traffic)
+    phase("relaunch", 4, launch_all)
+
+    backend.flush_activity()
+    targets = {}
+    for segment in SEGMENTS:
+        # Map ids back to usernames so backends with different id schemes compare
+        ids = [uid for page, _ in backend.segment_target_pages(segment) for uid in page]
+        targets[segment] = sorted(user["username"] for user in backend.get_users(ids).values())
+    return timings, targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--dynamodb-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    model = CachedModel("campaign_model.pkl")
+    model.registry.current()  # load before timing, so the first backend doesn't pay for it
+    workdir = tempfile.mkdtemp()
+    results = {}
+    try:
+        for name in args.backends.split(","):
+            backend = make_backend(name, model, workdir, args.dynamodb_latency_ms / 1000)
+            try:
+                results[name] = run(backend, args.users, args.requests)
+            finally:
+                backend.close()
+                if getattr(backend, "server", None) is not None:
+                    backend.server.close()
+    finally:
+        shutil.rmtree(workdir)
+
+    phases = list(next(iter(results.values()))[0])
+    print(f"{args.users:,} users, {args.requests:,} requests; ops/s per phase (launch: per segment)")
+    print(f"{'backend':>12} " + " ".join(f"{p:>10}" for p in phases))
+    for name, (timings, _) in results.items():
+        print(f"{name:>12} " + " ".join(f"{timings[p]:>10.0f}" for p in phases))
+
+    reference_name, (_, reference) = next(iter(results.items()))
+    for name, (_, targets) in results.items():
+        assert targets == reference, f"{name} targets differ from {reference_name}"
+    print("targets per segment (identical on every backend):",
+          {segment: len(users) for segment, users in reference.items()})
+
+
+if __name__ == "__main__":
+    main()
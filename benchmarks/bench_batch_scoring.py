@@ -0,0 +1,64 @@
+"""Per-user predict loop vs chunked batch scoring for a campaign launch.
+
+Run from the repository root:
+    python -m benchmarks.bench_batch_scoring --sizes 10000,100000,1000000
+"""
+import argparse
+import pickle
+import time
+import warnings
+
+from benchmarks.synthetic import synthetic_activity
+from scoring import CHUNK_SIZE, select_targets
+
+
+def per_row_targets(model, items, selected_segment):
+    # The launch loop as it was: one predict call per user
+    targeted = []
+    for user_id, activity in items:
+        features = [[activity["offers_opened"], activity["offers_clicked"], activity["purchases"],
+                     activity["last_open_days"], activity["total_visits"]]]
+        send_campaign, customer_profile = model.predict(features)[0]
+        if customer_profile == selected_segment and (send_campaign == 1 or activity["total_visits"] >= 2):
+            targeted.append(user_id)
+    return targeted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="campaign_model.pkl")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--segment", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--loop-sample", type=int, default=10000,
+                        help="time the per-row loop on at most this many users and extrapolate")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+
+    print(f"{'users':>10} {'loop s':>10} {'batch s':>10} {'speedup':>9} {'targeted':>9}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        items = list(synthetic_activity(n))
+
+        sample = items[:args.loop_sample]
+        start = time.perf_counter()
+        loop_targets = per_row_targets(model, sample, args.segment)
+        loop_seconds = (time.perf_counter() - start) * n / len(sample)
+
+        start = time.perf_counter()
+        batch_targets = list(select_targets(model, items, args.segment, args.chunk_size))
+        batch_seconds = time.perf_counter() - start
+
+        # Both paths must target exactly the same users
+        sampled_ids = {user_id for user_id, _ in sample}
+        assert [u for u in batch_targets if u in sampled_ids] == loop_targets
+        estimated = "*" if len(sample) < n else ""
+        print(f"{n:>10} {loop_seconds:>9.2f}{estimated or ' '} {batch_seconds:>10.3f} "
+              f"{loop_seconds / batch_seconds:>8.0f}x {len(batch_targets):>9}")
+    print("* per-row loop time extrapolated from --loop-sample users")
+
+
+if __name__ == "__main__":
+    main()
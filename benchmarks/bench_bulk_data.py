@@ -0,0 +1,70 @@
+"""Import/export throughput of bulk_data.py against the fake tables.
+
+Writes a synthetic JSONL file, imports it with 1..N batch_writer workers
+and exports it back with a parallel scan, reporting rows/s. --latency-ms
+adds per-call latency to the fakes, which is what parallel workers hide.
+With --usernames every row also claims a username, a conditional put per
+row that can't be batched, so expect that to dominate import time.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_data --rows 20000 --latency-ms 5
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import warnings
+
+import bulk_data
+from benchmarks.fake_aws import TABLE_INDEXES, TABLES, FakeDynamoDB, FakeTable
+from benchmarks.synthetic import synthetic_activity
+from scoring import load_model
+
+
+def fake_dynamodb(latency):
+    return FakeDynamoDB([FakeTable(name, *keys, latency=latency, indexes=TABLE_INDEXES.get(name))
+                         for name, keys in TABLES.items()], latency=latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--usernames", action="store_true", help="import users and usernames too")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    model = load_model("campaign_model.pkl")
+    workdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(workdir, "activity.jsonl")
+        with open(source, "w") as f:
+            for user_id, activity in synthetic_activity(args.rows):
+                row = dict(activity, user_id=f"u{user_id}")
+                if args.usernames:
+                    row.update(username=f"user{user_id}", password="pw")
+                f.write(json.dumps(row) + "\n")
+
+        print(f"{args.rows:,} rows, {args.latency_ms:g} ms per call")
+        print(f"{'direction':>9} {'workers':>7} {'rows/s':>9}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            dynamodb = fake_dynamodb(args.latency_ms / 1000)
+            checkpoint = bulk_data.Checkpoint(os.path.join(workdir, "import.ckpt"), source)
+            checkpoint.save(0)
+            progress = bulk_data.Importer(dynamodb, model).run(bulk_data.read_rows(source), checkpoint,
+                                                               workers=workers, report_every=0)
+            assert progress.rows == args.rows and checkpoint.rows == args.rows
+            print(f"{'import':>9} {workers:>7} {progress.rate():>9,.0f}")
+
+            progress = bulk_data.export_activity(dynamodb, os.path.join(workdir, "export.csv"), segments=workers,
+                                                 with_users=args.usernames, report_every=0)
+            assert progress.rows == args.rows
+            print(f"{'export':>9} {workers:>7} {progress.rate():>9,.0f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
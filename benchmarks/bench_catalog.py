@@ -0,0 +1,100 @@
+"""Products table reads and 304s per 1,000 page views with the catalog snapshot.
+
+Simulated browsers (one test client each) view /home and product pages and
+sometimes buy, twice over: once with no browser cache, then keeping each
+page's ETag and sending it back as If-None-Match, as a browser does for
+`Cache-Control: no-cache` pages. A buy changes the purchase count on that
+product's page, so every browser refetches it once. The catalog reloads every --refresh-ms in the background, so the scans it
+makes depend on how long the run takes, not on how many pages are viewed.
+The app runs on the dynamodb backend over the in-memory fake tables.
+
+Run from the repository root:
+    python -m benchmarks.bench_catalog --views 5000 --refresh-ms 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import warnings
+
+from benchmarks.fake_aws import install_fakes
+from catalog import ProductCatalog
+from storage.seed import PRODUCTS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STORAGE_BACKEND", "dynamodb")
+import app  # noqa: E402
+
+
+class Browser:
+    def __init__(self, user, revalidate):
+        self.client = app.app.test_client()
+        self.revalidate = revalidate
+        self.etags = {}
+        with self.client.session_transaction() as session:
+            session["user_id"] = user["user_id"]
+            session["username"] = user["username"]
+
+    def view(self, path):
+        headers = {"If-None-Match": self.etags[path]} if self.revalidate and path in self.etags else {}
+        response = self.client.get(path, headers=headers)
+        assert response.status_code in (200, 304), (path, response.status_code)
+        if response.headers.get("ETag"):
+            self.etags[path] = response.headers["ETag"]
+        return response.status_code, len(response.data)
+
+
+def run(views, users, buy_rate, revalidate, refresh, seed=0):
+    dynamodb = install_fakes(app, products=PRODUCTS, activity_max_staleness=0)
+    app.catalog.stop()
+    app.catalog = ProductCatalog(lambda: app.backend.list_products(), refresh_interval=refresh).start()
+    rng = random.Random(seed)
+    browsers = [Browser(app.backend.create_user(f"catalog{i}", "pw"), revalidate) for i in range(users)]
+    paths = ["/home"] + [f"/product/{p['product_id']}" for p in PRODUCTS]
+    products = dynamodb.Table("Products")
+    products.calls.clear()
+
+    not_modified = sent = 0
+    start = time.perf_counter()
+    for _ in range(views):
+        browser = rng.choice(browsers)
+        path = rng.choice(paths)
+        status, size = browser.view(path)
+        not_modified += status == 304
+        sent += size
+        if path != "/home" and rng.random() < buy_rate:
+            browser.client.post(f"/buy/{path.rsplit('/', 1)[1]}")
+    elapsed = time.perf_counter() - start
+    return {
+        "scans": products.calls["scan"] * 1000 / views,
+        "get_items": products.calls["get_item"] * 1000 / views,
+        "reloads": app.catalog.reloads,
+        "not_modified": not_modified / views,
+        "kb_per_view": sent / views / 1024,
+        "views_per_s": views / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--views", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--buy-rate", type=float, default=0.05, help="chance a product view is followed by a buy")
+    parser.add_argument("--refresh-ms", type=float, default=200.0)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    app.events.stream = open(os.devnull, "w")
+
+    print(f"{args.views:,} views, {args.users} users, catalog reload every {args.refresh_ms:g} ms")
+    print(f"{'browser':>11} {'scans/1k':>9} {'gets/1k':>8} {'reloads':>8} {'304s':>6} {'KB/view':>8} {'views/s':>8}")
+    for revalidate in (False, True):
+        result = run(args.views, args.users, args.buy_rate, revalidate, args.refresh_ms / 1000)
+        print(f"{'revalidate' if revalidate else 'no cache':>11} {result['scans']:>9.2f} {result['get_items']:>8.2f} "
+              f"{result['reloads']:>8} {result['not_modified']:>6.0%} {result['kb_per_view']:>8.2f} "
+              f"{result['views_per_s']:>8,.0f}")
+    app.backend.close()
+
+
+if __name__ == "__main__":
+    main()
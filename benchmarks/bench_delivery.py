@@ -0,0 +1,112 @@
+"""Throughput of the per-user delivery stage against a local fake SNS.
+
+Delivers one campaign to --recipients users (pages of --page-size, as a
+launch reads them) through CampaignDelivery on a MemoryBackend, with every
+publish_batch call taking --sns-latency-ms, and compares:
+
+  publish       one sns.publish per user on one thread, the obvious loop
+                (timed on --baseline users and extrapolated)
+  delivery      publish_batch from --workers threads, uncapped
+
+then checks that a --rate cap holds (on --capped users), and that with
+every 7th entry failing, retries still reach everyone exactly once and a
+replay of every page sends nothing.
+
+Run from the repository root:
+    python -m benchmarks.bench_delivery --recipients 1000000 --workers 8 --sns-latency-ms 5
+"""
+import argparse
+import time
+
+from benchmarks.fake_aws import FakeSNS
+from delivery import CampaignDelivery
+from storage.memory import MemoryBackend
+
+TOPIC_ARN = "arn:aws:sns:us-east-1:000000000000:campaign_deliveries"
+
+CAMPAIGN = {
+    "campaign_id": "c1",
+    "name": "Autumn sale",
+    "subject": "{username}, your autumn offer",
+    "offer": "Hi {username}, take 20% off everything until {end_time}.",
+    "end_time": "2026-11-01T00:00"
+}
+
+
+def backend_with_users(n):
+    # Users go straight into the dicts: signing up a million through
+    # create_user would time the model, not the delivery
+    backend = MemoryBackend(model=None)
+    for i in range(n):
+        backend.users[f"u{i}"] = {"user_id": f"u{i}", "username": f"user{i}"}
+    return backend
+
+
+def pages(n, size):
+    for start in range(0, n, size):
+        yield [f"u{i}" for i in range(start, min(start + size, n))]
+
+
+def deliver(backend, sns, n, page_size, campaign=CAMPAIGN, **kwargs):
+    sender = CampaignDelivery(backend, sns, TOPIC_ARN, campaign, **kwargs)
+    delivered = failed = 0
+    start = time.perf_counter()
+    for user_ids in pages(n, page_size):
+        sent, lost = sender.deliver(user_ids)
+        delivered += sent
+        failed += lost
+    return sender, delivered, failed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sns-latency-ms", type=float, default=5.0)
+    parser.add_argument("--baseline", type=int, default=1000, help="users timed for the publish loop")
+    parser.add_argument("--rate", type=int, default=2000, help="messages per second for the capped run")
+    parser.add_argument("--capped", type=int, default=20000, help="users in the capped run")
+    args = parser.parse_args()
+    latency = args.sns_latency_ms / 1000
+    n = args.recipients
+
+    backend = backend_with_users(max(n, args.capped))
+    print(f"{n:,} recipients, {args.sns_latency_ms:g} ms per SNS call")
+    print(f"{'method':>9} {'seconds':>9} {'msgs/s':>9} {'SNS calls':>10}")
+
+    sns = FakeSNS(latency=latency, keep_messages=False)
+    start = time.perf_counter()
+    for user_id in (f"u{i}" for i in range(args.baseline)):
+        sns.publish(TopicArn=TOPIC_ARN, Subject=CAMPAIGN["subject"], Message=CAMPAIGN["offer"])
+    per_message = (time.perf_counter() - start) / args.baseline
+    print(f"{'publish':>9} {per_message * n:>9,.0f} {1 / per_message:>9,.0f} {n:>10,}  (extrapolated)")
+
+    sns = FakeSNS(latency=latency, keep_messages=False)
+    sender, delivered, failed, seconds = deliver(backend, sns, n, args.page_size, rate=0, workers=args.workers)
+    print(f"{'delivery':>9} {seconds:>9,.1f} {delivered / seconds:>9,.0f} {sns.calls['publish_batch']:>10,}")
+    assert delivered == n and failed == 0 and sns.published == n
+    assert max(sns.recipients.values()) == 1
+
+    # Per-campaign cap
+    capped = dict(CAMPAIGN, campaign_id="c2")
+    sns = FakeSNS(latency=latency, keep_messages=False)
+    _, delivered, _, seconds = deliver(backend, sns, args.capped, args.page_size, capped, rate=args.rate,
+                                       workers=args.workers)
+    print(f"capped at {args.rate:,}/s: {delivered:,} messages in {seconds:.1f}s = {delivered / seconds:,.0f}/s")
+    assert delivered / seconds <= args.rate * 1.05
+
+    # Retries and replays: every recipient exactly once
+    retried = dict(CAMPAIGN, campaign_id="c3")
+    m = min(n, 100000)
+    sns = FakeSNS(latency=latency, fail_every=7, keep_messages=False)
+    sender, delivered, failed, _ = deliver(backend, sns, m, args.page_size, retried, rate=0, workers=args.workers)
+    _, replayed, _, _ = deliver(backend, sns, m, args.page_size, retried, rate=0, workers=args.workers)
+    duplicates = sum(count - 1 for count in sns.recipients.values() if count > 1)
+    print(f"every 7th entry failing, {m:,} recipients: {delivered:,} delivered, {failed} failed, "
+          f"{sender.retries:,} retried batches; replaying every page sent {replayed}, duplicates {duplicates}")
+    assert delivered + failed == m and replayed == 0 and duplicates == 0 and len(sns.recipients) == delivered
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""DynamoDB calls per /home render of the app on the dynamodb backend, against in-memory tables.
+
+Run from the repository root:
+    python -m benchmarks.bench_home_reads
+"""
+import argparse
+import os
+import sys
+import warnings
+
+from assignments import assignment_item
+from benchmarks.fake_aws import install_fakes, total_calls
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aws_app  # noqa: E402
+
+
+def seed(dynamodb, offers):
+    dynamodb.Table('Users').load([{'user_id': 'u1', 'username': 'alice', 'password': 'pw'}])
+    dynamodb.Table('UserActivity').load([{'user_id': 'u1', 'offers_opened': 0, 'offers_clicked': 0,
+                                          'purchases': 0, 'last_open_days': 0, 'total_visits': 1}])
+    dynamodb.Table('Campaigns').load({'campaign_id': f'c{i}', 'name': f'Campaign {i}', 'offer': '10% off',
+                                      'start_time': '', 'end_time': ''} for i in range(offers))
+    dynamodb.Table('CampaignAssignments').load(assignment_item('u1', f'c{i}', f'2026-01-01T00:00:{i:06d}')
+                                               for i in range(offers))
+    dynamodb.Table('Products').load({'product_id': str(i), 'name': f'Product {i}', 'price': 100,
+                                     'image': f'product{i}.jpg'} for i in range(1, 10))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--offers", default="0,5,50,500")
+    parser.add_argument("--renders", type=int, default=100)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    print(f"{'offers':>7} {'before':>7} {'first':>6} {'steady':>7}  campaign cache")
+    for offers in (int(n) for n in args.offers.split(",")):
+        dynamodb = install_fakes(aws_app)
+        aws_app.campaign_cache.clear()
+        aws_app.catalog.clear()
+        seed(dynamodb, offers)
+
+        client = aws_app.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 'u1'
+            session['username'] = 'alice'
+
+        # Flush buffered activity writes so they are counted against the renders
+        assert client.get('/home').status_code == 200
+        aws_app.backend.flush_activity()
+        first = sum(total_calls(dynamodb).values())
+        for _ in range(args.renders - 1):
+            client.get('/home')
+        aws_app.backend.flush_activity()
+        steady = (sum(total_calls(dynamodb).values()) - first) / max(args.renders - 1, 1)
+
+        # Before: visit update + UserCampaigns get + (get_item + update_item) per offer + products scan
+        # (/home now shows at most HOME_OFFERS_LIMIT offers per page)
+        before = 3 + 2 * offers
+        print(f"{offers:>7} {before:>7} {first:>6} {steady:>7.2f}  {aws_app.campaign_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Pickled sklearn model vs the NumPy LinearCampaignModel kernel.
+
+Checks the kernel's predictions are identical to model.predict on the
+campaign dataset, then reports single-row latency and batch throughput.
+
+Run from the repository root:
+    python -m benchmarks.bench_inference
+"""
+import argparse
+import pickle
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.synthetic import load_dataset_features, synthetic_features
+from scoring import LinearCampaignModel
+
+
+def single_row_latency(model, rows, repeat):
+    timings = []
+    for i in range(repeat):
+        row = rows[i % len(rows)].reshape(1, -1)
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1e6, np.percentile(timings, 99) * 1e6
+
+
+def batch_throughput(model, X):
+    start = time.perf_counter()
+    model.predict(X)
+    return len(X) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="campaign_model.pkl")
+    parser.add_argument("--repeat", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    with open(args.model, "rb") as f:
+        sklearn_model = pickle.load(f)
+    kernel = LinearCampaignModel(sklearn_model)
+
+    dataset = load_dataset_features().astype(np.float64)
+    assert np.array_equal(kernel.predict(dataset), sklearn_model.predict(dataset))
+    print(f"predictions identical on {len(dataset)} dataset rows")
+
+    batch = synthetic_features(args.batch_size).astype(np.float64)
+    print(f"{'model':>8} {'p50 us':>9} {'p99 us':>9} {'batch rows/s':>14}")
+    for name, model in (("sklearn", sklearn_model), ("numpy", kernel)):
+        p50, p99 = single_row_latency(model, dataset, args.repeat)
+        print(f"{name:>8} {p50:>9.1f} {p99:>9.1f} {batch_throughput(model, batch):>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Username lookup latency for login as the user base grows.
+
+Compares the old linear scan over the users list with the users_by_username
+dict index used by the memory backend, and counts DynamoDB calls per login
+through the dynamodb backend's Usernames table. Index values share one record object so 10M
+users fit in memory; the lookup cost only depends on the keys.
+
+Run from the repository root:
+    python -m benchmarks.bench_login --sizes 1000,100000,1000000,10000000
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.fake_aws import install_fakes, total_calls
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aws_app  # noqa: E402
+
+
+def linear_lookup(users, username):
+    for user in users:
+        if user['username'] == username:
+            return user
+    return None
+
+
+def time_lookups(lookup, probes):
+    timings = []
+    for username in probes:
+        start = time.perf_counter()
+        assert lookup(username) is not None
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1e6
+
+
+def dynamodb_calls_per_login(logins=20):
+    dynamodb = install_fakes(aws_app)
+    client = aws_app.app.test_client()
+    client.post('/signup', data={'username': 'alice', 'password': 'pw'})
+    before = total_calls(dynamodb)
+    for _ in range(logins):
+        client.post('/login', data={'username': 'alice', 'password': 'pw'})
+    calls = total_calls(dynamodb) - before
+    return {op: n / logins for op, n in calls.items() if not op.startswith('SNS')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000,10000000")
+    parser.add_argument("--probes", type=int, default=1000)
+    parser.add_argument("--linear-max", type=int, default=100000, help="skip the linear scan above this size")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    rng = np.random.default_rng(0)
+
+    print(f"{'users':>10} {'linear us':>10} {'index us':>9}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        record = {'user_id': 0, 'username': '', 'password': 'pw'}
+        index = dict.fromkeys((f"user{i}" for i in range(n)), record)
+        probes = [f"user{i}" for i in rng.integers(0, n, size=args.probes)]
+
+        linear = "-"
+        if n <= args.linear_max:
+            users = [{'user_id': i, 'username': f"user{i}", 'password': 'pw'} for i in range(n)]
+            linear = f"{time_lookups(lambda u: linear_lookup(users, u), probes[:100]):.1f}"
+            del users
+        print(f"{n:>10} {linear:>10} {time_lookups(index.get, probes):>9.2f}")
+        del index
+
+    print("DynamoDB calls per login:", dynamodb_calls_per_login())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Login latency and SNS calls with synchronous publish vs the batched dispatcher.
+
+Uses the in-memory FakeSNS with a simulated round trip, and a second run
+where every 7th entry fails to show retries still deliver everything.
+
+Run from the repository root:
+    python -m benchmarks.bench_notifications --logins 500 --sns-latency-ms 20
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.fake_aws import FakeSNS, install_fakes
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aws_app  # noqa: E402
+from notifications import NotificationDispatcher  # noqa: E402
+
+
+class SyncPublisher:
+    # The old send_notification: one blocking sns.publish per message
+    def __init__(self, client, topic_arn):
+        self.client = client
+        self.topic_arn = topic_arn
+
+    def send(self, subject, message):
+        self.client.publish(TopicArn=self.topic_arn, Subject=subject, Message=message)
+
+    def stop(self):
+        pass
+
+
+def run(mode, logins, sns):
+    install_fakes(aws_app)
+    if mode == "sync":
+        aws_app.notifier = SyncPublisher(sns, aws_app.SNS_TOPIC_ARN)
+    else:
+        aws_app.notifier = NotificationDispatcher(sns, aws_app.SNS_TOPIC_ARN, batch_wait=0.01)
+
+    client = aws_app.app.test_client()
+    client.post('/signup', data={'username': 'alice', 'password': 'pw'})
+    timings = []
+    for _ in range(logins):
+        start = time.perf_counter()
+        client.post('/login', data={'username': 'alice', 'password': 'pw'})
+        timings.append(time.perf_counter() - start)
+    aws_app.notifier.stop()
+    aws_app.backend.close()
+    return np.median(timings) * 1000, np.percentile(timings, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--sns-latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    messages = args.logins + 1
+
+    print(f"{'mode':>6} {'p50 ms':>8} {'p99 ms':>8} {'SNS calls/1k msgs':>18} {'delivered':>10}")
+    for mode in ("sync", "async"):
+        sns = FakeSNS(latency=args.sns_latency_ms / 1000)
+        p50, p99 = run(mode, args.logins, sns)
+        calls = sum(sns.calls.values())
+        print(f"{mode:>6} {p50:>8.2f} {p99:>8.2f} {calls * 1000 / messages:>18.0f} {len(sns.messages):>10}")
+
+    sns = FakeSNS(latency=args.sns_latency_ms / 1000, fail_every=7)
+    run("async", args.logins, sns)
+    print("with every 7th entry failing:", aws_app.notifier.stats())
+    assert len(sns.messages) == messages
+
+
+if __name__ == "__main__":
+    main()
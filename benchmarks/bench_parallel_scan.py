@@ -0,0 +1,60 @@
+"""Single scan() call vs paginated serial scan vs parallel scan of UserActivity.
+
+Runs against the in-memory FakeTable with a simulated per-call latency and
+feeds the parallel scan straight into batch scoring, as the launch path does.
+
+Run from the repository root:
+    python -m benchmarks.bench_parallel_scan --users 3000000
+"""
+import argparse
+import time
+import warnings
+
+from benchmarks.fake_aws import FakeTable
+from benchmarks.synthetic import synthetic_activity
+from dynamo_scan import FEATURE_PROJECTION, scan_activity, scan_pages
+from scoring import load_model, select_targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=3000000)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated latency per scan call")
+    parser.add_argument("--segments", default="1,4,8,16")
+    parser.add_argument("--segment", type=int, default=1, help="campaign segment to score for")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    table = FakeTable('UserActivity', 'user_id', latency=args.latency_ms / 1000)
+    table.load(dict(activity, user_id=str(user_id), username=f"user{user_id}")
+               for user_id, activity in synthetic_activity(args.users))
+    model = load_model("campaign_model.pkl")
+    print(f"{len(table):,} items, {args.latency_ms} ms per scan call")
+
+    first_page = table.scan()['Items']
+    print(f"single scan() call returns {len(first_page):,} users "
+          f"({args.users - len(first_page):,} silently skipped)")
+
+    start = time.perf_counter()
+    serial = sum(len(page) for page in scan_pages(table, ProjectionExpression=FEATURE_PROJECTION))
+    print(f"paginated serial scan: {serial:,} users in {time.perf_counter() - start:.2f}s")
+
+    print(f"{'segments':>9} {'users':>10} {'targeted':>10} {'seconds':>8} {'users/s':>11}")
+    for segments in (int(s) for s in args.segments.split(",")):
+        start = time.perf_counter()
+        seen = 0
+
+        def counted(items):
+            nonlocal seen
+            for pair in items:
+                seen += 1
+                yield pair
+
+        targeted = sum(1 for _ in select_targets(model, counted(scan_activity(table, segments)), args.segment))
+        elapsed = time.perf_counter() - start
+        assert seen == args.users
+        print(f"{segments:>9} {seen:>10,} {targeted:>10,} {elapsed:>8.2f} {seen / elapsed:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Scoring with and without the CachedModel prediction cache.
+
+Feature rows are resampled from data/campaign_dataset.csv, so the cache
+sees the dataset's mix of repeated feature tuples. Reports hit rate and
+throughput for single-row calls (the segment index update path) and for
+launch-sized batches (which skip the cache unless max_batch is lifted),
+with and without saturation bucketing, and checks the
+exact cache matches the uncached model (bucketing is approximate, so its
+agreement is reported).
+
+Run from the repository root:
+    python -m benchmarks.bench_prediction_cache
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_features
+from prediction_cache import CachedModel
+from scoring import load_dataset_features, load_model
+
+
+def single_rows(model, X):
+    start = time.perf_counter()
+    out = [model.predict(row.reshape(1, -1)) for row in X]
+    return np.vstack(out), len(X) / (time.perf_counter() - start)
+
+
+def batches(model, X, batch_size):
+    start = time.perf_counter()
+    out = [model.predict(X[i:i + batch_size]) for i in range(0, len(X), batch_size)]
+    return np.vstack(out), len(X) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="campaign_model.pkl")
+    parser.add_argument("--single-rows", type=int, default=50000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    plain = load_model(args.model)
+    reference = load_dataset_features()
+
+    # Shift a slice of users to large visit/recency counts, where bucketing matters
+    X = synthetic_features(args.rows, seed=1).astype(np.float64)
+    rng = np.random.default_rng(2)
+    tail = rng.random(len(X)) < 0.1
+    X[tail, 4] += rng.integers(0, 20000, tail.sum())
+    X[tail, 3] += rng.integers(0, 20000, tail.sum())
+    expected = plain.predict(X)
+    print(f"{args.rows:,} rows, {len(np.unique(X, axis=0)):,} distinct feature tuples")
+
+    print(f"{'model':>16} {'calls':>7} {'rows/s':>12} {'row hit rate':>13} {'cached keys':>12} {'agreement':>10}")
+    single = X[:args.single_rows]
+    variants = (("uncached", lambda: plain),
+                ("cached", lambda: CachedModel(args.model)),
+                ("cached+buckets", lambda: CachedModel(args.model, bucket_rows=reference)),
+                ("cached, no limit", lambda: CachedModel(args.model, max_batch=None)))
+    for name, make in variants:
+        for label, run, rows in (("single", lambda m: single_rows(m, single), single),
+                                 ("batch", lambda m: batches(m, X, args.batch_size), X)):
+            model = make()
+            predictions, rate = run(model)
+            agreement = (predictions == expected[:len(rows)]).all(axis=1).mean()
+            assert agreement == 1 or name == "cached+buckets", name
+            stats = model.stats() if hasattr(model, "stats") else {}
+            hit_rate = f"{stats['row_hit_rate']:.4f}" if stats else "-"
+            size = f"{stats['size']:,}" if stats else "-"
+            print(f"{name:>16} {label:>7} {rate:>12,.0f} {hit_rate:>13} {size:>12} {agreement:>10.5f}")
+
+
+if __name__ == "__main__":
+    main()
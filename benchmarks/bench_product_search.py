@@ -0,0 +1,143 @@
+"""Product search latency with the inverted index vs a full catalog scan.
+
+Builds --products synthetic products (words, tags and audiences drawn from
+Zipf-like vocabularies, so a few are on most products and most are rare),
+then runs each query shape through ProductIndex.search and through a scan
+of every product dict, checking both return the same matches. Last, it
+edits --changed products through a ProductCatalog reload and times how
+long the index takes to catch up, against rebuilding it from scratch.
+
+Run from the repository root:
+    python -m benchmarks.bench_product_search --products 100000
+"""
+import argparse
+import random
+import time
+
+from catalog import ProductCatalog
+from product_index import ProductIndex, as_list, product_tokens, words
+
+CATEGORIES = ["Electronics", "Books", "Fashion", "Home", "Sports", "Toys", "Beauty", "Grocery", "Garden", "Auto"]
+AUDIENCES = ["students", "working", "kids", "parents", "seniors", "gamers", "travellers", "athletes"]
+
+
+def vocabulary(prefix, n):
+    return [f"{prefix}{i}" for i in range(n)]
+
+
+def synthetic_products(n, seed=0):
+    rng = random.Random(seed)
+    words = vocabulary("w", 5000)
+    tags = vocabulary("t", 2000)
+    # Zipf-like: the i-th word is 1/i as common as the first
+    word_weights = [1 / (i + 1) for i in range(len(words))]
+    tag_weights = [1 / (i + 1) for i in range(len(tags))]
+    products = []
+    for i in range(n):
+        products.append({
+            "product_id": f"p{i}",
+            "name": " ".join(rng.choices(words, word_weights, k=2)),
+            "price": rng.randint(1, 1000) * 50,
+            "description": " ".join(rng.choices(words, word_weights, k=12)),
+            "category": rng.choice(CATEGORIES),
+            "tags": sorted(set(rng.choices(tags, tag_weights, k=3))),
+            "target_audience": sorted(set(rng.choices(AUDIENCES, k=2))),
+            "image": f"product{i % 9 + 1}.jpg",
+            "views": 0,
+            "purchases": 0
+        })
+    return products
+
+
+def scan(products, q="", category=None, tag=None, audience=None, min_price=None, max_price=None, **_):
+    """What search would do without the index: test every product."""
+    terms = set(words(q))
+    matches = []
+    for product in products:
+        if category and product["category"].lower() != category.lower():
+            continue
+        if tag and tag.lower() not in (t.lower() for t in as_list(product["tags"])):
+            continue
+        if audience and audience.lower() not in (a.lower() for a in as_list(product["target_audience"])):
+            continue
+        if min_price is not None and product["price"] < min_price:
+            continue
+        if max_price is not None and product["price"] > max_price:
+            continue
+        if terms and not terms <= product_tokens(product):
+            continue
+        matches.append(product["product_id"])
+    return matches
+
+
+QUERIES = {
+    "common word": {"q": "w0"},
+    "rare word": {"q": "w4000"},
+    "two words": {"q": "w1 w2"},
+    "category": {"category": "books"},
+    "tag + audience": {"tag": "t3", "audience": "kids"},
+    "word + category": {"q": "w5", "category": "electronics"},
+    "price range": {"min_price": 1000, "max_price": 1500},
+    "word + price": {"q": "w0", "min_price": 1000, "max_price": 5000},
+    "category, by price": {"category": "home", "sort": "-price"}
+}
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--changed", type=int, default=100, help="products edited between two catalog reloads")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    products = synthetic_products(args.products)
+    index = ProductIndex()
+    _, build = timed(lambda: index.update(products))
+    stats = index.stats()
+    print(f"{args.products:,} products, {stats['tokens']:,} tokens, built in {build:.2f}s")
+
+    print(f"{'query':>19} {'matches':>8} {'index ms':>9} {'cold ms':>8} {'scan ms':>8} {'speedup':>8}")
+    for label, query in QUERIES.items():
+        index._arrays.clear()  # first query after a change builds its posting arrays
+        (_, ids), cold = timed(lambda: index.search(limit=args.products, **query))
+        (total, ids), warm = timed(lambda: index.search(limit=args.products, **query), args.repeat)
+        expected, scanned = timed(lambda: scan(products, **query))
+        assert sorted(ids) == sorted(expected), label
+        print(f"{label:>19} {total:>8,} {warm * 1000:>9.3f} {cold * 1000:>8.2f} {scanned * 1000:>8.1f} "
+              f"{scanned / warm:>7,.0f}x")
+
+    # Incremental updates: a reload where --changed products were edited
+    current = [dict(p) for p in products]
+    catalog = ProductCatalog(lambda: current, refresh_interval=0)
+    index = ProductIndex()
+    applied = []
+
+    def on_change(changed, removed):
+        _, seconds = timed(lambda: index.update(changed.values(), removed))
+        applied.append((len(changed), seconds))
+
+    catalog.on_change(on_change)
+    catalog.current()
+    rng = random.Random(1)
+    for product in rng.sample(current, args.changed):
+        product.update(description=product["description"] + " clearance", price=product["price"] // 2)
+    _, reload_seconds = timed(catalog.refresh)
+    _, rebuild = timed(lambda: ProductIndex().update(current))
+    total, _ = index.search("clearance")
+    assert total == args.changed
+    assert sorted(index.search("w1", max_price=2000, limit=args.products)[1]) == sorted(
+        scan(current, "w1", max_price=2000))
+    changed, update_seconds = applied[-1]
+    print(f"reload with {changed} edited products: index update {update_seconds * 1000:.1f} ms "
+          f"(whole reload {reload_seconds * 1000:.0f} ms, rebuilding the index {rebuild * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
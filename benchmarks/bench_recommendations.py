@@ -0,0 +1,140 @@
+"""Build time, per-request cost and hit rate of the precomputed /home shelf.
+
+For each catalog size, synthetic users (each in one of four segments that
+favour two categories) buy a few products each, often the usual companion
+of their previous buy. Every user's last purchase is held out; the rest
+go into build_recommendations. Then, per user:
+
+  shelf     Recommendations.shelf() from their purchases and segment
+  live      what /home would do without the precomputed lists: score every
+            product against the user's purchases (content similarity) and
+            rank the catalog
+  popular   the most bought products, the same for everyone
+  catalog   the first products in catalog order, what /home showed before
+
+reporting microseconds per request and how often the held-out purchase is
+on the shelf.
+
+Run from the repository root:
+    python -m benchmarks.bench_recommendations --sizes 1000,10000,50000 --users 20000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.bench_product_search import CATEGORIES, synthetic_products
+from recommendations import RECENT_PURCHASES, SHELF_SIZE, build_recommendations, product_attributes
+
+SEGMENTS = 4
+
+
+def synthetic_purchases(products, users, seed=0):
+    """([(user_id, product_id)] oldest first, {user_id: segment})."""
+    rng = random.Random(seed)
+    by_category = {}
+    for product in products:
+        by_category.setdefault(product["category"], []).append(product["product_id"])
+    companion = {}
+    for ids in by_category.values():
+        rng.shuffle(ids)  # best sellers anywhere in the catalog, not first
+        for a, b in zip(ids[::2], ids[1::2]):
+            companion[a], companion[b] = b, a
+    favourites = {s: rng.sample(CATEGORIES, 2) for s in range(SEGMENTS)}
+
+    def pick(segment):
+        ids = by_category[rng.choice(favourites[segment])]
+        # Skewed: the first 1% of a category's products take about a fifth of its sales
+        return ids[int(len(ids) * rng.random() ** 3)]
+
+    purchases, segments = [], {}
+    for u in range(users):
+        user_id, segment = f"u{u}", u % SEGMENTS
+        segments[user_id] = segment
+        last = pick(segment)
+        purchases.append((user_id, last))
+        for _ in range(rng.randint(1, 5)):
+            last = companion.get(last, last) if rng.random() < 0.6 else pick(segment)
+            purchases.append((user_id, last))
+    return purchases, segments
+
+
+def live_shelf(content, positions, product_ids, purchased, size=SHELF_SIZE):
+    """Score the whole catalog for one user, as /home would without precomputed lists."""
+    rows = [positions[p] for p in purchased[:RECENT_PURCHASES]]
+    scores = np.asarray((content @ content[rows].T).sum(axis=1)).ravel()
+    scores[rows] = -1
+    best = np.argpartition(-scores, size)[:size]
+    return [product_ids[j] for j in best[np.argsort(-scores[best])]]
+
+
+def content_matrix(products):
+    from scipy import sparse
+
+    vocabulary, rows, cols = {}, [], []
+    for i, product in enumerate(products):
+        for attribute in product_attributes(product):
+            rows.append(i)
+            cols.append(vocabulary.setdefault(attribute, len(vocabulary)))
+    matrix = sparse.csr_matrix((np.ones(len(rows), np.float32), (rows, cols)), shape=(len(products), len(vocabulary)))
+    norms = np.sqrt(np.asarray(matrix.sum(axis=1)).ravel())
+    return sparse.diags(1 / norms) @ matrix
+
+
+def timed_each(fn, items):
+    results = []
+    start = time.perf_counter()
+    for item in items:
+        results.append(fn(item))
+    return results, (time.perf_counter() - start) / max(len(items), 1) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000", help="catalog sizes")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000, help="users whose shelf is timed")
+    args = parser.parse_args()
+
+    print(f"{'products':>9} {'purchases':>10} {'build s':>8} {'MB':>6} {'method':>8} {'us/request':>11} {'hit rate':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        products = synthetic_products(size)
+        purchases, segments = synthetic_purchases(products, args.users)
+        history = {}
+        for user_id, product_id in purchases:
+            history.setdefault(user_id, []).append(product_id)
+        held_out = {user_id: bought[-1] for user_id, bought in history.items()}
+        training = [(user_id, p) for user_id, bought in history.items() for p in bought[:-1]]
+        # The product counters include every training purchase
+        counts = {}
+        for _, product_id in training:
+            counts[product_id] = counts.get(product_id, 0) + 1
+        products = [dict(p, purchases=counts.get(p["product_id"], 0)) for p in products]
+
+        start = time.perf_counter()
+        recommendations = build_recommendations(products, training, segments)
+        build = time.perf_counter() - start
+        megabytes = (recommendations.neighbors.nbytes + recommendations.scores.nbytes) / 2 ** 20
+
+        users = list(history)[:args.requests]
+        recent = {u: history[u][:-1][::-1][:RECENT_PURCHASES] for u in users}
+        content = content_matrix(products)
+        product_ids = recommendations.product_ids
+        popular = [product_ids[j] for j in recommendations.popular[:SHELF_SIZE]]
+        methods = {
+            "shelf": lambda u: recommendations.shelf(recent[u], segments[u]),
+            "live": lambda u: live_shelf(content, recommendations.positions, product_ids, recent[u]),
+            "popular": lambda u: popular,
+            "catalog": lambda u: product_ids[:SHELF_SIZE]
+        }
+        for i, (method, fn) in enumerate(methods.items()):
+            shelves, micros = timed_each(fn, users)
+            hits = sum(held_out[u] in shelf for u, shelf in zip(users, shelves)) / len(users)
+            prefix = (f"{size:>9,} {len(training):>10,} {build:>8.1f} {megabytes:>6.1f}" if i == 0
+                      else " " * 37)
+            print(f"{prefix} {method:>8} {micros:>11,.0f} {hits:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
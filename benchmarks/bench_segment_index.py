@@ -0,0 +1,87 @@
+"""Launch targeting: full scan-and-score vs reading the segment index GSI.
+
+Loads UserActivity fakes of growing size with the segment attributes already
+maintained (as signup and the activity flush hook keep them), then targets
+each segment both ways. The scan pass costs the same for every segment and
+grows with total users; the index read grows only with the segment's size.
+Also times the per-user incremental update the index costs on the write path.
+
+Run from the repository root:
+    python -m benchmarks.bench_segment_index --users 100000,300000,1000000
+"""
+import argparse
+import time
+import warnings
+
+from benchmarks.fake_aws import TABLE_INDEXES, FakeTable
+from benchmarks.synthetic import synthetic_activity
+from dynamo_scan import FEATURE_PROJECTION, SCAN_SEGMENTS, parallel_scan
+from scoring import load_model, score_chunk
+from segment_index import SEGMENT_SHARDS, refresh_segments, segment_attributes, segment_target_positions
+
+
+def load_table(model, users, latency):
+    table = FakeTable('UserActivity', 'user_id', latency=latency, indexes=TABLE_INDEXES['UserActivity'])
+    items = [dict(activity, user_id=str(user_id)) for user_id, activity in synthetic_activity(users)]
+    for user_id, (profile, send, target) in segment_attributes(model, items).items():
+        item = items[int(user_id) - 1]
+        item.update(customer_profile=profile, send_campaign=send)
+        if target is not None:
+            item['target_segment'] = target
+    table.load(items)
+    return table
+
+
+def scan_launch(table, model, segment):
+    targeted = 0
+    for page in parallel_scan(table, SCAN_SEGMENTS, ProjectionExpression=FEATURE_PROJECTION):
+        targeted += len(score_chunk(model, [item['user_id'] for item in page], page, segment))
+    return targeted
+
+
+def index_launch(table, segment):
+    return sum(len(items) for _, items, _ in segment_target_positions(table, segment, SEGMENT_SHARDS))
+
+
+def timed(table, fn, *args):
+    table.calls.clear()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start, sum(table.calls.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", default="100000,300000,1000000")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated latency per DynamoDB call")
+    parser.add_argument("--updates", type=int, default=2000, help="incremental updates to time")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model = load_model("campaign_model.pkl")
+    latency = args.latency_ms / 1000
+    print(f"{args.latency_ms} ms per call, {SCAN_SEGMENTS} scan segments, {SEGMENT_SHARDS} index shards")
+    print(f"{'users':>10} {'segment':>7} {'targeted':>9} {'scan s':>8} {'calls':>6} {'index s':>8} {'calls':>6}")
+    for users in (int(u) for u in args.users.split(",")):
+        table = load_table(model, users, latency)
+        for segment in range(4):
+            scanned, scan_seconds, scan_calls = timed(table, scan_launch, table, model, segment)
+            indexed, index_seconds, index_calls = timed(table, index_launch, table, segment)
+            assert scanned == indexed, (scanned, indexed)
+            print(f"{users:>10,} {segment:>7} {indexed:>9,} {scan_seconds:>8.2f} {scan_calls:>6} "
+                  f"{index_seconds:>8.2f} {index_calls:>6}")
+
+    # Write-path cost: re-score a user after a counter change (no latency)
+    table.latency = 0.0
+    items = [table.get_item(Key={'user_id': str(i)})['Item'] for i in range(1, args.updates + 1)]
+    for item in items:
+        item['total_visits'] += 1
+    start = time.perf_counter()
+    writes = sum(refresh_segments(table, model, [item]) for item in items)
+    elapsed = time.perf_counter() - start
+    print(f"incremental update: {elapsed / len(items) * 1e6:.0f} us per user, "
+          f"{writes} of {len(items)} changed segment attributes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Import-to-first-response time with a lazy vs preloaded model, and a live model swap.
+
+Each app is imported in a fresh interpreter, once with the lazy registry and
+once with MODEL_PRELOAD=1, timing the import, the first GET / and the first
+prediction. Then a registry is hot-swapped to a modified model while threads
+keep predicting, checking no call fails and every call sees a whole version.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from model_registry import ModelRegistry
+from scoring import load_dataset_features
+
+PROBE = """
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+start = time.perf_counter()
+import {module} as app_module
+imported = time.perf_counter()
+client = app_module.app.test_client()
+assert client.get('/').status_code == 200
+first = time.perf_counter()
+sklearn_loaded = 'sklearn' in sys.modules
+app_module.model.predict([[0, 0, 0, 0, 1]])
+scored = time.perf_counter()
+print(json.dumps({{"import": imported - start, "first": first - start, "score": scored - start,
+                  "sklearn_at_first": sklearn_loaded}}))
+"""
+
+
+def probe(module, preload, runs):
+    env = dict(os.environ, MODEL_PRELOAD="1" if preload else "0")
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], env=env,
+                             capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {key: float(np.median([r[key] for r in results])) for key in ("import", "first", "score")}, results[0]
+
+
+def tweaked_copy(src, dst, shift):
+    with open(src, "rb") as f:
+        model = pickle.load(f)
+    for estimator in model.estimators_:
+        estimator.intercept_ = estimator.intercept_ + shift
+    tmp = dst + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(model, f)
+    os.replace(tmp, dst)  # atomic, like a deploy should be
+
+
+def hot_swap(model_path, threads, seconds):
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "campaign_model.pkl")
+    shutil.copy(model_path, path)
+    registry = ModelRegistry(path, check_interval=0.01)
+    X = load_dataset_features().astype(np.float64)
+    first = registry.current()
+    expected = {first.version: first.predict(X)}
+    stop = threading.Event()
+    calls, errors, torn = [0], [], [0]
+
+    def worker():
+        while not stop.is_set():
+            try:
+                version = registry.current()
+                predictions = version.predict(X)
+                if version.version in expected and not np.array_equal(predictions, expected[version.version]):
+                    torn[0] += 1
+                calls[0] += 1
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    time.sleep(seconds / 2)
+    tweaked_copy(model_path, path, shift=0.5)
+    swapped_at = time.perf_counter()
+    while registry.current().version == first.version:
+        time.sleep(0.001)
+    swap_latency = time.perf_counter() - swapped_at
+    second = registry.current()
+    expected[second.version] = second.predict(X)
+    time.sleep(seconds / 2)
+    stop.set()
+    for w in workers:
+        w.join()
+    shutil.rmtree(workdir)
+    return calls[0], len(errors), torn[0], swap_latency, registry.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    print(f"median of {args.runs} fresh interpreters, seconds from import start")
+    print(f"{'app':>8} {'model':>8} {'import':>8} {'first /':>8} {'first score':>12} {'sklearn at /':>13}")
+    for module in ("app", "aws_app"):
+        for preload in (False, True):
+            timings, sample = probe(module, preload, args.runs)
+            print(f"{module:>8} {'preload' if preload else 'lazy':>8} {timings['import']:>8.3f} "
+                  f"{timings['first']:>8.3f} {timings['score']:>12.3f} {str(sample['sklearn_at_first']):>13}")
+
+    calls, errors, torn, latency, stats = hot_swap("campaign_model.pkl", args.threads, args.seconds)
+    print(f"hot swap under {args.threads} scoring threads: {calls:,} predictions, {errors} errors, "
+          f"{torn} mismatched, new version live {latency * 1000:.0f} ms after the file was replaced "
+          f"(load {stats['load_ms']} ms), versions kept {stats['versions']}")
+
+
+if __name__ == "__main__":
+    main()
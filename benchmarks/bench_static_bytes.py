@@ -0,0 +1,99 @@
+"""Bytes a browser transfers per /home load, original images vs the static_assets build.
+
+A small browser model loads /home, then the stylesheet and every product
+image on it, picking from srcset the smallest candidate that covers the
+image's CSS width at the device pixel ratio. It keeps what it fetched:
+responses marked immutable (or with a max-age) are reused without asking,
+anything else is revalidated with If-None-Match / If-Modified-Since. So a
+repeat load shows what cache headers save on top of smaller files.
+
+Run from the repository root (it runs the build first):
+    python -m benchmarks.bench_static_bytes --dpr 1,2
+"""
+import argparse
+import os
+import re
+import sys
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+import static_assets  # noqa: E402
+
+ASSET = re.compile(r'<link[^>]*href="(/static/[^"]+)"|<img([^>]*)>', re.S)
+
+
+def pick(img, dpr):
+    """The URL a browser fetches for an <img> tag's attributes."""
+    srcset = re.search(r'srcset="([^"]+)"', img)
+    sizes = re.search(r'sizes="(\d+)px"', img)
+    if not srcset or not sizes:
+        return re.search(r'src="([^"]+)"', img).group(1)
+    candidates = sorted((int(w.rstrip("w")), url)
+                        for url, w in (c.strip().rsplit(" ", 1) for c in srcset.group(1).split(",")))
+    needed = int(sizes.group(1)) * dpr
+    return next((url for w, url in candidates if w >= needed), candidates[-1][1])
+
+
+class Browser:
+    def __init__(self, client, dpr):
+        self.client = client
+        self.dpr = dpr
+        self.cache = {}  # url -> response headers, plus the body of /home
+        self.requests = 0
+        self.bytes = 0
+
+    def fetch(self, url):
+        """Returns the cached response after fetching or revalidating url (if it needs it)."""
+        cached = self.cache.get(url)
+        if cached is not None and re.search(r"immutable|max-age=[1-9]", cached.get("Cache-Control", "")):
+            return cached
+        headers = {}
+        if cached is not None:
+            if cached.get("ETag"):
+                headers["If-None-Match"] = cached["ETag"]
+            if cached.get("Last-Modified"):
+                headers["If-Modified-Since"] = cached["Last-Modified"]
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += len(response.data)
+        if response.status_code == 200:
+            self.cache[url] = dict(response.headers, body=response.get_data(as_text=True) if url == "/home" else None)
+        return self.cache[url]
+
+    def load_home(self):
+        self.requests = self.bytes = 0
+        html = self.fetch("/home")["body"]
+        for href, img in ASSET.findall(html):
+            self.fetch(href or pick(img, self.dpr))
+        return self.requests, self.bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dpr", default="1,2", help="device pixel ratios to model")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    app.events.stream = open(os.devnull, "w")
+    static_assets.build(app.app.static_folder)
+    built_manifest = app.assets.manifest_path
+
+    print(f"{'assets':>9} {'dpr':>4} {'first: requests':>16} {'KB':>7} {'repeat: requests':>17} {'KB':>6}")
+    for label, manifest_path in (("originals", os.path.join(app.app.static_folder, "unbuilt", "manifest.json")),
+                                 ("built", built_manifest)):
+        app.assets.manifest_path = manifest_path
+        for dpr in (int(d) for d in args.dpr.split(",")):
+            client = app.app.test_client()
+            user = app.backend.create_user(f"bytes-{label}-{dpr}", "pw")
+            with client.session_transaction() as session:
+                session["user_id"] = user["user_id"]
+                session["username"] = user["username"]
+            browser = Browser(client, dpr)
+            first = browser.load_home()
+            repeat = browser.load_home()
+            print(f"{label:>9} {dpr:>4} {first[0]:>16} {first[1] / 1024:>7.1f} {repeat[0]:>17} {repeat[1] / 1024:>6.1f}")
+    app.assets.manifest_path = built_manifest
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+"""In-process stand-ins for the DynamoDB tables used by the dynamodb storage backend.
+
+Only the parts of the boto3 Table API the app uses are implemented. Every
+call is counted per operation, and an optional per-call latency can be added
+to mimic network round trips (sleeping releases the GIL, like real I/O).
+"""
+import collections
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from metrics import InstrumentedClient
+
+
+# Rough stand-in for DynamoDB's 1 MB scan page
+SCAN_PAGE_ITEMS = 1000
+
+
+class FakeTable:
+    def __init__(self, name, hash_key, range_key=None, latency=0.0, page_items=SCAN_PAGE_ITEMS, indexes=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = dict(indexes or {})   # GSI name -> its hash key attribute
+        self.latency = latency
+        self.page_items = page_items
+        self.calls = collections.Counter()
+        self._items = {}
+        self._keys = []      # insertion order; None marks a deleted slot
+        self._positions = {}
+        self._by_hash = collections.defaultdict(set)   # hash value -> keys, for query()
+        self._by_index = {name: collections.defaultdict(set) for name in self.indexes}
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _key(self, key):
+        if self.range_key:
+            return key[self.hash_key], key[self.range_key]
+        return key[self.hash_key]
+
+    def _key_dict(self, key):
+        if self.range_key:
+            return {self.hash_key: key[0], self.range_key: key[1]}
+        return {self.hash_key: key}
+
+    def load(self, items):
+        """Bulk insert without counting calls (test data setup)."""
+        with self._lock:
+            for item in items:
+                self._store(dict(item))
+
+    def _store(self, item):
+        key = self._key(item)
+        old = self._items.get(key)
+        if old is None:
+            self._positions[key] = len(self._keys)
+            self._keys.append(key)
+            if self.range_key:
+                self._by_hash[key[0]].add(key)
+        self._unindex(key, old)
+        self._items[key] = item
+        # Sparse GSIs: only items carrying the index attribute are indexed
+        for name, attribute in self.indexes.items():
+            if attribute in item:
+                self._by_index[name][item[attribute]].add(key)
+
+    def _unindex(self, key, item):
+        if item is None:
+            return
+        for name, attribute in self.indexes.items():
+            if attribute in item:
+                self._by_index[name][item[attribute]].discard(key)
+
+    def _delete(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._keys[self._positions.pop(key)] = None
+            if self.range_key:
+                self._by_hash[key[0]].discard(key)
+            self._unindex(key, item)
+
+    def __len__(self):
+        return len(self._items)
+
+    # boto3 Table API
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None,
+                 ExpressionAttributeNames=None, **kwargs):
+        self._call('put_item')
+        with self._lock:
+            if ConditionExpression:
+                current = self._items.get(self._key(Item)) or {}
+                _check_condition(ConditionExpression, current, ExpressionAttributeValues or {},
+                                 ExpressionAttributeNames or {})
+            self._store(dict(Item))
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._call('get_item')
+        item = self._items.get(self._key(Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ConditionExpression=None, ReturnValues='NONE', **kwargs):
+        self._call('update_item')
+        values = ExpressionAttributeValues or {}
+        names = ExpressionAttributeNames or {}
+        with self._lock:
+            key = self._key(Key)
+            current = self._items.get(key)
+            item = dict(current) if current is not None else dict(Key)
+            if ConditionExpression:
+                _check_condition(ConditionExpression, current or {}, values, names)
+            _apply_update(UpdateExpression, item, values, names)
+            self._store(item)
+        if ReturnValues in ('ALL_NEW', 'UPDATED_NEW'):
+            return {'Attributes': dict(item)}
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self._call('delete_item')
+        with self._lock:
+            self._delete(self._key(Key))
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self)
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, ProjectionExpression=None, IndexName=None, **kwargs):
+        self._call('query')
+        # Only "<hash key> = :value" key conditions are supported
+        hash_value = ExpressionAttributeValues[KeyConditionExpression.split('=')[1].strip()]
+        if IndexName:
+            # GSI pages are ordered by table key here; DynamoDB leaves the order unspecified
+            with self._lock:
+                matching = list(self._by_index[IndexName].get(hash_value, ()))
+        else:
+            matching = self._by_hash.get(hash_value, ())
+        keys = sorted(matching, reverse=not ScanIndexForward)
+        if ExclusiveStartKey is not None:
+            start_key = self._key(ExclusiveStartKey)
+            keys = [k for k in keys if (k > start_key if ScanIndexForward else k < start_key)]
+        limit = min(Limit or self.page_items, self.page_items)
+        page = keys[:limit]
+
+        items = [self._project(self._items[k], ProjectionExpression) for k in page]
+        response = {'Items': items, 'Count': len(items)}
+        if len(keys) > limit:
+            response['LastEvaluatedKey'] = self._key_dict(page[-1])
+        return response
+
+    def _project(self, item, projection):
+        if not projection:
+            return dict(item)
+        return {f: item[f] for f in (f.strip() for f in projection.split(",")) if f in item}
+
+    def scan(self, Segment=0, TotalSegments=1, ExclusiveStartKey=None, Limit=None,
+             ProjectionExpression=None, FilterExpression=None, ExpressionAttributeValues=None,
+             ExpressionAttributeNames=None, **kwargs):
+        self._call('scan')
+        # Segments are contiguous slices of insertion order
+        total = len(self._keys)
+        start = total * Segment // TotalSegments
+        end = total * (Segment + 1) // TotalSegments
+        if ExclusiveStartKey is not None:
+            start = self._positions[self._key(ExclusiveStartKey)] + 1
+
+        limit = min(Limit or self.page_items, self.page_items)
+
+        items = []
+        position = start
+        last_key = None
+        scanned = 0
+        # Limit counts items read, before any FilterExpression, as in DynamoDB
+        while position < end and scanned < limit:
+            key = self._keys[position]
+            position += 1
+            if key is None:
+                continue
+            last_key = key
+            scanned += 1
+            item = self._items[key]
+            if FilterExpression and not _matches(FilterExpression, item, ExpressionAttributeValues or {},
+                                                 ExpressionAttributeNames or {}):
+                continue
+            items.append(self._project(item, ProjectionExpression))
+
+        response = {'Items': items, 'Count': len(items)}
+        if position < end and last_key is not None:
+            response['LastEvaluatedKey'] = self._key_dict(last_key)
+        return response
+
+
+class FakeBatchWriter:
+    """Buffers puts/deletes and flushes them 25 at a time, like boto3's BatchWriter."""
+
+    def __init__(self, table, flush_amount=25):
+        self.table = table
+        self.flush_amount = flush_amount
+        self._buffer = []
+
+    def put_item(self, Item):
+        self._buffer.append(('put', dict(Item)))
+        if len(self._buffer) >= self.flush_amount:
+            self._flush()
+
+    def delete_item(self, Key):
+        self._buffer.append(('delete', Key))
+        if len(self._buffer) >= self.flush_amount:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        self.table._call('batch_write_item')
+        with self.table._lock:
+            for action, value in self._buffer:
+                if action == 'put':
+                    self.table._store(value)
+                else:
+                    self.table._delete(self.table._key(value))
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._flush()
+
+
+class FakeDynamoDB:
+    """Stand-in for boto3.resource('dynamodb'): Table() lookup and batch_get_item.
+
+    meta.client is itself, for transact_write_items (Put items only), which
+    takes and checks typed values like the low-level client.
+    """
+
+    def __init__(self, tables, latency=0.0, unprocessed_every=0):
+        self.tables = {table.name: table for table in tables}
+        self.latency = latency
+        self.unprocessed_every = unprocessed_every
+        self.calls = collections.Counter()
+        self.meta = SimpleNamespace(client=self)
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        self.calls['batch_get_item'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        responses, unprocessed = {}, {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            keys = request['Keys']
+            # Optionally leave every Nth key unprocessed to exercise retries
+            if self.unprocessed_every and len(keys) > 1:
+                unprocessed[name] = dict(request, Keys=keys[::self.unprocessed_every])
+                keys = [k for i, k in enumerate(keys) if i % self.unprocessed_every]
+            items = (table._items.get(table._key(key)) for key in keys)
+            responses[name] = [dict(item) for item in items if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def transact_write_items(self, TransactItems):
+        self.calls['transact_write_items'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        puts = []
+        for request in TransactItems:
+            put = request['Put']
+            puts.append((self.tables[put['TableName']], {k: _deserialize(v) for k, v in put['Item'].items()},
+                         put.get('ConditionExpression'),
+                         {k: _deserialize(v) for k, v in put.get('ExpressionAttributeValues', {}).items()},
+                         put.get('ExpressionAttributeNames', {})))
+        # Lock every table involved (in a fixed order), check every condition, then write
+        tables = sorted({table.name: table for table, *_ in puts}.values(), key=lambda table: table.name)
+        for table in tables:
+            table._lock.acquire()
+        try:
+            reasons = []
+            for table, item, condition, values, names in puts:
+                current = table._items.get(table._key(item)) or {}
+                ok = not condition or _matches(condition, current, values, names)
+                reasons.append({'Code': 'None' if ok else 'ConditionalCheckFailed'})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+                                   'CancellationReasons': reasons}, 'TransactWriteItems')
+            for table, item, *_ in puts:
+                table._store(item)
+        finally:
+            for table in tables:
+                table._lock.release()
+        return {}
+
+
+class FakeSNS:
+    """Stand-in for boto3.client('sns') that records published messages.
+
+    keep_messages=False only counts them (published), for runs with too
+    many to hold. Either way, recipients counts messages per user_id
+    message attribute, so duplicate sends show up as counts above 1.
+    """
+
+    def __init__(self, latency=0.0, fail_every=0, keep_messages=True):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.keep_messages = keep_messages
+        self.entries = 0
+        self.published = 0
+        self.calls = collections.Counter()
+        self.messages = []
+        self.recipients = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def publish(self, TopicArn=None, Message=None, Subject=None, **kwargs):
+        self._call('publish')
+        with self._lock:
+            self.published += 1
+            if self.keep_messages:
+                self.messages.append({'TopicArn': TopicArn, 'Subject': Subject, 'Message': Message})
+        return {'MessageId': str(self.published)}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self._call('publish_batch')
+        if len(PublishBatchRequestEntries) > 10:
+            raise ClientError({'Error': {'Code': 'TooManyEntriesInBatchRequest', 'Message': ''}}, 'PublishBatch')
+        successful, failed = [], []
+        with self._lock:
+            for entry in PublishBatchRequestEntries:
+                # Optionally fail every Nth entry (a retryable, service-side failure)
+                if self.fail_every and self.entries % self.fail_every == self.fail_every - 1:
+                    failed.append({'Id': entry['Id'], 'Code': 'InternalError', 'SenderFault': False})
+                else:
+                    self.published += 1
+                    if self.keep_messages:
+                        self.messages.append(dict(entry, TopicArn=TopicArn))
+                    user_id = entry.get('MessageAttributes', {}).get('user_id')
+                    if user_id is not None:
+                        self.recipients[user_id['StringValue']] += 1
+                    successful.append({'Id': entry['Id'], 'MessageId': str(self.published)})
+                self.entries += 1
+        return {'Successful': successful, 'Failed': failed}
+
+
+_deserialize = TypeDeserializer().deserialize
+
+
+def _conditional_check_failed():
+    return ClientError({'Error': {'Code': 'ConditionalCheckFailedException',
+                                  'Message': 'The conditional request failed'}}, 'ConditionalCheck')
+
+
+def _name(token, names):
+    return names.get(token, token)
+
+
+def _split_top_level(text, sep=','):
+    parts, depth, current = [], 0, ''
+    for ch in text:
+        depth += ch == '('
+        depth -= ch == ')'
+        if ch == sep and depth == 0:
+            parts.append(current)
+            current = ''
+        else:
+            current += ch
+    parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _operand(token, item, values, names):
+    token = token.strip()
+    match = re.fullmatch(r'if_not_exists\(\s*([^,\s]+)\s*,\s*(\S+)\s*\)', token)
+    if match:
+        name = _name(match.group(1), names)
+        return item[name] if name in item else _operand(match.group(2), item, values, names)
+    if token.startswith(':'):
+        return values[token]
+    return item.get(_name(token, names), 0)
+
+
+def _apply_update(expression, item, values, names):
+    clauses = re.split(r'\b(SET|ADD|REMOVE)\b', expression)
+    for action, body in zip(clauses[1::2], clauses[2::2]):
+        for part in _split_top_level(body):
+            if action == 'SET':
+                target, expr = part.split('=', 1)
+                terms = re.split(r'\s([+-])\s', expr.strip())
+                result = _operand(terms[0], item, values, names)
+                for op, term in zip(terms[1::2], terms[2::2]):
+                    value = _operand(term, item, values, names)
+                    result = result + value if op == '+' else result - value
+                item[_name(target.strip(), names)] = result
+            elif action == 'ADD':
+                target, value = part.split()
+                target = _name(target, names)
+                item[target] = item.get(target, 0) + values[value]
+            else:
+                item.pop(_name(part, names), None)
+
+
+def _check_condition(expression, item, values, names):
+    if not _matches(expression, item, values, names):
+        raise _conditional_check_failed()
+
+
+def _matches(expression, item, values, names):
+    """Evaluate simple condition/filter expressions (comparisons joined by AND/OR) against an item."""
+    return any(_matches_all(part, item, values, names) for part in re.split(r'\s+OR\s+', expression.strip()))
+
+
+def _matches_all(expression, item, values, names):
+    for clause in re.split(r'\s+AND\s+', expression.strip()):
+        match = re.fullmatch(r'attribute_(not_)?exists\(\s*(\S+?)\s*\)', clause)
+        if match:
+            exists = _name(match.group(2), names) in item
+            if exists == bool(match.group(1)):
+                return False
+            continue
+        left, op, right = re.fullmatch(r'(\S+)\s*(=|<>|<=|>=|<|>)\s*(\S+)', clause).groups()
+        left_value = _operand(left, item, values, names) if not left.startswith(':') else values[left]
+        right_value = values[right] if right.startswith(':') else item.get(_name(right, names))
+        ok = {'=': left_value == right_value, '<>': left_value != right_value,
+              '<': left_value < right_value, '>': left_value > right_value,
+              '<=': left_value <= right_value, '>=': left_value >= right_value}[op]
+        if not ok:
+            return False
+    return True
+
+
+# Table name -> (hash key, range key), as provisioned for the dynamodb backend
+TABLES = {
+    'Users': ('user_id', None),
+    'Usernames': ('username', None),
+    'AdminUsers': ('username', None),
+    'Campaigns': ('campaign_id', None),
+    'UserActivity': ('user_id', None),
+    'CampaignAssignments': ('user_id', 'assigned_key'),
+    'Purchases': ('user_id', 'purchased_key'),
+    'Deliveries': ('delivery_key', None),
+    'Products': ('product_id', None)
+}
+
+# Table name -> {GSI name: GSI hash key}
+TABLE_INDEXES = {
+    'UserActivity': {'target_segment-index': 'target_segment'}
+}
+
+def install_fakes(app_module, latency=0.0, products=None, **backend_config):
+    """Give app_module a DynamoDB backend on fresh fake tables and point its SNS client at a fake.
+
+    backend_config goes to DynamoDBBackend (e.g. activity_max_staleness).
+    Returns the FakeDynamoDB.
+    """
+    from storage.dynamodb import DynamoDBBackend
+
+    dynamodb = FakeDynamoDB([FakeTable(name, *keys, latency=latency, indexes=TABLE_INDEXES.get(name))
+                             for name, keys in TABLES.items()], latency=latency)
+    old = getattr(app_module, 'backend', None)
+    if old is not None:
+        old.close()
+    app_module.backend = DynamoDBBackend(app_module.model, dynamodb=dynamodb, **backend_config)
+    if products:
+        dynamodb.Table('Products').load(products)
+    dynamodb.sns = FakeSNS(latency=latency)
+    if getattr(app_module, 'notifier', None) is not None:
+        app_module.notifier.client = InstrumentedClient(dynamodb.sns, 'sns', app_module.SNS_TOPIC_ARN.rsplit(':', 1)[-1])
+    return dynamodb
+
+
+def total_calls(dynamodb):
+    """Calls made so far across every table plus the resource itself."""
+    calls = collections.Counter(dynamodb.calls)
+    if getattr(dynamodb, 'sns', None):
+        calls.update({f"SNS.{op}": n for op, n in dynamodb.sns.calls.items()})
+    for table in dynamodb.tables.values():
+        calls.update({f"{table.name}.{op}": n for op, n in table.calls.items()})
+    return calls
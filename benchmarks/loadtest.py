@@ -0,0 +1,377 @@
+"""Load test of the Flask app against in-process DynamoDB/SNS fakes, with a JSON report.
+
+Seeds --users users whose activity is resampled from data/campaign_dataset.csv,
+logs in --sessions of them plus an admin, and launches one campaign per
+segment so /home has offers. Then it replays one seeded, weighted mix of
+signup/login/home/click/buy/launch requests through two drivers:
+
+    client  Flask test client, one thread, in process
+    http    the app on a local threaded HTTP server, --threads client threads
+
+and reports p50/p95/p99 latency, requests/sec, errors and backend calls per
+request (per operation for the single-threaded client driver). The report
+goes to --output as JSON; --baseline prints the change against an earlier one.
+
+Run from the repository root:
+    python -m benchmarks.loadtest --requests 2000 --output loadtest.json
+    python -m benchmarks.loadtest --baseline loadtest.json --output new.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import warnings
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_features
+from scoring import FEATURES
+from storage.seed import PRODUCTS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OPERATIONS = ("signup", "login", "home", "click", "buy", "launch")
+DEFAULT_MIX = "signup=2,login=8,home=60,click=15,buy=14,launch=1"
+SEGMENTS = ("engaged", "frequent_visitor", "loyal", "new_users")
+PASSWORD = "pw"
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentiles(timings):
+    if not timings:
+        return {"count": 0}
+    ms = np.array(timings) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3)
+    }
+
+
+# Transports: request(method, path, form, cookie) -> (status, session cookie or None)
+
+def _session_cookie(headers):
+    for header in headers:
+        name, _, rest = header.partition("=")
+        if name.strip() == "session":
+            return "session=" + rest.split(";", 1)[0]
+    return None
+
+
+class ClientTransport:
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client(use_cookies=False)
+
+    def request(self, method, path, form=None, cookie=None):
+        response = self.client.open(path, method=method, data=form, headers={"Cookie": cookie} if cookie else {})
+        return response.status_code, _session_cookie(response.headers.getlist("Set-Cookie"))
+
+
+class HTTPTransport:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._local = threading.local()
+
+    def request(self, method, path, form=None, cookie=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {"Cookie": cookie} if cookie else {}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            # The dev server closes HTTP/1.0 connections; reconnect once
+            conn.close()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        return response.status, _session_cookie(response.headers.get_all("Set-Cookie") or [])
+
+
+class Workload:
+    """Seeded users, sessions and the request plan shared by every driver."""
+
+    def __init__(self, app_module, users, sessions, seed):
+        self.app_module = app_module
+        self.rng = random.Random(seed)
+        self.usernames = [f"load{i}" for i in range(users)]
+        self.sessions = []     # cookies of logged-in users
+        self.admin_cookie = None
+        self.campaign_ids = []
+        self.product_ids = []
+        self.signups = 0
+        self._lock = threading.Lock()
+        self._seed_users(seed)
+
+    def _seed_users(self, seed):
+        backend = self.app_module.backend
+        features = synthetic_features(len(self.usernames), seed).tolist()
+        activities = {}
+        for username, row in zip(self.usernames, features):
+            user = backend.create_user(username, PASSWORD)
+            activities[user["user_id"]] = dict(zip(FEATURES, row))
+        backend.put_activity(activities)
+        backend.create_admin("loadadmin", PASSWORD)
+        self.product_ids = [p["product_id"] for p in backend.list_products()]
+
+    def warm_up(self, transport, sessions):
+        _, self.admin_cookie = transport.request("POST", "/admin/login",
+                                                 {"username": "loadadmin", "password": PASSWORD})
+        for username in self.rng.sample(self.usernames, min(sessions, len(self.usernames))):
+            _, cookie = transport.request("POST", "/login", {"username": username, "password": PASSWORD})
+            self.sessions.append(cookie)
+        for segment in SEGMENTS:
+            self.launch(transport, segment)
+        self.wait_for_launches()
+        self.campaign_ids = [c["campaign_id"] for c in self.app_module.backend.list_campaigns()]
+
+    def wait_for_launches(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        runner = self.app_module.launch_runner
+        while any(runner.running(cid) for cid in list(runner.jobs)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def launch(self, transport, segment):
+        return transport.request("POST", "/launch-campaign", {
+            "name": f"Load {segment}", "type": "email", "subject": "Load test", "offer": "10% off",
+            "segment": segment, "start_time": "2026-01-01T00:00", "end_time": "2027-01-01T00:00"
+        }, self.admin_cookie)
+
+    def plan(self, requests, mix, seed):
+        rng = random.Random(seed)
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        return [(name, rng.random()) for name in rng.choices(names, weights=weights, k=requests)]
+
+    def run_operation(self, transport, name, roll):
+        """Run one planned request; roll picks the user/campaign/product deterministically."""
+        session = self.sessions[int(roll * len(self.sessions))]
+        if name == "signup":
+            with self._lock:
+                self.signups += 1
+                username = f"new{self.signups}"
+            return transport.request("POST", "/signup", {"username": username, "password": PASSWORD})[0]
+        if name == "login":
+            username = self.usernames[int(roll * len(self.usernames))]
+            return transport.request("POST", "/login", {"username": username, "password": PASSWORD})[0]
+        if name == "home":
+            return transport.request("GET", "/home", cookie=session)[0]
+        if name == "click":
+            campaign_id = self.campaign_ids[int(roll * len(self.campaign_ids))] if self.campaign_ids else "none"
+            return transport.request("GET", f"/campaign/{campaign_id}", cookie=session)[0]
+        if name == "buy":
+            product_id = self.product_ids[int(roll * len(self.product_ids))]
+            return transport.request("POST", f"/buy/{product_id}", cookie=session)[0]
+        return self.launch(transport, SEGMENTS[int(roll * len(SEGMENTS))])[0]
+
+
+def call_count(dynamodb):
+    from benchmarks.fake_aws import total_calls
+    return sum(total_calls(dynamodb).values()) if dynamodb is not None else 0
+
+
+def run_driver(workload, transport, plan, threads, dynamodb):
+    """Replay plan over transport from `threads` threads; returns the driver's report."""
+    timings = {name: [] for name in OPERATIONS}
+    calls = {name: 0 for name in OPERATIONS}
+    errors = {name: 0 for name in OPERATIONS}
+    lock = threading.Lock()
+    attribute_calls = threads == 1 and dynamodb is not None
+
+    def worker(part):
+        for name, roll in part:
+            before = call_count(dynamodb) if attribute_calls else 0
+            start = time.perf_counter()
+            try:
+                status = workload.run_operation(transport, name, roll)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - start
+            used = call_count(dynamodb) - before if attribute_calls else 0
+            with lock:
+                timings[name].append(elapsed)
+                calls[name] += used
+                if status is None or status >= 400:
+                    errors[name] += 1
+
+    calls_before = call_count(dynamodb)
+    start = time.perf_counter()
+    parts = [plan[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(part,)) for part in parts]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    seconds = time.perf_counter() - start
+    # Write-behind activity and queued notifications belong to this run too
+    workload.app_module.backend.flush_activity()
+    workload.wait_for_launches()
+    total_calls = call_count(dynamodb) - calls_before
+
+    operations = {}
+    for name in OPERATIONS:
+        if not timings[name]:
+            continue
+        operations[name] = dict(percentiles(timings[name]), errors=errors[name])
+        if attribute_calls:
+            operations[name]["backend_calls_per_request"] = round(calls[name] / len(timings[name]), 3)
+    return {
+        "threads": threads,
+        "requests": len(plan),
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(len(plan) / seconds, 1),
+        "errors": sum(errors.values()),
+        "latency": percentiles([t for name in OPERATIONS for t in timings[name]]),
+        "backend_calls_per_request": round(total_calls / len(plan), 3) if dynamodb is not None else None,
+        "operations": operations
+    }
+
+
+def serve(flask_app):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log line per request
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, report):
+    print(f"change vs baseline (commit {baseline.get('commit')})")
+    print(f"{'driver':>7} {'op':>8} {'req/s':>7} {'p50':>7} {'p99':>7}")
+    for driver, current in report["drivers"].items():
+        old = baseline.get("drivers", {}).get(driver)
+        if not old:
+            continue
+        rows = [("all", current["latency"], old["latency"])]
+        rows += [(name, op, old["operations"][name]) for name, op in current["operations"].items()
+                 if name in old.get("operations", {})]
+        for name, new_latency, old_latency in rows:
+            rps = f"{current['requests_per_sec'] / old['requests_per_sec'] - 1:+.0%}" if name == "all" else ""
+            p50 = f"{new_latency['p50_ms'] / old_latency['p50_ms'] - 1:+.0%}"
+            p99 = f"{new_latency['p99_ms'] / old_latency['p99_ms'] - 1:+.0%}"
+            print(f"{driver:>7} {name:>8} {rps:>7} {p50:>7} {p99:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="dynamodb", help="memory, sqlite or dynamodb (fakes)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=200, help="logged-in users the traffic comes from")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8, help="client threads of the http driver")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--drivers", default="client,http")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every fake DynamoDB/SNS call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--baseline", help="an earlier report to compare against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    warnings.filterwarnings("ignore")
+
+    # app.py reads its configuration at import
+    workdir = tempfile.mkdtemp()
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "loadtest.db")
+    os.environ["NOTIFICATIONS"] = "sns" if args.backend == "dynamodb" else "none"
+    import app as app_module
+    from event_log import events
+    events.stream = open(os.devnull, "w")  # still sampled and serialised, just not printed
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: getattr(args, key) for key in
+                   ("backend", "users", "sessions", "requests", "threads", "latency_ms", "seed")},
+        "mix": mix,
+        "drivers": {}
+    }
+    for driver in args.drivers.split(","):
+        # A fresh, identically seeded store per driver, so their numbers compare
+        dynamodb = None
+        if args.backend == "dynamodb":
+            from benchmarks.fake_aws import install_fakes
+            dynamodb = install_fakes(app_module, latency=args.latency_ms / 1000, products=PRODUCTS)
+        else:
+            app_module.backend.close()
+            if args.backend == "sqlite" and os.path.exists(os.environ["SQLITE_PATH"]):
+                os.remove(os.environ["SQLITE_PATH"])
+            from storage import create_backend
+            app_module.backend = create_backend(args.backend, app_module.model,
+                                                **app_module.storage_config(args.backend))
+        app_module.campaign_cache.clear()
+        app_module.catalog.clear()
+
+        workload = Workload(app_module, args.users, args.sessions, args.seed)
+        server = None
+        if driver == "http":
+            server = serve(app_module.app)
+            transport = HTTPTransport("127.0.0.1", server.server_port)
+            threads = args.threads
+        else:
+            transport = ClientTransport(app_module.app)
+            threads = 1
+        workload.warm_up(transport, args.sessions)
+        plan = workload.plan(args.requests, mix, args.seed)
+        report["drivers"][driver] = run_driver(workload, transport, plan, threads, dynamodb)
+        if server is not None:
+            server.shutdown()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print(f"{'driver':>7} {'threads':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'calls/req':>9}")
+    for driver, result in report["drivers"].items():
+        latency = result["latency"]
+        calls = result["backend_calls_per_request"]
+        print(f"{driver:>7} {result['threads']:>7} {result['requests_per_sec']:>8.0f} {latency['p50_ms']:>8.2f} "
+              f"{latency['p95_ms']:>8.2f} {latency['p99_ms']:>8.2f} {result['errors']:>6} "
+              f"{calls if calls is not None else '-':>9}")
+    print(f"report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Concurrency stress test: shared state must not lose updates.
+
+Worker threads (in one or more processes) hammer the same few users'
+activity counters and the same products' purchase counters, sign up users
+(all racing for one contended username too), create campaigns and assign
+them to the hot users. Afterwards it asserts, per backend:
+
+- every activity increment and product purchase landed exactly once
+- user and campaign ids are unique, and one signup won the contended name
+- every hot user has every campaign assigned
+- segment targets match a fresh scoring of the final counters
+
+The interpreter switch interval is shortened so threads interleave far
+more often than under real load. memory and dynamodb (in-process fakes)
+run in one process; sqlite and state_server also run across processes.
+
+Run from the repository root:
+    python -m benchmarks.stress_state --threads 16 --processes 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+from benchmarks.bench_backends import SEGMENTS, make_backend
+from prediction_cache import CachedModel
+from segment_index import predict_segments
+from storage import create_backend
+from storage.memory import MemoryBackend
+from storage.seed import PRODUCTS
+from storage.state_server import StateServer
+
+HOT_USERS = 8
+DELTAS = {"offers_opened": 1, "offers_clicked": 2, "purchases": 1, "total_visits": 3}
+CONTENDED = "everyone-wants-this-name"
+
+
+def worker(backend, name, rounds, signups, hot_ids, product_ids, seed):
+    """One thread's share of the load; returns what it created."""
+    rng = random.Random(seed)
+    created = {"users": [], "campaigns": [], "contended": 0, "increments": {}, "purchases": {}}
+    campaign = backend.create_campaign({"name": name, "offer": "stress", "segment": 0,
+                                        "start_time": "", "end_time": "", "status": "Scheduled"})
+    created["campaigns"].append(campaign["campaign_id"])
+    if backend.create_user(CONTENDED, "pw") is not None:
+        created["contended"] += 1
+    for i in range(rounds):
+        user_id = rng.choice(hot_ids)
+        backend.increment_activity(user_id, seen=rng.random() < 0.5, **DELTAS)
+        created["increments"][user_id] = created["increments"].get(user_id, 0) + 1
+        product_id = rng.choice(product_ids)
+        if backend.increment_product_purchases(product_id):
+            created["purchases"][product_id] = created["purchases"].get(product_id, 0) + 1
+        if i < signups:
+            created["users"].append(backend.create_user(f"{name}-{i}", "pw")["user_id"])
+    backend.assign_campaign(hot_ids, campaign["campaign_id"], "2024-01-01T00:00:00")
+    return created
+
+
+def run_threads(backend, prefix, threads, rounds, signups, hot_ids, product_ids):
+    results = [None] * threads
+    errors = []
+
+    def run(i):
+        try:
+            results[i] = worker(backend, f"{prefix}t{i}", rounds, signups, hot_ids, product_ids, seed=hash(prefix) + i)
+        except Exception as e:
+            errors.append(e)
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def run_process(name, config, prefix, threads, rounds, signups, hot_ids, product_ids, out):
+    sys.setswitchinterval(1e-6)
+    backend = create_backend(name, CachedModel("campaign_model.pkl"), **config)
+    try:
+        out.put(run_threads(backend, prefix, threads, rounds, signups, hot_ids, product_ids))
+    except Exception as e:
+        out.put(e)
+    finally:
+        backend.close()
+
+
+def merge(results):
+    merged = {"users": [], "campaigns": [], "contended": 0, "increments": {}, "purchases": {}}
+    for result in results:
+        merged["users"] += result["users"]
+        merged["campaigns"] += result["campaigns"]
+        merged["contended"] += result["contended"]
+        for field in ("increments", "purchases"):
+            for key, n in result[field].items():
+                merged[field][key] = merged[field].get(key, 0) + n
+    return merged
+
+
+def check(backend, model, merged, hot_ids, before_activity, before_purchases, signups_expected):
+    backend.flush_activity()
+    after = backend.get_activity(hot_ids)
+    for user_id in hot_ids:
+        n = merged["increments"].get(user_id, 0)
+        for name, delta in DELTAS.items():
+            got = after[user_id][name] - before_activity[user_id][name]
+            assert got == n * delta, f"user {user_id} {name}: {got} != {n * delta} (lost updates)"
+    for product_id, n in merged["purchases"].items():
+        got = backend.get_product(product_id)["purchases"] - before_purchases[product_id]
+        assert got == n, f"product {product_id}: {got} purchases != {n} (lost updates)"
+
+    assert len(merged["users"]) == signups_expected, "signups went missing"
+    assert len(set(merged["users"])) == len(merged["users"]), "duplicate user ids"
+    assert len(set(merged["campaigns"])) == len(merged["campaigns"]), "duplicate campaign ids"
+    assert merged["contended"] == 1, f"{merged['contended']} signups won the same username"
+
+    for user_id in hot_ids:
+        assigned, _ = backend.newest_assignments(user_id, len(merged["campaigns"]) + 1)
+        assert set(merged["campaigns"]) <= set(assigned), f"user {user_id} is missing assignments"
+
+    # Placement must reflect the final counters, whatever order updates finished in
+    all_ids = hot_ids + merged["users"]
+    activity = backend.get_activity(all_ids)
+    ids = [user_id for user_id in all_ids if user_id in activity]
+    profiles, _, eligible = predict_segments(model, [activity[user_id] for user_id in ids], ids)
+    expected = {segment: set() for segment in SEGMENTS}
+    for user_id, profile, ok in zip(ids, profiles, eligible):
+        if ok:
+            expected[profile].add(user_id)
+    for segment in SEGMENTS:
+        targets = {uid for page, _ in backend.segment_target_pages(segment) for uid in page} & set(ids)
+        assert targets == expected[segment], f"segment {segment} targets are stale"
+
+
+def stress(name, model, workdir, threads, processes, rounds, signups):
+    server = None
+    if name == "state_server":
+        server = StateServer(MemoryBackend(model), os.path.join(workdir, "state.sock")).start()
+        config = {"address": server.address}
+    elif name == "sqlite":
+        config = {"path": os.path.join(workdir, "stress.db")}
+    else:
+        config = None
+        processes = 1  # state lives in this process
+    backend = create_backend(name, model, **config) if config else make_backend(name, model, workdir, 0.0)
+
+    hot_ids = [backend.create_user(f"hot{i}", "pw")["user_id"] for i in range(HOT_USERS)]
+    product_ids = [product["product_id"] for product in PRODUCTS]
+    before_activity = backend.get_activity(hot_ids)
+    before_purchases = {pid: backend.get_product(pid).get("purchases", 0) for pid in product_ids}
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = run_threads(backend, "p0", threads, rounds, signups, hot_ids, product_ids)
+    else:
+        context = multiprocessing.get_context("fork")
+        out = context.Queue()
+        procs = [context.Process(target=run_process, args=(name, config, f"p{p}", threads, rounds, signups,
+                                                            hot_ids, product_ids, out))
+                 for p in range(processes)]
+        for proc in procs:
+            proc.start()
+        results = []
+        for _ in procs:
+            result = out.get()
+            if isinstance(result, Exception):
+                raise result
+            results += result
+        for proc in procs:
+            proc.join()
+            assert proc.exitcode == 0, f"worker process exited with {proc.exitcode}"
+    elapsed = time.perf_counter() - start
+
+    try:
+        check(backend, model, merge(results), hot_ids, before_activity, before_purchases,
+              processes * threads * min(signups, rounds))
+    finally:
+        backend.close()
+        if server is not None:
+            server.close()
+    ops = processes * threads * rounds
+    return processes, ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="memory,sqlite,state_server,dynamodb")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=300, help="increment rounds per thread")
+    parser.add_argument("--signups", type=int, default=50, help="signups per thread")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    sys.setswitchinterval(1e-6)
+
+    model = CachedModel("campaign_model.pkl")
+    model.registry.current()
+    workdir = tempfile.mkdtemp()
+    try:
+        for name in args.backends.split(","):
+            processes, rate = stress(name, model, workdir, args.threads, args.processes, args.rounds, args.signups)
+            print(f"{name:>12}: {processes} x {args.threads} threads, {rate:,.0f} rounds/s, no lost updates")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
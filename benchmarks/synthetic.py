@@ -0,0 +1,16 @@
+import numpy as np
+
+from scoring import FEATURES, load_dataset_features
+
+
+def synthetic_features(n, seed=0):
+    """n feature rows resampled (with replacement) from the campaign dataset."""
+    rng = np.random.default_rng(seed)
+    base = load_dataset_features()
+    return base[rng.integers(0, len(base), size=n)]
+
+
+def synthetic_activity(n, seed=0):
+    """n (user_id, activity dict) pairs shaped like the apps' user_activity records."""
+    for user_id, row in enumerate(synthetic_features(n, seed).tolist(), start=1):
+        yield user_id, dict(zip(FEATURES, row))
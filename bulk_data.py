@@ -0,0 +1,313 @@
+"""Bulk import/export of users and activity between CSV/JSONL files and DynamoDB.
+
+Import streams the file in chunks (it is never loaded whole), scores each
+chunk with the model so imported users land in the segment index, and
+writes chunks from a pool of batch_writer workers. Throttled chunks are
+retried with backoff; writes are idempotent puts, so a retry or a resumed
+run never double-counts. With --checkpoint, the number of rows safely
+written is saved as chunks finish, and a rerun skips them.
+
+Rows need a user_id (User_id in the dataset export) and any of the five
+activity counters; missing counters get their defaults. A last_seen column
+(epoch seconds) is kept, otherwise it is back-dated from last_open_days so
+imported users age like everyone else (see activity_aging.py). Rows with a
+username (and password) also get a Users item and a Usernames claim; a
+username already claimed by another user is reported, not overwritten.
+The dataset's send_campaign/customer_profile labels are ignored, since
+users are re-scored.
+
+Export parallel-scans UserActivity and writes each user's counters and
+current segment, plus username with --with-users. The format follows the
+file extension (.csv or .jsonl).
+
+    python bulk_data.py import data/campaign_dataset.csv [--workers 4] [--checkpoint import.ckpt]
+    python bulk_data.py export activity.jsonl [--segments 4] [--with-users]
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+from botocore.exceptions import ClientError
+
+from activity_aging import seen_at
+from dynamo_batch import batch_get, with_retries
+from dynamo_scan import FEATURE_PROJECTION, SCAN_SEGMENTS, parallel_scan
+from scoring import DEFAULT_ACTIVITY, FEATURES, load_model
+from segment_index import SEGMENT_SHARDS, segment_attributes
+
+# Rows per worker task (batch_writer sends them 25 per request)
+CHUNK_SIZE = 500
+
+IMPORT_WORKERS = 4
+
+# Seconds between progress lines
+REPORT_EVERY = 5.0
+
+EXPORT_PROJECTION = FEATURE_PROJECTION + ", last_seen, customer_profile, send_campaign"
+
+
+# Reading and writing files
+
+def file_format(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"Unknown format for {path!r}; use .csv or .jsonl (or --format)")
+    return fmt
+
+
+def read_rows(path, fmt=None):
+    """Yield one dict per row, keys lower-cased, without reading the whole file."""
+    fmt = file_format(path, fmt)
+    with open(path, newline='') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield {key.strip().lower(): value for key, value in row.items()}
+        else:
+            for line in f:
+                if line.strip():
+                    yield {key.lower(): value for key, value in json.loads(line).items()}
+
+
+def chunked(rows, size, skip=0):
+    """Yield (index of first row, rows) chunks, after skipping the first skip rows."""
+    chunk, start = [], skip
+    for i, row in enumerate(rows):
+        if i < skip:
+            continue
+        chunk.append(row)
+        if len(chunk) == size:
+            yield start, chunk
+            chunk, start = [], i + 1
+    if chunk:
+        yield start, chunk
+
+
+class RowWriter:
+    def __init__(self, path, fmt=None, columns=None):
+        self.fmt = file_format(path, fmt)
+        self.file = open(path, 'w', newline='')
+        self.csv = csv.DictWriter(self.file, columns, extrasaction='ignore') if self.fmt == 'csv' else None
+        if self.csv:
+            self.csv.writeheader()
+
+    def write(self, rows):
+        if self.csv:
+            self.csv.writerows(rows)
+        else:
+            self.file.write("".join(json.dumps(row) + "\n" for row in rows))
+
+    def close(self):
+        self.file.close()
+
+
+class Checkpoint:
+    """Rows of a source file already imported, saved as JSON next to the run."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.rows = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get('source') == self.source:
+                self.rows = int(saved['rows'])
+
+    def save(self, rows):
+        self.rows = rows
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'source': self.source, 'rows': rows, 'saved_at': time.time()}, f)
+        os.replace(tmp, self.path)  # never leave a half-written checkpoint
+
+
+class Progress:
+    def __init__(self, label, start_rows=0, report_every=REPORT_EVERY):
+        self.label = label
+        self.rows = 0
+        self.start_rows = start_rows
+        self.started = time.perf_counter()
+        self.report_every = report_every
+        self._next_report = self.started + report_every
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self.rows += n
+            now = time.perf_counter()
+            if self.report_every and now >= self._next_report:
+                self._next_report = now + self.report_every
+                print(f"{self.label}: {self.start_rows + self.rows:,} rows, {self.rate():,.0f} rows/s")
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+
+# Import
+
+def activity_item(row, now):
+    item = {'user_id': str(row['user_id']).strip()}
+    for name in FEATURES:
+        value = row.get(name)
+        item[name] = int(float(value)) if value not in (None, '') else DEFAULT_ACTIVITY[name]
+    last_seen = seen_at(dict(item, last_seen=row.get('last_seen') or None), now)
+    if last_seen is not None:
+        item['last_seen'] = int(last_seen)
+    return item
+
+
+class Importer:
+    def __init__(self, dynamodb, model=None, shards=SEGMENT_SHARDS):
+        self.activity_table = dynamodb.Table('UserActivity')
+        self.users_table = dynamodb.Table('Users')
+        self.usernames_table = dynamodb.Table('Usernames')
+        self.model = model
+        self.shards = shards
+        self.conflicts = []
+
+    def write_chunk(self, rows):
+        now = time.time()
+        items = [activity_item(row, now) for row in rows]
+        if self.model is not None:
+            placements = segment_attributes(self.model, items, self.shards)
+            for item in items:
+                profile, send, target = placements[item['user_id']]
+                item.update(customer_profile=profile, send_campaign=send)
+                if target is not None:
+                    item['target_segment'] = target
+        with_retries(lambda: self._put(self.activity_table, items, 'user_id'))
+
+        users = [{'user_id': str(row['user_id']).strip(), 'username': row['username'],
+                  'password': row.get('password', '')} for row in rows if row.get('username')]
+        if users:
+            with_retries(lambda: self._put(self.users_table, users, 'user_id'))
+            for user in users:
+                with_retries(lambda: self._claim_username(user))
+        return len(items)
+
+    def _put(self, table, items, key):
+        with table.batch_writer(overwrite_by_pkeys=[key]) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+    def _claim_username(self, user):
+        try:
+            self.usernames_table.put_item(
+                Item={'username': user['username'], 'user_id': user['user_id']},
+                ConditionExpression="attribute_not_exists(username) OR user_id = :id",
+                ExpressionAttributeValues={':id': user['user_id']}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            self.conflicts.append(user['username'])
+
+    def run(self, rows, checkpoint, chunk_size=CHUNK_SIZE, workers=IMPORT_WORKERS, report_every=REPORT_EVERY):
+        """Write rows from a pool of workers. Returns the Progress.
+
+        Chunks finish out of order; the checkpoint only moves past a row once
+        every chunk before it is written, so a resumed run may rewrite a few
+        chunks but never skips one.
+        """
+        progress = Progress("import", checkpoint.rows, report_every)
+        finished = {}  # first row of a finished chunk -> first row after it
+        pending = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import") as pool:
+            def collect():
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end = pending.pop(future)
+                    progress.add(future.result())
+                    finished[start] = end
+                watermark = checkpoint.rows
+                while watermark in finished:
+                    watermark = finished.pop(watermark)
+                if watermark != checkpoint.rows:
+                    checkpoint.save(watermark)
+
+            for start, chunk in chunked(rows, chunk_size, skip=checkpoint.rows):
+                # A couple of chunks queued per worker, so reading never runs far ahead
+                while len(pending) >= workers * 2:
+                    collect()
+                pending[pool.submit(self.write_chunk, chunk)] = (start, start + len(chunk))
+            while pending:
+                collect()
+        return progress
+
+
+# Export
+
+def export_row(item):
+    # Numbers come back from DynamoDB as Decimals
+    row = {'user_id': item['user_id']}
+    for name in FEATURES + ('last_seen', 'customer_profile', 'send_campaign'):
+        if item.get(name) is not None:
+            row[name] = int(item[name])
+    return row
+
+
+def export_activity(dynamodb, path, fmt=None, segments=SCAN_SEGMENTS, with_users=False, report_every=REPORT_EVERY):
+    """Write every UserActivity item to path. Returns the Progress."""
+    activity_table = dynamodb.Table('UserActivity')
+    columns = (['user_id'] + (['username'] if with_users else []) + list(FEATURES)
+               + ['last_seen', 'customer_profile', 'send_campaign'])
+    writer = RowWriter(path, fmt, columns)
+    progress = Progress("export", report_every=report_every)
+    try:
+        for page in parallel_scan(activity_table, segments, ProjectionExpression=EXPORT_PROJECTION):
+            rows = [export_row(item) for item in page]
+            if with_users:
+                users = batch_get(dynamodb, 'Users', 'user_id', [row['user_id'] for row in rows],
+                                  projection="user_id, username")
+                for row in rows:
+                    row['username'] = users.get(row['user_id'], {}).get('username')
+            writer.write(rows)
+            progress.add(len(rows))
+    finally:
+        writer.close()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="default: from the file extension")
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS, help="import: parallel batch writers")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="import: rows per worker task")
+    parser.add_argument('--checkpoint', help="import: file recording progress, to resume an interrupted run")
+    parser.add_argument('--skip-scoring', action='store_true',
+                        help="import: don't score users (run rebuild_segment_index.py afterwards)")
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('SEGMENT_SHARDS', SEGMENT_SHARDS)))
+    parser.add_argument('--segments', type=int, default=SCAN_SEGMENTS, help="export: parallel scan segments")
+    parser.add_argument('--with-users', action='store_true', help="export: include usernames")
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        'campaign_model.pkl'))
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    if args.command == 'import':
+        checkpoint = Checkpoint(args.checkpoint, args.path)
+        if checkpoint.rows:
+            print(f"Resuming after row {checkpoint.rows:,}")
+        importer = Importer(dynamodb, None if args.skip_scoring else load_model(args.model), args.shards)
+        progress = importer.run(read_rows(args.path, args.format), checkpoint, args.chunk_size, args.workers)
+        print(f"Imported {progress.rows:,} rows at {progress.rate():,.0f} rows/s ({checkpoint.rows:,} total)")
+        for username in importer.conflicts:
+            print(f"Username already taken by another user, not imported: {username}")
+    else:
+        progress = export_activity(dynamodb, args.path, args.format, args.segments, args.with_users)
+        print(f"Exported {progress.rows:,} rows at {progress.rate():,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
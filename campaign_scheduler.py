@@ -0,0 +1,205 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from event_log import events
+
+
+UPCOMING = "Upcoming"
+ACTIVE = "Active"
+EXPIRED = "Expired"
+
+# How often the scheduler re-reads the campaign list, to pick up campaigns
+# created by other processes
+SYNC_INTERVAL = 30.0
+
+_START, _END = 0, 1
+
+# A browser's "+HH:MM" UTC offset, as the launch form sends it
+UTC_OFFSET = re.compile(r"[+-](0\d|1[0-4]):[0-5]\d")
+
+
+def campaign_zone(name):
+    """tzinfo for the CAMPAIGN_TIMEZONE setting, an IANA name such as "Europe/Berlin"."""
+    if not name or name.upper() == "UTC":
+        return timezone.utc
+    from zoneinfo import ZoneInfo
+    return ZoneInfo(name)
+
+
+def localize_form_time(value, offset=None, zone=timezone.utc):
+    """A launch form datetime-local value ("2026-01-01T09:00") as ISO with its UTC offset.
+
+    offset is the "+HH:MM" the admin's browser reports for that moment;
+    without a valid one the value is taken in zone. Values that already
+    carry an offset, and empty or unparseable ones, are returned unchanged.
+    """
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return value
+    if parsed.tzinfo is not None:
+        return value
+    if offset and UTC_OFFSET.fullmatch(offset):
+        parsed = datetime.fromisoformat(parsed.isoformat() + offset)
+    else:
+        parsed = parsed.replace(tzinfo=zone)
+    return parsed.isoformat(timespec="minutes")
+
+
+def parse_campaign_time(value):
+    """Epoch seconds for a campaign start_time/end_time, or None if unset or unparseable.
+
+    The launch form's values are stored with their UTC offset (see
+    localize_form_time); zone-less ones from before that are taken as UTC.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class CampaignScheduler:
+    """Activates and expires campaigns at their start_time and end_time.
+
+    Pending transitions sit in a heap ordered by time, so advance() only
+    touches campaigns whose moment has come. The active campaign ids are a
+    frozenset that is replaced, never mutated, on every change: the /home
+    path reads active_ids with no lock. A campaign with no start_time is
+    active from creation, and one with no end_time never expires.
+
+    on_activate(campaign_ids) and on_expire(campaign_ids) are called with
+    every batch of campaigns that just started or just expired, from the
+    scheduler thread (or whichever thread called add() or advance()).
+    """
+
+    def __init__(self, on_expire=None, clock=time.time, on_activate=None):
+        self.on_expire = on_expire
+        self.on_activate = on_activate
+        self.clock = clock
+        self.active_ids = frozenset()
+        self.states = {}
+        self.activated = 0
+        self.expired = 0
+        self._heap = []
+        self._seq = itertools.count()  # tie-break so the heap never compares ids
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def add(self, campaign):
+        """Start tracking a campaign dict (no-op if already tracked). Returns its state."""
+        campaign_id = campaign["campaign_id"]
+        start = parse_campaign_time(campaign.get("start_time"))
+        end = parse_campaign_time(campaign.get("end_time"))
+        with self._cond:
+            if campaign_id in self.states:
+                return self.states[campaign_id]
+            self.states[campaign_id] = UPCOMING
+            if campaign.get("status") == EXPIRED:
+                self.states[campaign_id] = EXPIRED
+                return EXPIRED
+            heapq.heappush(self._heap, (start or 0.0, next(self._seq), _START, campaign_id))
+            if end is not None:
+                heapq.heappush(self._heap, (end, next(self._seq), _END, campaign_id))
+            self._cond.notify()
+        self.advance()
+        return self.states[campaign_id]
+
+    def sync(self, campaigns):
+        for campaign in campaigns:
+            if campaign["campaign_id"] not in self.states:
+                self.add(campaign)
+
+    def advance(self, now=None):
+        """Apply every transition due by now. Returns the ids that expired."""
+        now = self.clock() if now is None else now
+        activated, expired = [], []
+        with self._cond:
+            active = set(self.active_ids)
+            while self._heap and self._heap[0][0] <= now:
+                _, _, event, campaign_id = heapq.heappop(self._heap)
+                state = self.states.get(campaign_id)
+                if event == _START and state == UPCOMING:
+                    self.states[campaign_id] = ACTIVE
+                    active.add(campaign_id)
+                    activated.append(campaign_id)
+                    self.activated += 1
+                elif event == _END and state != EXPIRED:
+                    self.states[campaign_id] = EXPIRED
+                    active.discard(campaign_id)
+                    expired.append(campaign_id)
+                    self.expired += 1
+            if len(active) != len(self.active_ids) or expired:
+                self.active_ids = frozenset(active)
+        if activated and self.on_activate is not None:
+            self.on_activate(activated)
+        if expired and self.on_expire is not None:
+            self.on_expire(expired)
+        return expired
+
+    def state(self, campaign_id):
+        return self.states.get(campaign_id)
+
+    def next_due(self):
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def start(self, list_campaigns=None, sync_interval=SYNC_INTERVAL):
+        """Run advance() on a daemon thread, waking at the next due transition.
+
+        With list_campaigns, the campaign list is re-read every sync_interval
+        seconds and any campaign not seen yet is added.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(list_campaigns, sync_interval),
+                                            name="campaign-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self, list_campaigns, sync_interval):
+        next_sync = 0.0
+        while not self._stopped:
+            now = self.clock()
+            if list_campaigns is not None and now >= next_sync:
+                try:
+                    self.sync(list_campaigns())
+                except Exception as e:
+                    # Storage hiccup: keep running the transitions we know about
+                    events.error("campaign_sync_failed", error=str(e))
+                next_sync = now + sync_interval
+            try:
+                self.advance(now)
+            except Exception as e:
+                # A failing callback must not stop later transitions
+                events.error("campaign_transition_failed", error=str(e))
+            with self._cond:
+                due = self._heap[0][0] if self._heap else float("inf")
+                wake = min(due, next_sync if list_campaigns is not None else float("inf"))
+                if not self._stopped:
+                    self._cond.wait(max(min(wake - self.clock(), sync_interval), 0.0))
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self):
+        counts = {UPCOMING: 0, ACTIVE: 0, EXPIRED: 0}
+        for state in list(self.states.values()):
+            counts[state] += 1
+        return {
+            "campaigns": counts,
+            "pending_transitions": len(self._heap),
+            "next_due_in": round(self.next_due() - self.clock(), 3) if self._heap else None,
+            "activated": self.activated,
+            "expired": self.expired
+        }
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import threading
+import time
+
+from event_log import events
+
+
+# Product fields that change on their own (every buy); everything else is
+# the static catalog, which only changes when products are edited
+COUNTER_FIELDS = ("views", "purchases")
+
+# Seconds between background reloads
+REFRESH_INTERVAL = 15.0
+
+
+def split_product(product):
+    """(static fields, counters) of a product dict."""
+    static = {k: v for k, v in product.items() if k not in COUNTER_FIELDS}
+    counters = {k: product.get(k, 0) for k in COUNTER_FIELDS}
+    return static, counters
+
+
+class CatalogSnapshot:
+    """One immutable version of the static catalog.
+
+    digest is a hash of the content, so every process holding the same
+    catalog derives the same ETags; version counts changes in this process.
+    """
+
+    def __init__(self, products, version, modified):
+        self.products = products  # product_id -> static fields, in list order
+        self.version = version
+        self.modified = modified
+        self.digest = hashlib.sha1(json.dumps(products, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class ProductCatalog:
+    """Process-local product catalog, reloaded from storage on a background thread.
+
+    Requests read the current snapshot and counters without touching
+    storage. A reload only replaces the snapshot (and bumps the version)
+    when a static field changed; counters are swapped on every reload, and
+    bump() applies a buy made in this process straight away so the buyer
+    sees it. Until the first reload finishes, current() loads inline.
+
+    on_change listeners get just the products whose static fields changed,
+    so indexes over the catalog update incrementally.
+    """
+
+    def __init__(self, load, refresh_interval=REFRESH_INTERVAL, clock=time.time):
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.snapshot = None
+        self.counters = {}           # product_id -> {field: value}
+        self.counters_modified = {}  # product_id -> when its counters last changed
+        self.reloads = 0
+        self.errors = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def current(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            change = None
+            with self._lock:
+                if self.snapshot is None:
+                    change = self._apply(self.load())
+                snapshot = self.snapshot
+            self._notify(change)
+        return snapshot
+
+    def refresh(self):
+        products = self.load()
+        # Reloads and bumps both replace the counters, so they take turns
+        with self._lock:
+            change = self._apply(products)
+        self._notify(change)
+
+    def on_change(self, listener):
+        """Call listener(changed, removed) with {product_id: static fields} and [product_id] on every change."""
+        self._listeners.append(listener)
+
+    def _notify(self, change):
+        if change is None:
+            return
+        for listener in self._listeners:
+            try:
+                listener(*change)
+            except Exception as e:
+                events.error("catalog_listener_failed", error=str(e))
+
+    def _apply(self, products):
+        """Install a reload; returns (changed, removed) if the static catalog changed, else None."""
+        now = self.clock()
+        static, counters = {}, {}
+        for product in products:
+            static[product["product_id"]], counters[product["product_id"]] = split_product(product)
+        snapshot = CatalogSnapshot(static, 0, now)
+        current = self.snapshot
+        change = None
+        if current is None or current.digest != snapshot.digest:
+            snapshot.version = current.version + 1 if current else 1
+            self.snapshot = snapshot
+            old = current.products if current else {}
+            change = ({pid: product for pid, product in static.items() if old.get(pid) != product},
+                      [pid for pid in old if pid not in static])
+        for product_id, values in counters.items():
+            old = self.counters.get(product_id)
+            if old is not None:
+                # Counters only grow; a reload that started before a bump() must not undo it
+                values.update({k: max(v, old.get(k, v)) for k, v in values.items()})
+            if old != values:
+                self.counters_modified[product_id] = now
+        self.counters = counters
+        self.reloads += 1
+        return change
+
+    def clear(self):
+        """Drop the snapshot; the next current() loads inline."""
+        with self._lock:
+            removed = list(self.snapshot.products) if self.snapshot else []
+            self.snapshot = None
+            self.counters = {}
+            self.counters_modified = {}
+        self._notify(({}, removed) if removed else None)
+
+    def product(self, product_id):
+        """Static fields merged with the latest counters, or None if not in the catalog."""
+        static = self.current().products.get(product_id)
+        if static is None:
+            return None
+        return dict(static, **self.counters.get(product_id, {}))
+
+    def bump(self, product_id, field="purchases", n=1):
+        with self._lock:
+            values = self.counters.get(product_id)
+            if values is not None:
+                counters = dict(self.counters)
+                counters[product_id] = dict(values, **{field: values.get(field, 0) + n})
+                self.counters = counters
+                self.counters_modified[product_id] = self.clock()
+
+    def product_etag(self, product_id):
+        values = self.counters.get(product_id, {})
+        return f"{self.current().digest}-{'-'.join(str(values.get(k, 0)) for k in COUNTER_FIELDS)}"
+
+    def product_modified(self, product_id):
+        snapshot = self.current()
+        return max(snapshot.modified, self.counters_modified.get(product_id, snapshot.modified))
+
+    def start(self):
+        if self._thread is None and self.refresh_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="catalog-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the last good snapshot
+                self.errors += 1
+                events.error("catalog_refresh_failed", error=str(e))
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "digest": snapshot.digest if snapshot else None,
+            "products": len(snapshot.products) if snapshot else 0,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "age": round(self.clock() - snapshot.modified, 1) if snapshot else None
+        }
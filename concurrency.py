@@ -0,0 +1,64 @@
+import collections
+import threading
+from contextlib import contextmanager
+
+
+# Locks per LockStripes; keys hash onto them, so two requests only wait on
+# each other when their keys share a stripe
+DEFAULT_STRIPES = 64
+
+
+class LockStripes:
+    """A fixed set of locks shared out by key.
+
+    Guards per-key state (a user's counters, a product, a campaign) without
+    one global lock: updates to different keys almost never contend, and
+    updates to the same key are serialized.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def index(self, key):
+        return hash(key) % len(self._locks)
+
+    def __call__(self, key):
+        """The lock for key."""
+        return self._locks[self.index(key)]
+
+    def group(self, keys):
+        """[(lock, keys)] so a batch takes each stripe once instead of once per key."""
+        groups = collections.defaultdict(list)
+        for key in keys:
+            groups[self.index(key)].append(key)
+        return [(self._locks[i], group) for i, group in sorted(groups.items())]
+
+    @contextmanager
+    def all(self):
+        """Hold every stripe, e.g. while reallocating what they guard."""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+
+class AtomicCounter:
+    """Race-free id allocation: next() never hands out the same value twice."""
+
+    def __init__(self, start=1):
+        self._next = start
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            value = self._next
+            self._next += 1
+            return value
+
+    @property
+    def value(self):
+        """The last value handed out."""
+        return self._next - 1
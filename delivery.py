@@ -0,0 +1,188 @@
+"""Per-user campaign delivery: the SNS fan-out stage of a launch.
+
+run_launch() hands each page of targeted users to CampaignDelivery.deliver(),
+which:
+
+  1. claims the users in the backend's delivery ledger (claim_deliveries),
+     DELIVERY_CHUNK at a time. Only newly claimed users are sent to, so a
+     page replayed after a crash or a resumed launch never notifies anyone
+     twice. A crash between claim and send loses those messages instead:
+     at most once, never twice.
+  2. renders the campaign's subject and offer for each user ({username},
+     {campaign}, {offer}, {end_time} placeholders)
+  3. publishes them with publish_batch (10 per call) from `workers`
+     threads, through a token bucket capping the campaign at `rate`
+     messages per second. Failed entries are retried on their own.
+
+Each message carries user_id and campaign_id message attributes, for SNS
+subscription filter policies to route it to the user's endpoint. Its
+idempotency key (campaign_id:user_id) is also sent as the
+MessageDeduplicationId on FIFO topics (ARN ending in .fifo).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from notifications import PUBLISH_BATCH_SIZE, publish_with_retries
+
+
+# One item per (campaign, user) sent to:
+#   delivery_key  partition key, "<campaign_id>#<user_id>"
+DELIVERIES_TABLE = 'Deliveries'
+
+# Users claimed (and their usernames read) per ledger call
+DELIVERY_CHUNK = 500
+
+# Default per-campaign cap in messages per second; 0 is uncapped
+SEND_RATE = 1000
+
+DELIVERY_WORKERS = 8
+
+# Batches queued for the workers before the claiming thread waits
+MAX_IN_FLIGHT_BATCHES = 64
+
+# Most seconds between heartbeats while a page is being sent, well under
+# the app's LAUNCH_STALE_SECONDS even when a low send rate stalls a chunk
+HEARTBEAT_INTERVAL = 10.0
+
+
+def delivery_key(campaign_id, user_id):
+    return f"{campaign_id}#{user_id}"
+
+
+def idempotency_key(campaign_id, user_id):
+    return f"{campaign_id}:{user_id}"
+
+
+class _Fields(dict):
+    def __missing__(self, key):
+        return "{" + key + "}"  # unknown placeholders are left as written
+
+
+def render(template, fields):
+    try:
+        return str(template).format_map(_Fields(fields))
+    except (ValueError, IndexError, AttributeError):
+        return str(template)  # stray braces: send the text as is
+
+
+class RateLimiter:
+    """Token bucket: acquire(n) waits until n tokens are available at `rate` per second.
+
+    At most `burst` tokens build up (a tenth of a second's worth by
+    default), so an idle spell doesn't let a burst through over the cap.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or max(rate / 10, PUBLISH_BATCH_SIZE)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            self.sleep(wait)
+
+
+class CampaignDelivery:
+    """Sends one campaign to pages of users; counters are totals over every deliver() call."""
+
+    def __init__(self, backend, client, topic_arn, campaign, rate=SEND_RATE, workers=DELIVERY_WORKERS,
+                 max_retries=5, heartbeat=None):
+        self.backend = backend
+        self.client = client
+        self.topic_arn = topic_arn
+        self.campaign = campaign
+        self.campaign_id = campaign['campaign_id']
+        self.limiter = RateLimiter(rate)
+        self.workers = workers
+        self.max_retries = max_retries
+        # Called after every chunk and during long waits, so a slow page
+        # doesn't make the launch look stale (run_launch saves the progress)
+        self.heartbeat = heartbeat or (lambda: None)
+        self.fifo = topic_arn.endswith('.fifo')
+        self.needs_username = any('{username}' in str(campaign.get(field, '')) for field in ('subject', 'offer'))
+        self.delivered = 0
+        self.failed = 0
+        self.skipped = 0  # already claimed by an earlier attempt
+        self.retries = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def message(self, user_id, username):
+        fields = {'username': username or 'there', 'campaign': self.campaign.get('name', ''),
+                  'offer': self.campaign.get('offer', ''), 'end_time': self.campaign.get('end_time', '')}
+        entry = {
+            'Subject': render(self.campaign.get('subject', ''), fields)[:100],  # SNS subject limit
+            'Message': render(self.campaign.get('offer', ''), fields),
+            'MessageAttributes': {
+                'user_id': {'DataType': 'String', 'StringValue': str(user_id)},
+                'campaign_id': {'DataType': 'String', 'StringValue': str(self.campaign_id)}
+            }
+        }
+        if self.fifo:
+            entry['MessageDeduplicationId'] = idempotency_key(self.campaign_id, user_id)
+            entry['MessageGroupId'] = str(user_id)
+        return entry
+
+    def _send(self, batch):
+        self.limiter.acquire(len(batch))
+        entries = [dict(entry, Id=str(i)) for i, entry in enumerate(batch)]
+        result = publish_with_retries(self.client, self.topic_arn, entries, self.max_retries)
+        with self._lock:
+            self.delivered += len(result.sent)
+            self.failed += len(result.failed)
+            self.retries += result.retries
+            self.calls += result.calls
+        return len(result.sent), len(result.failed)
+
+    def deliver(self, user_ids):
+        """Send to every user in the page not sent to before; returns (delivered, failed) for the page."""
+        delivered = failed = 0
+        in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT_BATCHES)
+        futures = []
+
+        def send(batch):
+            try:
+                return self._send(batch)
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="delivery") as executor:
+            for start in range(0, len(user_ids), DELIVERY_CHUNK):
+                chunk = user_ids[start:start + DELIVERY_CHUNK]
+                claimed = self.backend.claim_deliveries(self.campaign_id, chunk)
+                with self._lock:
+                    self.skipped += len(chunk) - len(claimed)
+                users = self.backend.get_users(claimed) if self.needs_username and claimed else {}
+                messages = [self.message(user_id, users.get(user_id, {}).get('username')) for user_id in claimed]
+                for i in range(0, len(messages), PUBLISH_BATCH_SIZE):
+                    # Claiming runs ahead of sending by at most MAX_IN_FLIGHT_BATCHES
+                    while not in_flight.acquire(timeout=HEARTBEAT_INTERVAL):
+                        self.heartbeat()
+                    futures.append(executor.submit(send, messages[i:i + PUBLISH_BATCH_SIZE]))
+                self.heartbeat()
+            while wait(futures, timeout=HEARTBEAT_INTERVAL).not_done:
+                self.heartbeat()
+            for future in futures:
+                sent, lost = future.result()
+                delivered += sent
+                failed += lost
+        return delivered, failed
+
+    def stats(self):
+        return {"campaign_id": self.campaign_id, "delivered": self.delivered, "failed": self.failed,
+                "skipped": self.skipped, "retries": self.retries, "publish_calls": self.calls}
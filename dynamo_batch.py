@@ -0,0 +1,56 @@
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+
+# DynamoDB's BatchGetItem limit
+BATCH_GET_SIZE = 100
+
+MAX_RETRIES = 8
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 2.0
+
+# Error codes DynamoDB uses when a table or account is over its throughput
+THROTTLE_CODES = {'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded'}
+
+
+def backoff(attempt):
+    # Full jitter: sleep a random time up to the capped exponential delay
+    time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+
+def with_retries(fn):
+    """Run fn, retrying with backoff while DynamoDB throttles it."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return fn()
+        except ClientError as e:
+            if e.response['Error']['Code'] not in THROTTLE_CODES or attempt == MAX_RETRIES:
+                raise
+            backoff(attempt)
+
+
+def batch_get(dynamodb, table_name, key_name, keys, projection=None):
+    """Fetch items by key with chunked BatchGetItem calls, retrying UnprocessedKeys.
+
+    Returns {key: item}. Keys that do not exist (or are still unprocessed
+    after MAX_RETRIES) are missing from the result.
+    """
+    found = {}
+    keys = list(dict.fromkeys(keys))
+    for i in range(0, len(keys), BATCH_GET_SIZE):
+        request = {'Keys': [{key_name: key} for key in keys[i:i + BATCH_GET_SIZE]]}
+        if projection:
+            request['ProjectionExpression'] = projection
+        request_items = {table_name: request}
+
+        for attempt in range(MAX_RETRIES + 1):
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for item in response.get('Responses', {}).get(table_name, []):
+                found[item[key_name]] = item
+            request_items = response.get('UnprocessedKeys') or {}
+            if not request_items or attempt == MAX_RETRIES:
+                break
+            backoff(attempt)
+    return found
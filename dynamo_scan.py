@@ -0,0 +1,141 @@
+import queue
+import threading
+from functools import partial
+
+from scoring import FEATURES
+
+
+# Parallel scan segments (one worker thread each)
+SCAN_SEGMENTS = 4
+
+# Pages buffered between the scan workers and the consumer
+PAGES_PER_WORKER = 2
+
+# Only the key and the five model inputs are needed to score a user
+FEATURE_PROJECTION = ", ".join(("user_id",) + FEATURES)
+
+_DONE = object()
+
+# Checkpoint marker for a segment that has been scanned to the end
+SEGMENT_DONE = "done"
+
+
+def scan_pages(table, **scan_kwargs):
+    """Yield every page of a (segment of a) scan, following LastEvaluatedKey."""
+    for items, _ in scan_positions(table, **scan_kwargs):
+        yield items
+
+
+def scan_positions(table, **scan_kwargs):
+    """Like scan_pages, but yield (items, LastEvaluatedKey) so a caller can resume later."""
+    while True:
+        response = table.scan(**scan_kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), last_key
+        if not last_key:
+            return
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
+def query_positions(table, **query_kwargs):
+    """Yield (items, LastEvaluatedKey) for every page of a query."""
+    while True:
+        response = table.query(**query_kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), last_key
+        if not last_key:
+            return
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def parallel_scan(table, segments=SCAN_SEGMENTS, **scan_kwargs):
+    """Yield pages of items from a Segment/TotalSegments parallel scan.
+
+    Each segment is read by its own worker thread. Pages go through a bounded
+    queue, so memory stays at a few pages per worker however big the table is.
+    Closing the generator early stops the workers.
+    """
+    for _, items, _ in parallel_scan_positions(table, segments, **scan_kwargs):
+        yield items
+
+
+def parallel_scan_positions(table, segments=SCAN_SEGMENTS, start_keys=None, **scan_kwargs):
+    """Parallel scan yielding (segment, items, LastEvaluatedKey) for checkpointing.
+
+    start_keys maps str(segment) to the ExclusiveStartKey to resume that
+    segment from, or to SEGMENT_DONE to skip it.
+    """
+    start_keys = start_keys or {}
+    todo = [segment for segment in range(max(segments, 1)) if start_keys.get(str(segment)) != SEGMENT_DONE]
+
+    def segment_scan(segment):
+        kwargs = dict(scan_kwargs)
+        if segments > 1:
+            kwargs.update(Segment=segment, TotalSegments=segments)
+        if start_keys.get(str(segment)):
+            kwargs['ExclusiveStartKey'] = start_keys[str(segment)]
+        for items, last_key in scan_positions(table, **kwargs):
+            yield segment, items, last_key
+
+    yield from parallel_pages({segment: partial(segment_scan, segment) for segment in todo})
+
+
+def parallel_pages(sources):
+    """Drain several page generators concurrently, one worker thread each.
+
+    sources maps a name to a zero-argument callable returning a generator.
+    Whatever the generators yield is passed through a bounded queue, so memory
+    stays at a few pages per worker. Closing the generator early stops the workers.
+    """
+    if len(sources) <= 1:
+        for source in sources.values():
+            yield from source()
+        return
+
+    pages = queue.Queue(maxsize=len(sources) * PAGES_PER_WORKER)
+    stop = threading.Event()
+
+    def put(page):
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(source):
+        try:
+            for page in source():
+                if not put(page):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    threads = [threading.Thread(target=worker, args=(source,), daemon=True) for source in sources.values()]
+    for thread in threads:
+        thread.start()
+
+    try:
+        remaining = len(threads)
+        while remaining:
+            page = pages.get()
+            if page is _DONE:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def scan_activity(table, segments=SCAN_SEGMENTS):
+    """Stream (user_id, activity item) pairs with just the model features projected."""
+    for page in parallel_scan(table, segments, ProjectionExpression=FEATURE_PROJECTION):
+        for item in page:
+            yield item['user_id'], item
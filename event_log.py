@@ -0,0 +1,113 @@
+import atexit
+import collections
+import json
+import random
+import sys
+import threading
+import time
+
+
+# Fraction of sampled (info) events that are written; errors are always written
+DEFAULT_SAMPLE_RATE = 0.01
+
+# Events buffered for the writer thread before the oldest are dropped
+DEFAULT_MAX_QUEUE = 10000
+
+
+class EventLog:
+    """Sampled, structured, non-blocking event log.
+
+    log() builds one JSON object per event and appends it to a bounded
+    queue; a background thread writes the queue to the stream as JSON lines.
+    Request threads never wait on the stream, and if it falls behind the
+    oldest events are dropped (and counted). log() events are sampled at
+    sample_rate; info() and error() events are always kept.
+    """
+
+    def __init__(self, stream=None, sample_rate=DEFAULT_SAMPLE_RATE, max_queue=DEFAULT_MAX_QUEUE):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.logged = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.written = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def log(self, event, **fields):
+        """Queue a sampled info event, for per-request detail."""
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        self._enqueue("info", event, fields)
+
+    def info(self, event, **fields):
+        """Queue an info event that is never sampled out (startup, model swaps, ...)."""
+        self._enqueue("info", event, fields)
+
+    def error(self, event, **fields):
+        """Queue an error event (never sampled out)."""
+        self._enqueue("error", event, fields)
+
+    def _enqueue(self, level, event, fields):
+        record = {"ts": round(time.time(), 3), "level": level, "event": event}
+        record.update(fields)
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(record)
+            self.logged += 1
+            self._cond.notify()
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stopped)
+                if not self._queue:
+                    return
+                records, self._queue = self._queue, collections.deque()
+            self._write(records)
+
+    def _write(self, records):
+        stream = self.stream or sys.stderr
+        try:
+            stream.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+            stream.flush()
+            self.written += len(records)
+        except Exception:
+            self.dropped += len(records)
+
+    def stop(self, timeout=5.0):
+        """Write what is queued and stop the writer thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "logged": self.logged,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "written": self.written,
+            "sample_rate": self.sample_rate
+        }
+
+
+# Shared by the app and its background workers
+events = EventLog()
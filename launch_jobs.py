@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from event_log import events
+
+
+# Campaign status as a launch moves through the job runner
+SCHEDULED = "Scheduled"
+TARGETING = "Targeting"
+DELIVERED = "Delivered"
+FAILED = "Failed"
+
+
+class LaunchProgress:
+    """Progress and resume checkpoint of one campaign launch.
+
+    save(progress) is called whenever the status or checkpoint changes, so the
+    backend can persist it and a restarted process can resume the launch.
+    """
+
+    def __init__(self, campaign_id, params=None, save=None, status=SCHEDULED, processed=0,
+                 targeted=0, checkpoint=None, started_at=None, finished_at=None, delivered=0, failed=0):
+        self.campaign_id = campaign_id
+        self.params = params or {}
+        self.save = save
+        self.status = status
+        self.processed = processed
+        self.targeted = targeted
+        self.checkpoint = checkpoint
+        self.delivered = delivered  # messages sent to targeted users
+        self.failed = failed        # messages SNS would not take, after retries
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self._lock = threading.Lock()
+
+    def _saved(self):
+        if self.save:
+            self.save(self)
+
+    def start(self):
+        with self._lock:
+            self.status = TARGETING
+            if self.started_at is None:
+                self.started_at = time.time()
+        self._saved()
+
+    def advance(self, processed, targeted, checkpoint, delivered=0, failed=0):
+        """Record a finished chunk; checkpoint is where to resume after it."""
+        with self._lock:
+            self.processed += processed
+            self.targeted += targeted
+            self.delivered += delivered
+            self.failed += failed
+            self.checkpoint = checkpoint
+        self._saved()
+
+    def touch(self):
+        """Save unchanged progress, to show the launch is still running."""
+        self._saved()
+
+    def finish(self, status):
+        with self._lock:
+            self.status = status
+            self.finished_at = time.time()
+        self._saved()
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self):
+        return {
+            "campaign_id": self.campaign_id,
+            "status": self.status,
+            "processed": self.processed,
+            "targeted": self.targeted,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "elapsed": round(self.elapsed(), 3)
+        }
+
+
+class LaunchJobRunner:
+    """Runs campaign launch jobs on a worker pool, off the request thread.
+
+    A job is a callable taking the LaunchProgress; it processes users in
+    chunks and calls progress.advance() after each one.
+    """
+
+    def __init__(self, workers=2):
+        self.jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="launch")
+        self._lock = threading.Lock()
+
+    def submit(self, progress, job):
+        with self._lock:
+            current = self.jobs.get(progress.campaign_id)
+            if current is not None and current.status in (SCHEDULED, TARGETING):
+                return current
+            self.jobs[progress.campaign_id] = progress
+        self._executor.submit(self._run, progress, job)
+        return progress
+
+    def _run(self, progress, job):
+        progress.start()
+        try:
+            job(progress)
+        except Exception as e:
+            events.error("launch_failed", campaign_id=progress.campaign_id, error=str(e))
+            progress.finish(FAILED)
+        else:
+            progress.finish(DELIVERED)
+
+    def get(self, campaign_id):
+        return self.jobs.get(campaign_id)
+
+    def running(self, campaign_id):
+        progress = self.jobs.get(campaign_id)
+        return progress is not None and progress.status in (SCHEDULED, TARGETING)
@@ -0,0 +1,296 @@
+import bisect
+import collections
+import threading
+import time
+
+
+# Latency histogram upper bounds, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {values[-1]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Read at scrape time from stats the app already keeps.
+
+    fn() returns a number or {label values tuple: number}; kind is the
+    Prometheus type (gauge, or counter for running totals).
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, CallbackMetric):
+                return existing  # registered twice: keep counting into the same series
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, labelnames=(), kind="gauge"):
+        return self._add(CallbackMetric(name, help, fn, labelnames, kind))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "endpoint", "status"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "endpoint"))
+HTTP_EXCEPTIONS = REGISTRY.counter(
+    "http_request_exceptions_total", "Requests that raised, by route and exception", ("endpoint", "exception"))
+
+BACKEND_CALLS = REGISTRY.counter(
+    "backend_calls_total", "Calls to AWS (or stand-in) services", ("service", "table", "operation"))
+BACKEND_SECONDS = REGISTRY.histogram(
+    "backend_call_duration_seconds", "Backend call latency", ("service", "table", "operation"))
+BACKEND_ERRORS = REGISTRY.counter(
+    "backend_call_errors_total", "Backend calls that raised, by error code", ("service", "table", "operation", "error"))
+
+MODEL_CALLS = REGISTRY.counter("model_predict_total", "Model predict calls", ("method",))
+MODEL_ROWS = REGISTRY.counter("model_predict_rows_total", "Rows scored by the model", ("method",))
+MODEL_SECONDS = REGISTRY.histogram("model_predict_duration_seconds", "Model predict latency", ("method",))
+MODEL_ERRORS = REGISTRY.counter("model_predict_errors_total", "Model predict calls that raised", ("method", "error"))
+
+
+def error_code(e):
+    # botocore ClientError carries the service's code (e.g. ConditionalCheckFailedException)
+    response = getattr(e, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code") or type(e).__name__
+    return type(e).__name__
+
+
+def timed_call(service, table, operation, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        BACKEND_ERRORS.inc(service=service, table=table, operation=operation, error=error_code(e))
+        raise
+    finally:
+        BACKEND_CALLS.inc(service=service, table=table, operation=operation)
+        BACKEND_SECONDS.observe(time.perf_counter() - start, service=service, table=table, operation=operation)
+
+
+class InstrumentedClient:
+    """Proxy that times every public method call of a boto3 client or Table."""
+
+    def __init__(self, target, service, table=""):
+        self._target = target
+        self._service = service
+        self._table = table
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return timed_call(self._service, self._table, name, attr, *args, **kwargs)
+        return call
+
+
+class InstrumentedTable(InstrumentedClient):
+    def __init__(self, table):
+        super().__init__(table, "dynamodb", table.name)
+
+    def batch_writer(self, **kwargs):
+        return _InstrumentedBatchWriter(self._target.batch_writer(**kwargs), self._table)
+
+
+class _InstrumentedBatchWriter:
+    # boto3 sends BatchWriteItem from inside the writer, so the whole `with`
+    # block is timed as one batch_writer call
+    def __init__(self, writer, table):
+        self._writer = writer
+        self._table = table
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._writer.__enter__()
+        return self._writer
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return self._writer.__exit__(exc_type, exc, tb)
+        except Exception as e:
+            exc = e
+            raise
+        finally:
+            if exc is not None:
+                BACKEND_ERRORS.inc(service="dynamodb", table=self._table, operation="batch_writer",
+                                   error=error_code(exc))
+            BACKEND_CALLS.inc(service="dynamodb", table=self._table, operation="batch_writer")
+            BACKEND_SECONDS.observe(time.perf_counter() - self._start, service="dynamodb", table=self._table,
+                                    operation="batch_writer")
+
+
+class InstrumentedDynamoDB(InstrumentedClient):
+    """boto3 DynamoDB resource whose Table()s and batch calls are timed."""
+
+    def __init__(self, resource):
+        super().__init__(resource, "dynamodb")
+
+    def Table(self, name):
+        return InstrumentedTable(self._target.Table(name))
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        table = ",".join(sorted(RequestItems))
+        return timed_call("dynamodb", table, "batch_get_item", self._target.batch_get_item,
+                          RequestItems=RequestItems, **kwargs)
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        # Transactions are a client call; the resource has no method for them
+        table = ",".join(sorted({request['TableName'] for item in TransactItems for request in item.values()}))
+        return timed_call("dynamodb", table, "transact_write_items", self._target.meta.client.transact_write_items,
+                          TransactItems=TransactItems, **kwargs)
+
+
+class InstrumentedModel:
+    """Times predict()/predict_split() of a model; everything else passes through."""
+
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, name):
+        attr = getattr(self._model, name)
+        if name == "predict_split":
+            return lambda keys, X: self._timed("predict_split", lambda X: attr(keys, X), X)
+        return attr
+
+    def _timed(self, method, fn, X, *args):
+        start = time.perf_counter()
+        try:
+            return fn(X, *args)
+        except Exception as e:
+            MODEL_ERRORS.inc(method=method, error=type(e).__name__)
+            raise
+        finally:
+            MODEL_CALLS.inc(method=method)
+            MODEL_ROWS.inc(len(X), method=method)
+            MODEL_SECONDS.observe(time.perf_counter() - start, method=method)
+
+    def predict(self, X, *args):
+        return self._timed("predict", self._model.predict, X, *args)
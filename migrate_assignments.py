@@ -0,0 +1,55 @@
+"""Convert list-shaped UserCampaigns items into per-(user, campaign) assignment items.
+
+Every {'user_id', 'campaign_ids': [...]} item in UserCampaigns becomes one
+CampaignAssignments item per campaign id. List order is kept: later ids get
+later assigned_at timestamps, all just before the migration time.
+
+    python migrate_assignments.py [--region us-east-1] [--delete-old]
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import boto3
+
+from assignments import ASSIGNMENTS_TABLE, assignment_item
+from dynamo_scan import scan_pages
+
+
+def migrate(user_campaigns_table, assignments_table, delete_old=False, now=None):
+    """Returns (users migrated, assignment items written)."""
+    now = now or datetime.now(timezone.utc)
+    users = written = 0
+    with assignments_table.batch_writer(overwrite_by_pkeys=['user_id', 'assigned_key']) as batch:
+        for page in scan_pages(user_campaigns_table):
+            for item in page:
+                campaign_ids = list(dict.fromkeys(item.get('campaign_ids', [])))
+                for i, campaign_id in enumerate(campaign_ids):
+                    assigned_at = (now - timedelta(milliseconds=len(campaign_ids) - i)).isoformat(timespec='microseconds')
+                    batch.put_item(Item=assignment_item(item['user_id'], campaign_id, assigned_at))
+                users += 1
+                written += len(campaign_ids)
+
+    # Only drop the old items once every new one has been flushed
+    if delete_old:
+        with user_campaigns_table.batch_writer() as batch:
+            for page in scan_pages(user_campaigns_table, ProjectionExpression="user_id"):
+                for item in page:
+                    batch.delete_item(Key={'user_id': item['user_id']})
+    return users, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--source', default='UserCampaigns')
+    parser.add_argument('--target', default=ASSIGNMENTS_TABLE)
+    parser.add_argument('--delete-old', action='store_true', help="delete the UserCampaigns items afterwards")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    users, written = migrate(dynamodb.Table(args.source), dynamodb.Table(args.target), args.delete_old)
+    print(f"Migrated {users} users into {written} assignment items")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Backfill last_seen on UserActivity items written before recency aging.
+
+The nightly aging pass only ages users with a last_seen, so run this once
+to date everyone else's last visit from their last_open_days. Users never
+seen stay without one. Items a visit gives a last_seen in the meantime are
+left alone.
+
+    python migrate_last_seen.py [--region us-east-1]
+"""
+import argparse
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+from activity_aging import seen_at
+from dynamo_batch import with_retries
+from dynamo_scan import parallel_scan
+
+
+def backfill(activity_table, now):
+    """Returns (items given a last_seen, items left without one)."""
+    added, never_seen = 0, 0
+    for page in parallel_scan(activity_table, ProjectionExpression="user_id, last_open_days",
+                              FilterExpression="attribute_not_exists(last_seen)"):
+        for item in page:
+            last_seen = seen_at(item, now)
+            if last_seen is None:
+                never_seen += 1
+                continue
+            try:
+                with_retries(lambda: activity_table.update_item(
+                    Key={'user_id': item['user_id']},
+                    UpdateExpression="SET last_seen = :s",
+                    ConditionExpression="attribute_not_exists(last_seen)",
+                    ExpressionAttributeValues={':s': int(last_seen)}
+                ))
+                added += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+    return added, never_seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    added, never_seen = backfill(dynamodb.Table('UserActivity'), time.time())
+    print(f"Set last_seen on {added} users ({never_seen} never seen, left without one)")
+
+
+if __name__ == '__main__':
+    main()
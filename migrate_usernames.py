@@ -0,0 +1,49 @@
+"""Backfill the Usernames table (username -> user_id) from existing Users items.
+
+Signup and login look users up through Usernames, so run this once for
+users created before the table existed. Usernames that are already claimed
+are left alone and reported.
+
+    python migrate_usernames.py [--region us-east-1]
+"""
+import argparse
+
+import boto3
+from botocore.exceptions import ClientError
+
+from dynamo_scan import scan_pages
+
+
+def backfill(users_table, usernames_table):
+    """Returns (usernames added, usernames already taken by another user_id)."""
+    added, conflicts = 0, []
+    for page in scan_pages(users_table, ProjectionExpression="user_id, username"):
+        for user in page:
+            try:
+                usernames_table.put_item(
+                    Item={'username': user['username'], 'user_id': user['user_id']},
+                    ConditionExpression="attribute_not_exists(username) OR user_id = :id",
+                    ExpressionAttributeValues={':id': user['user_id']}
+                )
+                added += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                conflicts.append(user['username'])
+    return added, conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    added, conflicts = backfill(dynamodb.Table('Users'), dynamodb.Table('Usernames'))
+    print(f"Indexed {added} usernames")
+    for username in conflicts:
+        print(f"Duplicate username left out of the index: {username}")
+
+
+if __name__ == '__main__':
+    main()
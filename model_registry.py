@@ -0,0 +1,193 @@
+import collections
+import hashlib
+import os
+import pickle
+import threading
+import time
+import zlib
+
+from event_log import events
+from scoring import compile_model
+
+
+# Model versions kept in memory (the active one plus older ones for A/B or rollback)
+KEEP_VERSIONS = 2
+
+
+class ModelVersion:
+    def __init__(self, version, model, path, loaded_at):
+        self.version = version
+        self.model = model
+        self.path = path
+        self.loaded_at = loaded_at
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+
+class ModelRegistry:
+    """Lazily loaded, hot-swappable campaign model.
+
+    Nothing is unpickled until the first current() call, so a worker can
+    serve pages that don't score before sklearn is even imported. After
+    that the file is re-stat'ed at most every check_interval seconds; when
+    its mtime/size change and its sha256 differs, the new model is loaded
+    and swapped in with one assignment. Callers that already hold the old
+    ModelVersion keep using it until they finish.
+
+    The last `keep` versions stay loaded. set_split({version: weight}) sends
+    a deterministic share of keys to each version through choose(key).
+    """
+
+    def __init__(self, path, keep=KEEP_VERSIONS, check_interval=1.0):
+        self.path = path
+        self.keep = keep
+        self.check_interval = check_interval
+        self.versions = collections.OrderedDict()
+        self.split = None
+        self.reloads = 0
+        self.load_seconds = 0.0
+        self._current = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The active ModelVersion, loading or reloading the file if needed."""
+        now = time.monotonic()
+        if self._current is None or now - self._checked_at >= self.check_interval:
+            self._refresh(now)
+        return self._current
+
+    def _refresh(self, now):
+        swapped = None
+        with self._lock:
+            if self._current is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if signature == self._signature:
+                    return
+                with open(self.path, "rb") as f:
+                    data = f.read()
+                version = hashlib.sha256(data).hexdigest()[:12]
+                self._signature = signature
+                if self._current is not None and version == self._current.version:
+                    return  # touched, not changed
+                swapped = self.versions.get(version)  # rolled back to a kept version
+                if swapped is None:
+                    start = time.perf_counter()
+                    model = compile_model(pickle.loads(data))
+                    self.load_seconds = time.perf_counter() - start
+                    swapped = ModelVersion(version, model, self.path, time.time())
+            except Exception as e:
+                if self._current is None:
+                    raise
+                # Half-written file or bad pickle: keep serving the current model
+                events.error("model_reload_failed", path=self.path, error=str(e))
+                self._signature = None
+                return
+            self.versions[version] = swapped
+            self.versions.move_to_end(version)
+            while len(self.versions) > self.keep:
+                self.versions.popitem(last=False)
+            first_load = self._current is None
+            if not first_load:
+                self.reloads += 1
+            self._current = swapped
+            if self.split:
+                self.split = {v: w for v, w in self.split.items() if v in self.versions} or None
+
+        if first_load:
+            return
+        for listener in self._listeners:
+            try:
+                listener(swapped)
+            except Exception as e:
+                events.error("model_swap_listener_failed", version=swapped.version, error=str(e))
+
+    def on_swap(self, listener):
+        """Call listener(model_version) whenever a reloaded version becomes active."""
+        self._listeners.append(listener)
+
+    def get(self, version):
+        return self.versions.get(version)
+
+    def set_split(self, weights):
+        """Route keys between kept versions by weight, e.g. {"a1b2...": 90, "c3d4...": 10}; None for all-current."""
+        if weights:
+            unknown = [v for v in weights if v not in self.versions]
+            if unknown:
+                raise KeyError(f"Unknown model versions: {unknown}")
+        self.split = dict(weights) if weights else None
+
+    def choose(self, key):
+        """The ModelVersion that scores this key (e.g. a user id) under the current split."""
+        current = self.current()
+        split = self.split
+        if not split:
+            return current
+        point = zlib.crc32(str(key).encode()) % sum(split.values())
+        for version, weight in split.items():
+            if point < weight:
+                return self.versions.get(version, current)
+            point -= weight
+        return current
+
+    def stats(self):
+        current = self._current
+        return {
+            "loaded": current is not None,
+            "version": current.version if current else None,
+            "versions": list(self.versions),
+            "split": self.split,
+            "reloads": self.reloads,
+            "load_ms": round(self.load_seconds * 1000, 1)
+        }
+
+
+class BackgroundRescore:
+    """A swap listener that runs rescore() on a daemon thread and returns at once.
+
+    The swap is noticed by whichever request called current(), so a full
+    re-placement of every user must not run on it. One pass runs at a time;
+    swaps that land during a pass are folded into a single pass after it.
+    """
+
+    def __init__(self, rescore):
+        self.rescore = rescore
+        self.runs = 0
+        self.errors = 0
+        self.running = False
+        self._pending = None  # the newest version not rescored for yet
+        self._lock = threading.Lock()
+
+    def __call__(self, model_version):
+        with self._lock:
+            self._pending = model_version
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self._run, name="model-rescore", daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                version, self._pending = self._pending, None
+                if version is None:
+                    self.running = False
+                    return
+            started = time.perf_counter()
+            try:
+                self.rescore()
+                self.runs += 1
+                events.info("model_rescored", version=version.version, seconds=round(time.perf_counter() - started, 3))
+            except Exception as e:
+                self.errors += 1
+                events.error("model_rescore_failed", version=version.version, error=str(e))
+
+    def stats(self):
+        return {"running": self.running, "runs": self.runs, "errors": self.errors}
@@ -0,0 +1,185 @@
+import atexit
+import collections
+import threading
+import time
+
+from dynamo_batch import backoff
+from event_log import events
+
+
+# SNS PublishBatch accepts at most 10 entries
+PUBLISH_BATCH_SIZE = 10
+
+# What send() does when the queue is full
+DROP_NEWEST = "drop_newest"   # reject the new message
+DROP_OLDEST = "drop_oldest"   # evict the oldest queued message
+BLOCK = "block"               # wait up to block_timeout for room, then reject
+
+
+class PublishResult:
+    def __init__(self):
+        self.sent = []    # entry Ids
+        self.failed = []  # entry Ids, after retries or with a sender fault
+        self.retries = 0
+        self.calls = 0
+
+
+def publish_with_retries(client, topic_arn, entries, max_retries=5):
+    """publish_batch up to 10 entries, retrying failed ones with jittered exponential backoff.
+
+    Only entries that failed are sent again, so a retry never repeats a
+    message SNS already accepted. Returns a PublishResult.
+    """
+    result = PublishResult()
+    pending = {entry['Id']: entry for entry in entries}
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.publish_batch(TopicArn=topic_arn, PublishBatchRequestEntries=list(pending.values()))
+            result.calls += 1
+        except Exception as e:
+            events.error("sns_publish_failed", entries=len(pending), error=str(e))
+            response = {'Failed': [{'Id': id_, 'SenderFault': False} for id_ in pending]}
+
+        for ok in response.get('Successful', []):
+            pending.pop(ok['Id'])
+            result.sent.append(ok['Id'])
+        # Sender faults (bad input) will never succeed, so only retry the rest
+        retry = {}
+        for failure in response.get('Failed', []):
+            entry = pending.pop(failure['Id'])
+            if failure.get('SenderFault'):
+                result.failed.append(failure['Id'])
+            else:
+                retry[failure['Id']] = entry
+        pending = retry
+        if not pending:
+            break
+        if attempt < max_retries:
+            result.retries += 1
+            backoff(attempt)
+    result.failed.extend(pending)
+    return result
+
+
+class NotificationDispatcher:
+    """Bounded background queue that delivers SNS notifications with publish_batch.
+
+    Request handlers only call send(), which enqueues and returns. Worker
+    threads group up to 10 queued messages per publish_batch call and retry
+    failed entries with jittered exponential backoff.
+    """
+
+    def __init__(self, client, topic_arn, workers=2, max_queue=10000, overflow=DROP_OLDEST,
+                 max_retries=5, batch_wait=0.05, block_timeout=1.0):
+        self.client = client
+        self.topic_arn = topic_arn
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.max_retries = max_retries
+        self.batch_wait = batch_wait
+        self.block_timeout = block_timeout
+
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self.batches = 0
+        self._latencies = collections.deque(maxlen=1000)
+        # Workers finish batches concurrently; enqueued/dropped are kept under _cond
+        self._stats_lock = threading.Lock()
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._threads = []
+
+    def send(self, subject, message):
+        """Queue a notification. Returns False if it was dropped."""
+        entry = (time.monotonic(), subject, message)
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                if self.overflow == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.overflow == BLOCK and self._cond.wait_for(
+                        lambda: len(self._queue) < self.max_queue, self.block_timeout):
+                    pass
+                else:
+                    self.dropped += 1
+                    return False
+            self._queue.append(entry)
+            self.enqueued += 1
+            self._cond.notify()
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"sns-dispatch-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.stop)
+
+    def _next_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._stopped)
+            if not self._queue:
+                return []
+            # Give a burst a moment to fill the batch
+            if len(self._queue) < PUBLISH_BATCH_SIZE and not self._stopped:
+                self._cond.wait_for(lambda: len(self._queue) >= PUBLISH_BATCH_SIZE or self._stopped,
+                                    self.batch_wait)
+            batch = [self._queue.popleft() for _ in range(min(PUBLISH_BATCH_SIZE, len(self._queue)))]
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self._publish(batch)
+
+    def _publish(self, batch):
+        entries = [{'Id': str(i), 'Subject': subject, 'Message': message}
+                   for i, (_, subject, message) in enumerate(batch)]
+        result = publish_with_retries(self.client, self.topic_arn, entries, self.max_retries)
+        now = time.monotonic()
+        with self._stats_lock:
+            for id_ in result.sent:
+                self._latencies.append(now - batch[int(id_)][0])
+            self.sent += len(result.sent)
+            self.failed += len(result.failed)
+            self.retries += result.retries
+            self.batches += result.calls
+
+    def stop(self, timeout=10.0):
+        """Stop accepting work once the queue is drained and wait for the workers."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+        return {
+            "queue_depth": len(self._queue),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "batches": self.batches,
+            "latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            "latency_max_ms": latencies[-1] * 1000 if latencies else 0.0
+        }
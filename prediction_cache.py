@@ -0,0 +1,166 @@
+import collections
+import threading
+
+import numpy as np
+
+from cache import TTLCache
+from model_registry import ModelRegistry
+from scoring import FEATURES
+
+
+# Distinct feature tuples kept in the prediction cache
+PREDICTION_CACHE_SIZE = 100000
+
+# Bigger predict() calls skip the cache: hashing rows in Python costs more
+# than the vectorized model does per row
+CACHE_MAX_BATCH = 64
+
+# Columns that may be bucketed: past some value the model output stops changing
+BUCKET_COLUMNS = ("last_open_days", "total_visits")
+
+# Stand-in for "arbitrarily large" when looking for where the output saturates
+SATURATION_LIMIT = 10 ** 9
+
+
+def saturation_caps(model, rows, columns=BUCKET_COLUMNS, search_max=100000):
+    """Find, per column, the smallest cap above which predictions stop changing.
+
+    For a linear model each output class wins on one interval along a
+    feature, so if clipping a column at c gives the same prediction as an
+    arbitrarily large value, every value in between does too. That only
+    holds for the other feature values it was checked with: caps are checked
+    against the reference rows (e.g. the training data), also with the other
+    bucketed columns pushed to large values, so treat bucketing as a close
+    approximation rather than exact. Columns that do not saturate below
+    search_max are left out.
+    """
+    rows = np.unique(np.asarray(rows, dtype=np.float64), axis=0)
+    cols = [FEATURES.index(name) for name in columns]
+    probes = [rows]
+    for col in cols:
+        far = rows.copy()
+        far[:, col] = SATURATION_LIMIT
+        probes.append(far)
+    probes = np.vstack(probes)
+
+    caps = {}
+    for name, col in zip(columns, cols):
+        far = probes.copy()
+        far[:, col] = SATURATION_LIMIT
+        expected = model.predict(far)
+
+        def saturated(cap):
+            clipped = probes.copy()
+            clipped[:, col] = cap
+            return bool((model.predict(clipped) == expected).all())
+
+        if not saturated(search_max):
+            continue
+        lo, hi = int(rows[:, col].min()), search_max
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if saturated(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        caps[name] = lo
+    return caps
+
+
+class CachedModel:
+    """model.predict() through a bounded LRU keyed on the feature tuple.
+
+    Activity counters are small integers, so many users share a feature
+    tuple (every new user is (0, 0, 0, 0, 1)). Each predict() call looks up
+    its distinct rows and scores only the unseen ones, in one batch. Calls
+    with more than max_batch rows go straight to the model.
+
+    With bucket_rows (reference feature rows), last_open_days/total_visits
+    are clipped at the value where the model output saturates, so e.g.
+    every user with 5000+ visits shares one key.
+
+    The model comes from a ModelRegistry (or a path to make one). Keys carry
+    the model version, so a swapped-in model never sees the old one's results.
+    """
+
+    def __init__(self, registry, maxsize=PREDICTION_CACHE_SIZE, bucket_rows=None, max_batch=CACHE_MAX_BATCH):
+        if isinstance(registry, str):
+            registry = ModelRegistry(registry)
+        self.registry = registry
+        self.bucket_rows = bucket_rows
+        self.max_batch = max_batch
+        self.cache = TTLCache(maxsize=maxsize, ttl=float("inf"))
+        self.rows = 0
+        self.predicted = 0
+        self.bypassed = 0
+        self._caps = {}  # model version -> {column: cap}
+        self._lock = threading.Lock()
+
+    def caps_for(self, model_version):
+        caps = self._caps.get(model_version.version)
+        if caps is None:
+            with self._lock:
+                caps = self._caps.get(model_version.version)
+                if caps is None:
+                    caps = {}
+                    if self.bucket_rows is not None:
+                        caps = saturation_caps(model_version.model, self.bucket_rows)
+                    self._caps = {v: c for v, c in self._caps.items() if v in self.registry.versions}
+                    self._caps[model_version.version] = caps
+        return caps
+
+    def predict(self, X, version=None):
+        if version is None:
+            model_version = self.registry.current()
+        else:
+            model_version = self.registry.get(version)
+            if model_version is None:
+                raise KeyError(f"Model version {version} is not loaded")
+        model = model_version.model
+
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        for name, cap in self.caps_for(model_version).items():
+            col = FEATURES.index(name)
+            np.minimum(X[:, col], cap, out=X[:, col])
+        if self.max_batch is not None and len(X) > self.max_batch:
+            self.bypassed += len(X)
+            return model.predict(X)
+
+        keys = [(model_version.version,) + row for row in map(tuple, X.tolist())]
+
+        def fetch(missing):
+            self.predicted += len(missing)
+            predictions = model.predict(np.array([key[1:] for key in missing]))
+            return dict(zip(missing, map(tuple, predictions.tolist())))
+
+        found = self.cache.get_many(keys, fetch)
+        self.rows += len(X)
+        return np.array([found[key] for key in keys])
+
+    def predict_split(self, keys, X):
+        """Score each row with the version the registry's A/B split picks for its key (e.g. user id)."""
+        if not self.registry.split:
+            return self.predict(X)
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        groups = collections.defaultdict(list)
+        for i, key in enumerate(keys):
+            groups[self.registry.choose(key).version].append(i)
+        out = None
+        for version, rows in groups.items():
+            predictions = self.predict(X[rows], version)
+            if out is None:
+                out = np.empty((len(X), predictions.shape[1]), dtype=predictions.dtype)
+            out[rows] = predictions
+        return out
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats.update(
+            rows=self.rows,
+            rows_predicted=self.predicted,
+            rows_bypassed=self.bypassed,
+            row_hit_rate=1 - self.predicted / self.rows if self.rows else 0.0,
+            caps=self._caps,
+            model=self.registry.stats()
+        )
+        return stats
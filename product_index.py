@@ -0,0 +1,221 @@
+import collections
+import re
+import threading
+
+import numpy as np
+
+
+# Searchable words come from these fields; the list fields and category are
+# also indexed whole as facets ("tag:wireless"), which filters match exactly
+TEXT_FIELDS = ("name", "description", "category", "tags", "target_audience")
+FACET_FIELDS = {"category": "category", "tag": "tags", "audience": "target_audience"}
+
+SORTS = ("", "price", "-price")
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def words(text):
+    return WORD.findall(str(text).lower())
+
+
+def facet(name, value):
+    return f"{name}:{str(value).strip().lower()}"
+
+
+def product_tokens(product):
+    tokens = set()
+    for field in TEXT_FIELDS:
+        for value in as_list(product.get(field)):
+            tokens.update(words(value))
+    for name, field in FACET_FIELDS.items():
+        tokens.update(facet(name, value) for value in as_list(product.get(field)))
+    return tokens
+
+
+def product_price(product):
+    try:
+        return float(product.get("price"))
+    except (TypeError, ValueError):
+        return np.nan  # never matches a price filter
+
+
+def intersect(a, b):
+    """Sorted doc arrays -> the docs in both; a should be the shorter."""
+    if not len(a) or not len(b):
+        return a[:0]
+    positions = np.searchsorted(b, a)
+    positions[positions == len(b)] = 0
+    return a[b[positions] == a]
+
+
+class ProductIndex:
+    """In-memory inverted index over the product catalog.
+
+    Each product gets a small integer doc id; postings[token] is the set of
+    docs containing it. A search intersects the sorted-array form of each
+    posting list (built on first use, dropped when the token's docs change),
+    shortest first, so it costs about the size of the rarest term. Price
+    ranges go through a price-sorted doc array when there are no terms, and
+    are a vectorized mask over the matches otherwise.
+
+    update() and remove() only touch the tokens of the products they are
+    given, so a catalog change costs the size of the change.
+    """
+
+    def __init__(self):
+        self.postings = collections.defaultdict(set)
+        self._docs = {}        # product_id -> doc
+        self._product_ids = []  # doc -> product_id, None once removed
+        self._tokens = []       # doc -> its tokens
+        self._free = []
+        self._prices = np.full(0, np.nan)
+        self._arrays = {}       # token -> sorted int32 docs
+        self._by_price = None   # (live docs sorted by price, their prices)
+        self._live = None       # sorted int32 array of every live doc
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def update(self, products, removed=()):
+        """Index new or changed product dicts and drop removed product ids."""
+        with self._lock:
+            for product_id in removed:
+                self._remove(product_id)
+            for product in products:
+                self._index(product)
+
+    def remove(self, product_ids):
+        self.update((), product_ids)
+
+    def _index(self, product):
+        product_id = product["product_id"]
+        tokens = product_tokens(product)
+        doc = self._docs.get(product_id)
+        if doc is None:
+            doc = self._allocate(product_id)
+            old = set()
+        else:
+            old = self._tokens[doc]
+        for token in old - tokens:
+            self._discard(token, doc)
+        for token in tokens - old:
+            self.postings[token].add(doc)
+            self._arrays.pop(token, None)
+        self._tokens[doc] = tokens
+        price = product_price(product)
+        if not (self._prices[doc] == price or np.isnan(price) and np.isnan(self._prices[doc])):
+            self._prices[doc] = price
+            self._by_price = None
+
+    def _allocate(self, product_id):
+        if self._free:
+            doc = self._free.pop()
+            self._product_ids[doc] = product_id
+        else:
+            doc = len(self._product_ids)
+            self._product_ids.append(product_id)
+            self._tokens.append(set())
+            if doc >= len(self._prices):
+                grown = np.full(max(1024, 2 * len(self._prices)), np.nan)
+                grown[:len(self._prices)] = self._prices
+                self._prices = grown
+        self._docs[product_id] = doc
+        self._live = None
+        self._by_price = None
+        return doc
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        for token in self._tokens[doc]:
+            self._discard(token, doc)
+        self._tokens[doc] = set()
+        self._product_ids[doc] = None
+        self._prices[doc] = np.nan
+        self._free.append(doc)
+        self._by_price = None
+        self._live = None
+
+    def _discard(self, token, doc):
+        docs = self.postings[token]
+        docs.discard(doc)
+        if not docs:
+            del self.postings[token]
+        self._arrays.pop(token, None)
+
+    def _posting_array(self, token):
+        array = self._arrays.get(token)
+        if array is None:
+            docs = self.postings.get(token)
+            array = np.sort(np.fromiter(docs, np.int32, len(docs))) if docs else np.empty(0, np.int32)
+            self._arrays[token] = array
+        return array
+
+    def _price_order(self):
+        if self._by_price is None:
+            live = self._all_docs()
+            order = live[np.argsort(self._prices[live], kind="stable")]  # unpriced (NaN) last
+            self._by_price = (order, self._prices[order])
+        return self._by_price
+
+    def _all_docs(self):
+        if self._live is None:
+            self._live = np.fromiter(sorted(self._docs.values()), np.int32, len(self._docs))
+        return self._live
+
+    def search(self, q="", category=None, tag=None, audience=None, min_price=None, max_price=None,
+               sort="", limit=20, offset=0):
+        """(total matches, product ids of one page) for products matching every word of q and every filter."""
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {SORTS}")
+        terms = set(words(q or ""))
+        for name, value in (("category", category), ("tag", tag), ("audience", audience)):
+            if value:
+                terms.add(facet(name, value))
+        low = -np.inf if min_price is None else float(min_price)
+        high = np.inf if max_price is None else float(max_price)
+        priced = min_price is not None or max_price is not None
+
+        with self._lock:
+            if terms:
+                lists = sorted((self._posting_array(t) for t in terms), key=len)
+                docs = lists[0]
+                for other in lists[1:]:
+                    docs = intersect(docs, other)
+                if priced:
+                    prices = self._prices[docs]
+                    docs = docs[(prices >= low) & (prices <= high)]
+                if sort:
+                    prices = self._prices[docs]
+                    docs = docs[np.argsort(prices if sort == "price" else -prices, kind="stable")]
+            elif priced or sort:
+                order, prices = self._price_order()
+                if priced:
+                    docs = order[np.searchsorted(prices, low, "left"):np.searchsorted(prices, high, "right")]
+                else:
+                    docs = order
+                if not sort:
+                    docs = np.sort(docs)
+                elif sort == "-price":
+                    # Highest price first, still with the unpriced last
+                    priced_count = len(docs) - int(np.isnan(self._prices[docs]).sum())
+                    docs = np.concatenate([docs[:priced_count][::-1], docs[priced_count:]])
+            else:
+                docs = self._all_docs()
+            total = len(docs)
+            page = docs[offset:offset + limit].tolist()
+            return total, [self._product_ids[doc] for doc in page]
+
+    def stats(self):
+        return {"products": len(self._docs), "tokens": len(self.postings), "cached_lists": len(self._arrays)}
@@ -0,0 +1,29 @@
+# One item per purchase:
+#   user_id       partition key
+#   purchased_key sort key, "<purchased_at ISO timestamp>#<product_id>", so a
+#                 descending Query returns a user's newest purchases first
+PURCHASES_TABLE = 'Purchases'
+
+
+def purchase_key(product_id, purchased_at):
+    return f"{purchased_at}#{product_id}"
+
+
+def purchase_item(user_id, product_id, purchased_at):
+    return {
+        'user_id': user_id,
+        'purchased_key': purchase_key(product_id, purchased_at),
+        'product_id': product_id
+    }
+
+
+def recent_purchases(table, user_id, limit):
+    """A user's purchased product ids, newest first."""
+    response = table.query(
+        KeyConditionExpression="user_id = :u",
+        ExpressionAttributeValues={':u': user_id},
+        ProjectionExpression="product_id",
+        ScanIndexForward=False,
+        Limit=limit
+    )
+    return [item['product_id'] for item in response.get('Items', [])]
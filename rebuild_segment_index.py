@@ -0,0 +1,49 @@
+"""Score every UserActivity item and write its segment index attributes.
+
+Launches read their targets from the sparse `target_segment-index` GSI on
+UserActivity (hash key `target_segment`, string), which is only kept up to
+date as users' activity changes. Run this once after creating the GSI, and
+after a bulk import with --skip-scoring. The app runs the same pass in the
+background when its model registry swaps in a new model. Items whose
+attributes are already current are not rewritten.
+
+    python rebuild_segment_index.py [--region us-east-1] [--segments 4]
+"""
+import argparse
+import os
+
+import boto3
+
+from dynamo_scan import FEATURE_PROJECTION, SCAN_SEGMENTS, parallel_scan
+from scoring import load_model
+from segment_index import SEGMENT_SHARDS, refresh_segments
+
+# The model inputs plus what refresh_segments compares against
+INDEX_PROJECTION = FEATURE_PROJECTION + ", customer_profile, send_campaign, target_segment"
+
+
+def rebuild(activity_table, model, segments=SCAN_SEGMENTS, shards=SEGMENT_SHARDS):
+    """Returns (items scanned, items updated)."""
+    scanned, updated = 0, 0
+    for page in parallel_scan(activity_table, segments, ProjectionExpression=INDEX_PROJECTION):
+        scanned += len(page)
+        updated += refresh_segments(activity_table, model, page, shards)
+    return scanned, updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--segments', type=int, default=SCAN_SEGMENTS)
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('SEGMENT_SHARDS', SEGMENT_SHARDS)))
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        'campaign_model.pkl'))
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    scanned, updated = rebuild(dynamodb.Table('UserActivity'), load_model(args.model), args.segments, args.shards)
+    print(f"Scanned {scanned} users, updated {updated}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Precomputed product recommendations for the /home shelf.
+
+A background job (RecommendationJob) rebuilds, every REBUILD_INTERVAL:
+
+  neighbors[i]  the TOP_K products most like product i, scored by cosine
+                similarity of their tags, audiences and category plus
+                normalised co-purchase counts from the purchase history
+  segments[s]   the TOP_K products users in customer segment s buy most
+  popular       the TOP_K products by purchase count, for users with no
+                segment and to fill short lists
+
+all as small int32 arrays of product positions. /home then builds a shelf
+from the user's last few purchases and their segment: at most
+RECENT_PURCHASES * TOP_K + TOP_K candidates whatever the catalog size, so
+nothing is scored on the request path.
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+from event_log import events
+
+
+# Neighbours kept per product and products kept per segment
+TOP_K = 20
+
+# Products on the /home shelf
+SHELF_SIZE = 6
+
+# A user's newest purchases the shelf is built from
+RECENT_PURCHASES = 5
+
+# Seconds between rebuilds, and before retrying a failed one
+REBUILD_INTERVAL = 3600.0
+RETRY_INTERVAL = 60.0
+
+# A neighbour's score is CONTENT_WEIGHT * content cosine + co-purchase
+# cosine; the segment's top product adds SEGMENT_WEIGHT to a candidate (less
+# further down the list)
+CONTENT_WEIGHT = 0.25
+SEGMENT_WEIGHT = 0.5
+
+# Products whose neighbours are ranked per block, bounding the dense
+# (block x catalog) score matrix to about this many cells
+BLOCK_CELLS = 1 << 22
+
+# Users whose segments are read per storage call
+SEGMENT_BATCH = 1000
+
+
+def product_attributes(product):
+    attributes = {f"category:{str(product.get('category', '')).lower()}"}
+    for field in ("tags", "target_audience"):
+        values = product.get(field) or []
+        if isinstance(values, str):
+            values = [values]
+        attributes.update(f"{field}:{str(value).lower()}" for value in values)
+    return attributes
+
+
+def row_normalize(matrix):
+    """Scale each row of a sparse matrix to unit length."""
+    from scipy import sparse
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def top_k(scores, k):
+    """(indices, values) of the k largest entries per row, best first; -1 where a row has fewer positive ones."""
+    k = min(k, scores.shape[1])
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    best = np.take_along_axis(best, order, axis=1).astype(np.int32)
+    values = np.take_along_axis(values, order, axis=1).astype(np.float32)
+    best[values <= 0] = -1
+    return best, values
+
+
+def ranked(counts, tiebreak, k):
+    """Positions of the k largest counts (ties by tiebreak), only those above zero."""
+    order = np.lexsort((-tiebreak, -counts))[:k]
+    return order[counts[order] > 0].astype(np.int32)
+
+
+class Recommendations:
+    """One build: product ids plus the top-K arrays indexing into them."""
+
+    def __init__(self, product_ids, neighbors, scores, segments, popular, built_at=None):
+        self.product_ids = product_ids
+        self.positions = {product_id: i for i, product_id in enumerate(product_ids)}
+        self.neighbors = neighbors  # (n, TOP_K) int32, -1 padded
+        self.scores = scores        # (n, TOP_K) float32
+        self.segments = segments    # segment -> int32 positions, best first
+        self.popular = popular
+        self.built_at = built_at if built_at is not None else time.time()
+        self.version = f"{int(self.built_at * 1000):x}"
+
+    def shelf(self, purchased=(), segment=None, size=SHELF_SIZE):
+        """Product ids for a user, given their purchases newest first and their segment (or None)."""
+        owned = set()
+        scores = collections.defaultdict(float)
+        for product_id in purchased:
+            i = self.positions.get(product_id)
+            if i is None or i in owned:
+                continue
+            owned.add(i)
+            weight = 1 / len(owned)  # newer purchases count more
+            for j, score in zip(self.neighbors[i].tolist(), self.scores[i].tolist()):
+                if j < 0:
+                    break
+                scores[j] += weight * score
+        for rank, j in enumerate(self.segments.get(segment, self.popular).tolist()):
+            scores[j] += SEGMENT_WEIGHT / (rank + 1)
+
+        picks = [j for j in sorted(scores, key=scores.get, reverse=True) if j not in owned][:size]
+        for j in self.popular.tolist():
+            if len(picks) >= size:
+                break
+            if j not in owned and j not in picks:
+                picks.append(j)
+        return [self.product_ids[j] for j in picks]
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "products": len(self.product_ids),
+            "segments": {str(segment): len(top) for segment, top in self.segments.items()},
+            "built_at": self.built_at
+        }
+
+
+def build_recommendations(products, purchases, segments, k=TOP_K):
+    """Build Recommendations.
+
+    products: product dicts (with their purchases counter), purchases:
+    iterable of (user_id, product_id), segments: {user_id: customer_profile}.
+    """
+    # scipy is only loaded by the background build, not at app startup
+    from scipy import sparse
+
+    product_ids = [product["product_id"] for product in products]
+    positions = {product_id: i for i, product_id in enumerate(product_ids)}
+    n = len(product_ids)
+    if not n:
+        return Recommendations([], np.empty((0, k), np.int32), np.empty((0, k), np.float32), {},
+                               np.empty(0, np.int32))
+
+    # Products x attributes, one-hot, rows scaled so a product pair's dot product is their cosine
+    vocabulary = {}
+    rows, cols = [], []
+    for i, product in enumerate(products):
+        for attribute in product_attributes(product):
+            rows.append(i)
+            cols.append(vocabulary.setdefault(attribute, len(vocabulary)))
+    content = row_normalize(sparse.csr_matrix((np.ones(len(rows), np.float32), (rows, cols)),
+                                              shape=(n, len(vocabulary))))
+
+    # Users x products, 1 if the user ever bought it
+    users, user_rows, product_cols = {}, [], []
+    for user_id, product_id in purchases:
+        j = positions.get(product_id)
+        if j is not None:
+            user_rows.append(users.setdefault(user_id, len(users)))
+            product_cols.append(j)
+    bought = sparse.csr_matrix((np.ones(len(user_rows), np.float32), (user_rows, product_cols)),
+                               shape=(len(users), n))
+    bought.data[:] = 1  # duplicates were summed
+    # Co-purchase counts scaled like a cosine: count / sqrt(buyers of i * buyers of j)
+    buyers = row_normalize(bought.T.tocsr())
+
+    neighbors = np.full((n, k), -1, np.int32)
+    scores = np.zeros((n, k), np.float32)
+    block = max(1, BLOCK_CELLS // n)
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        # Attributes like audience are shared by much of the catalog, so this
+        # block is nearly dense: sparse x dense is much faster than sparse x sparse
+        block_scores = CONTENT_WEIGHT * np.ascontiguousarray((content @ content[start:stop].T.toarray()).T)
+        if len(users):
+            block_scores += (buyers[start:stop] @ buyers.T).toarray()
+        block_scores[np.arange(stop - start), np.arange(start, stop)] = 0  # not its own neighbour
+        best, values = top_k(block_scores, k)
+        neighbors[start:stop, :best.shape[1]] = best
+        scores[start:stop, :values.shape[1]] = values
+
+    # Purchase counts per segment from the history; overall popularity from
+    # the product counters, then the history, then catalog order
+    popularity = np.array([float(product.get("purchases", 0) or 0) for product in products])
+    user_segments = np.array([segments.get(user_id, -1) for user_id in users], dtype=np.int64)
+    by_segment = {}
+    for segment in set(segments.values()):
+        counts = np.asarray(bought[user_segments == segment].sum(axis=0)).ravel()
+        by_segment[segment] = ranked(counts, popularity, k)
+    history = np.asarray(bought.sum(axis=0)).ravel()
+    popular = np.lexsort((np.arange(n), -history, -popularity))[:k].astype(np.int32)
+    return Recommendations(product_ids, neighbors, scores, by_segment, popular)
+
+
+class RecommendationJob:
+    """Rebuilds Recommendations from the catalog and purchase history on a daemon thread.
+
+    The first build runs as soon as the job starts, then every interval
+    seconds; requests read `current`, None until the first build is done.
+    """
+
+    def __init__(self, backend, catalog, interval=REBUILD_INTERVAL, k=TOP_K):
+        self.backend = backend
+        self.catalog = catalog
+        self.interval = interval
+        self.k = k
+        self.current = None
+        self.runs = 0
+        self.errors = 0
+        self.last_run = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        started = time.perf_counter()
+        snapshot = self.catalog.current()
+        products = [dict(product, **self.catalog.counters.get(product_id, {}))
+                    for product_id, product in snapshot.products.items()]
+        purchases = [pair for page in self.backend.purchase_pages() for pair in page]
+        buyers = list(dict.fromkeys(user_id for user_id, _ in purchases))
+        segments = {}
+        for i in range(0, len(buyers), SEGMENT_BATCH):
+            segments.update(self.backend.get_segments(buyers[i:i + SEGMENT_BATCH]))
+        self.current = build_recommendations(products, purchases, segments, self.k)
+        self.runs += 1
+        self.last_run = {"products": len(products), "purchases": len(purchases), "buyers": len(buyers),
+                         "seconds": round(time.perf_counter() - started, 3)}
+        events.info("recommendations_built", **self.last_run)
+        return self.current
+
+    def shelf(self, purchased=(), segment=None, size=SHELF_SIZE):
+        current = self.current
+        return current.shelf(purchased, segment, size) if current is not None else []
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="recommendations", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            wait = self.interval
+            try:
+                self.run_once()
+            except Exception as e:
+                # Keep serving the last build
+                self.errors += 1
+                wait = min(self.interval, RETRY_INTERVAL)
+                events.error("recommendations_failed", error=str(e))
+            if self._stopped.wait(wait):
+                return
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        current = self.current
+        return {"interval": self.interval, "runs": self.runs, "errors": self.errors, "last_run": self.last_run,
+                "current": current.stats() if current is not None else None}
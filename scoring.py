@@ -0,0 +1,163 @@
+import csv
+import os
+import pickle
+
+import numpy as np
+
+
+# Column order the campaign model was trained on
+FEATURES = ("offers_opened", "offers_clicked", "purchases", "last_open_days", "total_visits")
+
+DEFAULT_ACTIVITY = {
+    "offers_opened": 0,
+    "offers_clicked": 0,
+    "purchases": 0,
+    "last_open_days": 999,
+    "total_visits": 1
+}
+
+# Training data the campaign model was fit on
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "campaign_dataset.csv")
+
+# Users scored per model.predict call
+CHUNK_SIZE = 50000
+
+TOTAL_VISITS_COL = FEATURES.index("total_visits")
+
+# Decision margins this close to a tie are re-checked with the sklearn estimator,
+# since the fused matmul can differ from sklearn's in the last few bits
+TIE_TOLERANCE = 1e-8
+
+
+class LinearCampaignModel:
+    """Pure NumPy predict() for a MultiOutputClassifier of LogisticRegression estimators.
+
+    All outputs are scored with one fused matrix multiply, then thresholded
+    (binary outputs) or argmax-ed (multiclass outputs) per output.
+    """
+
+    def __init__(self, model, tie_tolerance=TIE_TOLERANCE):
+        self.estimators = list(model.estimators_)
+        self.coef = np.ascontiguousarray(np.vstack([e.coef_ for e in self.estimators]), dtype=np.float64)
+        self.intercept = np.concatenate([e.intercept_ for e in self.estimators]).astype(np.float64)[:, None]
+        self.tie_tolerance = tie_tolerance
+
+        # (first score row, last score row, classes) per output
+        self.outputs = []
+        start = 0
+        for estimator in self.estimators:
+            stop = start + estimator.coef_.shape[0]
+            self.outputs.append((start, stop, estimator.classes_))
+            start = stop
+        self.dtype = np.result_type(*[classes.dtype for _, _, classes in self.outputs])
+
+    def decision_scores(self, X):
+        """Scores for every output class as one (n_classes_total, n) array."""
+        scores = self.coef @ X.T
+        scores += self.intercept
+        return scores
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        scores = self.decision_scores(X)
+
+        predictions = np.empty((X.shape[0], len(self.outputs)), dtype=self.dtype)
+        for j, (start, stop, classes) in enumerate(self.outputs):
+            if stop - start == 1:
+                indices = (scores[start] > 0).astype(np.intp)
+                margin = np.abs(scores[start])
+            else:
+                indices, margin = _argmax_with_margin(scores[start:stop])
+            predictions[:, j] = classes[indices]
+
+            near_tie = margin <= self.tie_tolerance
+            if near_tie.any():
+                predictions[near_tie, j] = self.estimators[j].predict(X[near_tie])
+        return predictions
+
+
+def _argmax_with_margin(scores):
+    """Column-wise argmax of a (k, n) array plus the gap to the runner-up.
+
+    Walks the k rows with elementwise max/min, which is much cheaper than
+    argmax/partition along the short axis. Ties keep the first class, like argmax.
+    """
+    best = scores[0].copy()
+    second = np.full_like(best, -np.inf)
+    indices = np.zeros(best.shape, dtype=np.intp)
+    for k in range(1, len(scores)):
+        row = scores[k]
+        np.maximum(second, np.minimum(row, best), out=second)
+        np.copyto(indices, k, where=row > best)
+        np.maximum(best, row, out=best)
+    return indices, best - second
+
+
+def compile_model(model):
+    """Return a LinearCampaignModel for supported models, else the model unchanged."""
+    estimators = getattr(model, "estimators_", None)
+    if estimators and all(type(e).__name__ == "LogisticRegression" for e in estimators):
+        return LinearCampaignModel(model)
+    return model
+
+
+def load_model(path):
+    with open(path, "rb") as f:
+        return compile_model(pickle.load(f))
+
+
+def load_dataset_features(path=DATASET_PATH):
+    """Feature rows from the campaign dataset as an (n, 5) int array."""
+    with open(path, newline="") as f:
+        rows = [[int(row[name]) for name in FEATURES] for row in csv.DictReader(f)]
+    return np.array(rows, dtype=np.int64)
+
+
+def build_feature_matrix(activities):
+    """Stack activity records into one (n, 5) float64 matrix in FEATURES order."""
+    rows = [[activity.get(f, DEFAULT_ACTIVITY[f]) for f in FEATURES] for activity in activities]
+    if not rows:
+        return np.empty((0, len(FEATURES)), dtype=np.float64)
+    return np.array(rows, dtype=np.float64)
+
+
+def eligible_mask(predictions, features):
+    """Users a launch to their predicted segment may reach: model says send or visited at least twice."""
+    return (predictions[:, 0] == 1) | (features[:, TOTAL_VISITS_COL] >= 2)
+
+
+def target_mask(predictions, features, selected_segment):
+    """Vectorized launch rule: right segment and eligible."""
+    return (predictions[:, 1] == selected_segment) & eligible_mask(predictions, features)
+
+
+def score_chunk(model, user_ids, activities, selected_segment):
+    """Score one chunk with a single predict call and return the targeted user ids."""
+    features = build_feature_matrix(activities)
+    if not len(features):
+        return []
+    predictions = model.predict(features)
+    mask = target_mask(predictions, features, selected_segment)
+    return [user_ids[i] for i in np.flatnonzero(mask)]
+
+
+def iter_chunks(items, chunk_size=CHUNK_SIZE):
+    """Group (user_id, activity) pairs into lists of at most chunk_size."""
+    user_ids, activities = [], []
+    for user_id, activity in items:
+        user_ids.append(user_id)
+        activities.append(activity)
+        if len(user_ids) >= chunk_size:
+            yield user_ids, activities
+            user_ids, activities = [], []
+    if user_ids:
+        yield user_ids, activities
+
+
+def select_targets(model, items, selected_segment, chunk_size=CHUNK_SIZE):
+    """Yield the user ids from (user_id, activity) pairs that a campaign should reach."""
+    for user_ids, activities in iter_chunks(items, chunk_size):
+        for user_id in score_chunk(model, user_ids, activities, selected_segment):
+            yield user_id
@@ -0,0 +1,173 @@
+import collections
+import threading
+import zlib
+from functools import partial
+
+from dynamo_scan import SEGMENT_DONE, parallel_pages, query_positions
+from scoring import build_feature_matrix, eligible_mask
+
+
+# Sparse GSI on UserActivity.target_segment. Only users a launch to their
+# predicted segment would reach carry the attribute, and its value is
+# "<segment>#<shard>" so one segment's users spread over SEGMENT_SHARDS partitions
+SEGMENT_INDEX = 'target_segment-index'
+SEGMENT_SHARDS = 8
+
+
+def predict_segments(model, activities, user_ids=None):
+    """Return (customer_profile, send_campaign, eligible) lists for activity records."""
+    return predict_feature_segments(model, build_feature_matrix(activities), user_ids)
+
+
+def predict_feature_segments(model, features, user_ids=None):
+    """Like predict_segments, for an (n, 5) feature matrix.
+
+    With user_ids, a model that supports it (CachedModel) scores each user
+    with the model version its A/B split assigns.
+    """
+    if not len(features):
+        return [], [], []
+    if user_ids is not None and hasattr(model, "predict_split"):
+        predictions = model.predict_split(user_ids, features)
+    else:
+        predictions = model.predict(features)
+    return predictions[:, 1].tolist(), predictions[:, 0].tolist(), eligible_mask(predictions, features).tolist()
+
+
+class SegmentIndex:
+    """In-memory segment -> user sets, kept current as users' activity changes.
+
+    targets[segment] holds exactly the users a launch to that segment would
+    assign, so a launch is a set lookup instead of a scoring pass.
+
+    Scoring runs outside the lock, so two updates for one user can finish
+    out of order. Callers that pass seq (taken before reading the features)
+    get last-read-wins: a placement from older features never replaces one
+    from newer features.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.members = collections.defaultdict(set)
+        self.targets = collections.defaultdict(set)
+        self.state = {}
+        self.placed_seq = {}  # user_id -> seq of the features behind its placement
+        self._lock = threading.Lock()
+
+    def update(self, user_id, activity):
+        self.update_many([user_id], [activity])
+
+    def update_many(self, user_ids, activities):
+        self.update_features(user_ids, build_feature_matrix(activities))
+
+    def update_features(self, user_ids, features, seq=None):
+        """Re-place users given their (n, 5) feature rows, e.g. from ActivityStore."""
+        profiles, sends, eligible = predict_feature_segments(self.model, features, user_ids)
+        with self._lock:
+            for user_id, profile, send, ok in zip(user_ids, profiles, sends, eligible):
+                if seq is not None:
+                    if self.placed_seq.get(user_id, -1) > seq:
+                        continue
+                    self.placed_seq[user_id] = seq
+                self._discard(user_id)
+                self.state[user_id] = (profile, send, ok)
+                self.members[profile].add(user_id)
+                if ok:
+                    self.targets[profile].add(user_id)
+
+    def remove(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+            self.placed_seq.pop(user_id, None)
+
+    def _discard(self, user_id):
+        old = self.state.pop(user_id, None)
+        if old is not None:
+            self.members[old[0]].discard(user_id)
+            self.targets[old[0]].discard(user_id)
+
+    def rebuild(self, items, chunk_size=50000):
+        with self._lock:
+            self.members.clear()
+            self.targets.clear()
+            self.state.clear()
+            self.placed_seq.clear()
+        items = list(items)
+        for i in range(0, len(items), chunk_size):
+            chunk = items[i:i + chunk_size]
+            self.update_many([user_id for user_id, _ in chunk], [activity for _, activity in chunk])
+
+    def profiles(self, user_ids):
+        """{user_id: customer_profile} for the placed users among user_ids."""
+        with self._lock:
+            return {user_id: self.state[user_id][0] for user_id in user_ids if user_id in self.state}
+
+    def segment_targets(self, segment):
+        with self._lock:
+            return list(self.targets[segment])
+
+    def sizes(self):
+        with self._lock:
+            return {segment: {"members": len(self.members[segment]), "targets": len(self.targets[segment])}
+                    for segment in self.members}
+
+
+# DynamoDB
+
+def shard_key(segment, user_id, shards=SEGMENT_SHARDS):
+    return f"{segment}#{zlib.crc32(str(user_id).encode()) % shards}"
+
+
+def segment_attributes(model, items, shards=SEGMENT_SHARDS):
+    """Return {user_id: (customer_profile, send_campaign, target_segment or None)} for activity items."""
+    profiles, sends, eligible = predict_segments(model, items, [item['user_id'] for item in items])
+    return {
+        item['user_id']: (profile, send, shard_key(profile, item['user_id'], shards) if ok else None)
+        for item, profile, send, ok in zip(items, profiles, sends, eligible)
+    }
+
+
+def refresh_segments(table, model, items, shards=SEGMENT_SHARDS):
+    """Re-score activity items and write back segment attributes that changed.
+
+    Returns the number of items updated.
+    """
+    writes = 0
+    for item, (profile, send, target) in zip(items, segment_attributes(model, items, shards).values()):
+        if (item.get('customer_profile'), item.get('send_campaign'), item.get('target_segment')) == (profile, send, target):
+            continue
+        values = {':p': profile, ':s': send}
+        update = "SET customer_profile = :p, send_campaign = :s"
+        if target is None:
+            update += " REMOVE target_segment"
+        else:
+            update += ", target_segment = :t"
+            values[':t'] = target
+        table.update_item(Key={'user_id': item['user_id']}, UpdateExpression=update,
+                          ExpressionAttributeValues=values)
+        writes += 1
+    return writes
+
+
+def segment_target_positions(table, segment, shards=SEGMENT_SHARDS, start_keys=None):
+    """Query every shard of a segment on the GSI in parallel.
+
+    Yields (shard, items, LastEvaluatedKey); start_keys maps str(shard) to
+    where to resume, or to SEGMENT_DONE to skip a finished shard.
+    """
+    start_keys = start_keys or {}
+
+    def shard_query(shard):
+        kwargs = {
+            'IndexName': SEGMENT_INDEX,
+            'KeyConditionExpression': "target_segment = :t",
+            'ExpressionAttributeValues': {':t': f"{segment}#{shard}"},
+            'ProjectionExpression': "user_id"
+        }
+        if start_keys.get(str(shard)):
+            kwargs['ExclusiveStartKey'] = start_keys[str(shard)]
+        for items, last_key in query_positions(table, **kwargs):
+            yield shard, items, last_key
+
+    todo = [shard for shard in range(shards) if start_keys.get(str(shard)) != SEGMENT_DONE]
+    yield from parallel_pages({shard: partial(shard_query, shard) for shard in todo})
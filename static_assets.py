@@ -0,0 +1,194 @@
+"""Content-hashed static assets: a build step and the template helpers that use it.
+
+The build resizes every product image in static/ into WebP variants sized
+for where the templates show them, copies the other static files (CSS), and
+names every output after a hash of its bytes, so a URL never changes
+content. static/build/manifest.json maps source names to the outputs.
+Responses for static/build/ are then cached by browsers for a year
+(immutable); a changed image or stylesheet gets a new name on the next build.
+
+    python static_assets.py            # after changing anything in static/
+
+Without a manifest (build not run) the helpers fall back to the original
+files, so the app still works, just with the full-size images. The build
+needs Pillow; serving does not.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+
+from flask import request, url_for
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BUILD_DIR = "build"
+MANIFEST = "manifest.json"
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Variant -> (CSS box it is shown in, as (width, height or None to keep the
+# aspect ratio), pixel densities to generate). Match static/style.css.
+VARIANTS = {
+    "thumb": ((140, 140), (1, 2)),   # .home-images .home-image, object-fit: cover
+    "detail": ((300, None), (1, 2))  # .product-image img
+}
+
+WEBP_QUALITY = 80
+
+# A year: the longest max-age caches honour
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def content_name(name, data, ext):
+    return f"{name}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def render_variant(image, box, density):
+    """Resize a PIL image to fill box at density; returns WebP bytes and the pixel width."""
+    from PIL import ImageOps
+
+    width, height = box[0] * density, box[1] * density if box[1] else None
+    if height:
+        resized = ImageOps.fit(image, (min(width, image.width), min(height, image.height)))
+    else:
+        resized = image.copy()
+        resized.thumbnail((width, image.height))
+    out = io.BytesIO()
+    resized.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+    return out.getvalue(), resized.width
+
+
+def build(static_dir=STATIC_DIR):
+    """Write static/build/ and its manifest; returns the manifest."""
+    from PIL import Image, ImageOps
+
+    build_dir = os.path.join(static_dir, BUILD_DIR)
+    os.makedirs(build_dir, exist_ok=True)
+    manifest = {"files": {}, "images": {}}
+    written = set()
+
+    def write(name, data):
+        with open(os.path.join(build_dir, name), "wb") as f:
+            f.write(data)
+        written.add(name)
+        return f"{BUILD_DIR}/{name}"
+
+    for filename in sorted(os.listdir(static_dir)):
+        path = os.path.join(static_dir, filename)
+        if not os.path.isfile(path):
+            continue
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            with open(path, "rb") as f:
+                data = f.read()
+            manifest["files"][filename] = write(content_name(stem, data, ext), data)
+            continue
+
+        with Image.open(path) as image:
+            # Phone photos are often stored sideways with an EXIF rotation tag
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            variants = {}
+            for variant, (box, densities) in VARIANTS.items():
+                candidates = {}
+                for density in densities:
+                    data, width = render_variant(image, box, density)
+                    # Small sources give the same pixels at every density; keep one
+                    candidates.setdefault(width, write(content_name(f"{stem}.{variant}", data, ".webp"), data))
+                variants[variant] = sorted(candidates.items())
+            manifest["images"][filename] = variants
+
+    for name in os.listdir(build_dir):
+        if name not in written and name != MANIFEST:
+            os.remove(os.path.join(build_dir, name))  # outputs of an older build
+    tmp = os.path.join(build_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(build_dir, MANIFEST))
+    return manifest
+
+
+class StaticAssets:
+    """Template helpers resolving static files through the build manifest.
+
+    The manifest is re-read when its mtime changes, so a build on a running
+    server takes effect without a restart.
+    """
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.manifest_path = os.path.join(static_dir, BUILD_DIR, MANIFEST)
+        self.manifest = {"files": {}, "images": {}}
+        self.digest = ""
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    manifest, digest = {"files": {}, "images": {}}, ""
+                    if mtime is not None:
+                        with open(self.manifest_path, "rb") as f:
+                            data = f.read()
+                        manifest, digest = json.loads(data), hashlib.sha256(data).hexdigest()[:10]
+                    self.manifest, self.digest, self._mtime = manifest, digest, mtime
+        return self.manifest
+
+    def version(self):
+        """Changes with every build; part of the ETag of any page linking assets."""
+        self._current()
+        return self.digest
+
+    def url(self, filename):
+        """url_for('static') for the hashed copy of filename, or the original if it wasn't built."""
+        return url_for("static", filename=self._current()["files"].get(filename, filename))
+
+    def image(self, filename, variant):
+        """{"src", "srcset", "width", "height"} for an <img> showing a variant of a static image."""
+        (width, height), _ = VARIANTS[variant]
+        candidates = self._current()["images"].get(filename, {}).get(variant)
+        if not candidates:
+            return {"src": url_for("static", filename=filename), "srcset": "", "width": width, "height": height}
+        return {
+            "src": url_for("static", filename=candidates[0][1]),
+            "srcset": ", ".join(f"{url_for('static', filename=path)} {w}w" for w, path in candidates),
+            "width": width,
+            "height": height
+        }
+
+    def cache_headers(self, response):
+        if (request.endpoint == "static" and response.status_code in (200, 304)
+                and (request.view_args or {}).get("filename", "").startswith(BUILD_DIR + "/")):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def init_app(self, app):
+        app.jinja_env.globals.update(static_url=self.url, static_image=self.image)
+        app.after_request(self.cache_headers)
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build content-hashed static assets and their manifest.")
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    args = parser.parse_args()
+    before = sum(os.path.getsize(os.path.join(args.static_dir, f)) for f in os.listdir(args.static_dir)
+                 if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+    manifest = build(args.static_dir)
+    build_dir = os.path.join(args.static_dir, BUILD_DIR)
+    for variant in VARIANTS:
+        size = sum(os.path.getsize(os.path.join(build_dir, os.path.basename(path)))
+                   for variants in manifest["images"].values() for _, path in variants[variant][:1])
+        print(f"{variant}: {len(manifest['images'])} images, {size / 1024:,.0f} KB at 1x "
+              f"(originals {before / 1024:,.0f} KB)")
+    print(f"Wrote {build_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Storage backends behind the Flask app.
+
+Every backend implements StorageBackend; the app only talks to that, so a
+performance fix to a route is made once. IDs are strings everywhere.
+
+    memory    dicts + ActivityStore + SegmentIndex in this process (default)
+    sqlite    one SQLite file in WAL mode, for single-node deployments
+    dynamodb  the DynamoDB tables (Users, Usernames, AdminUsers, Campaigns,
+              UserActivity, CampaignAssignments, Deliveries, Purchases,
+              Products)
+    state_server  a memory backend in a separate process, shared by several
+              app workers over a local socket
+"""
+
+
+class StorageBackend:
+    """What the app needs from storage.
+
+    Activity counters are the five model FEATURES. Backends keep each
+    user's segment placement current as counters change, so a launch only
+    reads segment_target_pages().
+    """
+
+    name = None
+
+    # Users and admins
+
+    def create_user(self, username, password):
+        """Create a user and their initial activity; None if the username is taken."""
+        raise NotImplementedError
+
+    def get_user_by_username(self, username):
+        raise NotImplementedError
+
+    def get_users(self, user_ids):
+        """Batch get: {user_id: user} for the ids that exist."""
+        raise NotImplementedError
+
+    def create_admin(self, username, password):
+        """False if the admin already exists."""
+        raise NotImplementedError
+
+    def get_admin(self, username):
+        raise NotImplementedError
+
+    # Activity
+
+    def get_activity(self, user_ids):
+        """Batch get: {user_id: {feature: value}}."""
+        raise NotImplementedError
+
+    def put_activity(self, activities):
+        """Batch put: {user_id: {feature: value}}, replacing existing counters.
+
+        last_seen is back-dated by last_open_days unless the activity has its own.
+        """
+        raise NotImplementedError
+
+    def increment_activity(self, user_id, seen=False, **deltas):
+        """Add deltas to a user's counters; seen=True also resets last_open_days and stamps last_seen."""
+        self.increment_activity_many({user_id: dict(deltas, seen=seen)})
+
+    def increment_activity_many(self, increments):
+        """Batch increment: {user_id: {'seen': bool, counter: delta, ...}}."""
+        raise NotImplementedError
+
+    def flush_activity(self):
+        """Make buffered increments (and the segment changes they cause) visible."""
+
+    def rescore_all(self):
+        """Re-place every user after a model change."""
+        raise NotImplementedError
+
+    def age_activity(self, now=None):
+        """Recompute last_open_days from last_seen as of now, re-placing users whose value changed.
+
+        Returns {"scanned": users read, "updated": users written, ...}.
+        """
+        raise NotImplementedError
+
+    def get_segments(self, user_ids):
+        """Batch get: {user_id: customer_profile} for users that have been placed."""
+        raise NotImplementedError
+
+    def segment_target_pages(self, segment, checkpoint=None):
+        """Yield (user_ids, checkpoint) pages of the users a launch to segment reaches.
+
+        Passing a yielded checkpoint back resumes after that page.
+        """
+        raise NotImplementedError
+
+    # Campaigns and assignments
+
+    def create_campaign(self, campaign):
+        """Store a new campaign dict and return it with its campaign_id."""
+        raise NotImplementedError
+
+    def get_campaigns(self, campaign_ids):
+        """Batch get: {campaign_id: campaign}."""
+        raise NotImplementedError
+
+    def list_campaigns(self):
+        raise NotImplementedError
+
+    def save_launch_progress(self, campaign_id, status, progress):
+        """Persist a launch's status and progress dict and stamp progress_updated_at."""
+        raise NotImplementedError
+
+    def claim_launch(self, campaign_id, seen, now):
+        """Set progress_updated_at to now only if it is still seen. Returns True if claimed."""
+        raise NotImplementedError
+
+    def expire_campaign(self, campaign_id):
+        """Set a campaign's status to Expired. True only for the call that changed it."""
+        raise NotImplementedError
+
+    def assign_campaign(self, user_ids, campaign_id, assigned_at):
+        """Batch put one assignment per user; replaying the same call is harmless."""
+        raise NotImplementedError
+
+    def prune_assignments(self, campaign_ids):
+        """Delete every assignment of these campaigns. Returns how many were deleted."""
+        raise NotImplementedError
+
+    def newest_assignments(self, user_id, limit, before=None):
+        """(campaign_ids newest first, key to pass as before for the next page or None)."""
+        raise NotImplementedError
+
+    def claim_deliveries(self, campaign_id, user_ids):
+        """Record that the campaign is being sent to these users; returns the ones not claimed before.
+
+        The delivery stage only sends to what this returns, so a replayed
+        page never notifies a user twice. Each user must be claimed
+        atomically: a launch resumed by another process can overlap one
+        that was still running, and only one of them may win a user.
+        """
+        raise NotImplementedError
+
+    # Purchases
+
+    def record_purchase(self, user_id, product_id, purchased_at):
+        """Add a purchase to the user's history; purchased_at is an ISO timestamp."""
+        raise NotImplementedError
+
+    def recent_purchases(self, user_id, limit):
+        """A user's purchased product ids, newest first."""
+        raise NotImplementedError
+
+    def purchase_pages(self):
+        """Yield pages of (user_id, product_id), one per recorded purchase, in no particular order."""
+        raise NotImplementedError
+
+    # Products
+
+    def list_products(self):
+        raise NotImplementedError
+
+    def get_product(self, product_id):
+        raise NotImplementedError
+
+    def put_products(self, products):
+        """Batch put product dicts (keyed by product_id)."""
+        raise NotImplementedError
+
+    def increment_product_purchases(self, product_id):
+        """False if the product does not exist."""
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+
+BACKENDS = ("memory", "sqlite", "dynamodb", "state_server")
+
+
+def create_backend(name, model, **config):
+    """Build a backend by name; config is passed to its constructor."""
+    if name == "memory":
+        from storage.memory import MemoryBackend
+        return MemoryBackend(model, **config)
+    if name == "sqlite":
+        from storage.sqlite import SQLiteBackend
+        return SQLiteBackend(model, **config)
+    if name == "dynamodb":
+        from storage.dynamodb import DynamoDBBackend
+        return DynamoDBBackend(model, **config)
+    if name == "state_server":
+        from storage.state_server import StateServerBackend
+        return StateServerBackend(model, **config)
+    raise ValueError(f"Unknown storage backend {name!r}; expected one of {', '.join(BACKENDS)}")
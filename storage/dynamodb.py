@@ -0,0 +1,385 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+from activity_aging import AGING_WORKERS, age_table, seen_at
+from activity_buffer import ActivityAggregator
+from assignments import ASSIGNMENTS_TABLE, newest_assignments, write_assignments
+from campaign_scheduler import EXPIRED
+from dynamo_batch import MAX_RETRIES, backoff, batch_get, with_retries
+from delivery import DELIVERIES_TABLE, delivery_key
+from dynamo_scan import SCAN_SEGMENTS, SEGMENT_DONE, parallel_scan, scan_pages
+from metrics import InstrumentedDynamoDB
+from purchases import PURCHASES_TABLE, purchase_item, recent_purchases
+from rebuild_segment_index import rebuild
+from scoring import FEATURES
+from segment_index import SEGMENT_SHARDS, refresh_segments, segment_attributes, segment_target_positions
+from storage import StorageBackend
+
+
+REGION = 'us-east-1'
+
+# Campaign ids per prune scan filter, well under DynamoDB's expression limits
+PRUNE_FILTER_IDS = 50
+
+# Concurrent conditional puts per claim_deliveries call
+CLAIM_WORKERS = 16
+
+
+def to_dynamo(value):
+    """Floats (anywhere in a dict/list) as the Decimals DynamoDB requires."""
+    if isinstance(value, float):
+        return Decimal(str(round(value, 3)))
+    if isinstance(value, dict):
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_dynamo(v) for v in value]
+    return value
+
+
+def _conditional_failed(e):
+    return e.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+def _cancellation_reasons(e):
+    # A cancelled transaction reports one reason per item, 'None' for the ones that were fine
+    return [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+
+
+_serialize = TypeSerializer().serialize
+
+
+def _put(table, item, condition):
+    """A TransactWriteItems Put; transactions go through the low-level client, so values are typed."""
+    return {'Put': {'TableName': table.name, 'Item': {name: _serialize(value) for name, value in item.items()},
+                    'ConditionExpression': condition}}
+
+
+class DynamoDBBackend(StorageBackend):
+    """The provisioned DynamoDB tables.
+
+    Activity increments go through a write-behind ActivityAggregator whose
+    flush re-scores the users it wrote and updates their target_segment
+    attribute, so a launch reads its targets from the sparse segment GSI,
+    `shards` queries in parallel.
+    """
+
+    name = "dynamodb"
+
+    def __init__(self, model, dynamodb=None, region=REGION, shards=SEGMENT_SHARDS,
+                 activity_max_pending=1000, activity_max_staleness=5.0,
+                 aging_segments=SCAN_SEGMENTS, aging_workers=AGING_WORKERS):
+        self.model = model
+        # Every table call is counted and timed for /metrics
+        self.dynamodb = InstrumentedDynamoDB(dynamodb or boto3.resource('dynamodb', region_name=region))
+        self.shards = shards
+        self.aging_segments = aging_segments
+        self.aging_workers = aging_workers
+        self.users_table = self.dynamodb.Table('Users')
+        self.usernames_table = self.dynamodb.Table('Usernames')  # username -> user_id, keeps usernames unique
+        self.admin_table = self.dynamodb.Table('AdminUsers')
+        self.campaigns_table = self.dynamodb.Table('Campaigns')
+        self.activity_table = self.dynamodb.Table('UserActivity')
+        self.assignments_table = self.dynamodb.Table(ASSIGNMENTS_TABLE)  # one item per (user, campaign)
+        self.deliveries_table = self.dynamodb.Table(DELIVERIES_TABLE)  # one item per (campaign, user) sent to
+        self.purchases_table = self.dynamodb.Table(PURCHASES_TABLE)  # one item per (user, purchase)
+        self.products_table = self.dynamodb.Table('Products')
+
+        # Counter increments are coalesced per user and written behind, at most
+        # activity_max_staleness seconds late (0 writes every increment through)
+        self.activity_buffer = ActivityAggregator(
+            self.activity_table,
+            max_pending=activity_max_pending,
+            max_staleness=activity_max_staleness,
+            on_flush=self.refresh_user_segments
+        )
+
+    def refresh_user_segments(self, items):
+        # Re-score users whose counters just changed so the segment GSI stays current
+        refresh_segments(self.activity_table, self.model, items, self.shards)
+
+    # Users and admins
+
+    def create_user(self, username, password):
+        user_id = str(uuid.uuid4())
+        user = {'user_id': user_id, 'username': username, 'password': password}
+        activity = self._activity_items({user_id: {'offers_opened': 0, 'offers_clicked': 0, 'purchases': 0,
+                                                   'last_open_days': 0, 'total_visits': 1}})[0]
+
+        # The username claim, the user and their activity are written together
+        # or not at all; the claim's condition fails if the name is taken
+        transaction = [
+            _put(self.usernames_table, {'username': username, 'user_id': user_id}, "attribute_not_exists(username)"),
+            _put(self.users_table, user, "attribute_not_exists(user_id)"),
+            _put(self.activity_table, activity, "attribute_not_exists(user_id)")
+        ]
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with_retries(lambda: self.dynamodb.transact_write_items(TransactItems=transaction))
+                return user
+            except ClientError as e:
+                reasons = _cancellation_reasons(e)
+                if reasons[:1] == ['ConditionalCheckFailed']:
+                    return None
+                # Another signup for the same name was mid-transaction
+                if 'TransactionConflict' not in reasons or attempt == MAX_RETRIES:
+                    raise
+                backoff(attempt)
+
+    def get_user_by_username(self, username):
+        res = self.usernames_table.get_item(Key={'username': username})
+        if 'Item' not in res:
+            return None
+        return self.users_table.get_item(Key={'user_id': res['Item']['user_id']}).get('Item')
+
+    def get_users(self, user_ids):
+        return batch_get(self.dynamodb, self.users_table.name, 'user_id', user_ids)
+
+    def create_admin(self, username, password):
+        try:
+            self.admin_table.put_item(Item={'username': username, 'password': password},
+                                      ConditionExpression="attribute_not_exists(username)")
+        except ClientError as e:
+            if _conditional_failed(e):
+                return False
+            raise
+        return True
+
+    def get_admin(self, username):
+        return self.admin_table.get_item(Key={'username': username}).get('Item')
+
+    # Activity
+
+    def get_activity(self, user_ids):
+        items = batch_get(self.dynamodb, self.activity_table.name, 'user_id', user_ids,
+                          projection=", ".join(('user_id',) + FEATURES))
+        return {user_id: {name: int(item[name]) for name in FEATURES if name in item}
+                for user_id, item in items.items()}
+
+    def put_activity(self, activities):
+        with self.activity_table.batch_writer(overwrite_by_pkeys=['user_id']) as batch:
+            for item in self._activity_items(activities):
+                batch.put_item(Item=item)
+
+    def _activity_items(self, activities):
+        # UserActivity items, with the users' place in the segment index
+        now = time.time()
+        items = []
+        for user_id, activity in activities.items():
+            item = dict(activity, user_id=user_id)
+            item.pop('last_seen', None)
+            last_seen = seen_at(activity, now)
+            if last_seen is not None:
+                item['last_seen'] = int(last_seen)
+            items.append(item)
+        placements = segment_attributes(self.model, items, self.shards)
+        for item in items:
+            profile, send, target = placements[item['user_id']]
+            item.update(customer_profile=profile, send_campaign=send)
+            if target is not None:
+                item['target_segment'] = target
+        return items
+
+    def increment_activity(self, user_id, seen=False, **deltas):
+        self.activity_buffer.add(user_id, seen=seen, **deltas)
+
+    def increment_activity_many(self, increments):
+        for user_id, entry in increments.items():
+            deltas = {name: delta for name, delta in entry.items() if name != 'seen'}
+            self.activity_buffer.add(user_id, seen=entry.get('seen', False), **deltas)
+
+    def flush_activity(self):
+        self.activity_buffer.flush()
+
+    def rescore_all(self):
+        # A parallel scan of the whole table, so the app only calls this from
+        # its BackgroundRescore thread. Every worker notices a swap and runs
+        # one; items already placed by the new model are read, not rewritten
+        scanned, updated = rebuild(self.activity_table, self.model, self.aging_segments, self.shards)
+        return updated
+
+    def age_activity(self, now=None):
+        # A full parallel scan; run it from one place (activity_aging.py), not every worker
+        return age_table(self.activity_table, self.model, time.time() if now is None else now,
+                         self.aging_segments, self.shards, self.aging_workers)
+
+    def get_segments(self, user_ids):
+        # customer_profile is written with every placement (put_activity and the increment flush)
+        items = batch_get(self.dynamodb, self.activity_table.name, 'user_id', user_ids,
+                          projection="user_id, customer_profile")
+        return {user_id: int(item['customer_profile']) for user_id, item in items.items()
+                if item.get('customer_profile') is not None}
+
+    def segment_target_pages(self, segment, checkpoint=None):
+        """Pages from every shard of the segment GSI, queried in parallel.
+
+        The checkpoint is {'shards': n, 'positions': {shard: LastEvaluatedKey
+        or SEGMENT_DONE}}. Anything else (a checkpoint saved before the GSI)
+        restarts the launch, which is safe since assignments are idempotent.
+        """
+        if not checkpoint or 'positions' not in checkpoint:
+            checkpoint = {'shards': self.shards, 'positions': {}}
+        shards = int(checkpoint['shards'])
+        positions = dict(checkpoint['positions'])
+        for shard, items, last_key in segment_target_positions(self.activity_table, segment, shards,
+                                                               start_keys=positions):
+            positions[str(shard)] = last_key or SEGMENT_DONE
+            yield [item['user_id'] for item in items], {'shards': shards, 'positions': dict(positions)}
+
+    # Campaigns and assignments
+
+    def create_campaign(self, campaign):
+        campaign = dict(campaign, campaign_id=str(uuid.uuid4()))
+        self.campaigns_table.put_item(Item=to_dynamo(campaign))
+        return campaign
+
+    def get_campaigns(self, campaign_ids):
+        return batch_get(self.dynamodb, self.campaigns_table.name, 'campaign_id', campaign_ids)
+
+    def list_campaigns(self):
+        return [item for page in scan_pages(self.campaigns_table) for item in page]
+
+    def save_launch_progress(self, campaign_id, status, progress):
+        self.campaigns_table.update_item(
+            Key={'campaign_id': campaign_id},
+            UpdateExpression="SET #status = :status, launch_progress = :progress, progress_updated_at = :now",
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':status': status,
+                ':progress': to_dynamo(progress),
+                ':now': to_dynamo(time.time())
+            }
+        )
+
+    def claim_launch(self, campaign_id, seen, now):
+        values = {':now': to_dynamo(now)}
+        if seen is None:
+            condition = "attribute_not_exists(progress_updated_at)"
+        else:
+            condition = "progress_updated_at = :seen"
+            values[':seen'] = seen
+        try:
+            self.campaigns_table.update_item(
+                Key={'campaign_id': campaign_id},
+                UpdateExpression="SET progress_updated_at = :now",
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values
+            )
+        except ClientError as e:
+            if _conditional_failed(e):
+                return False
+            raise
+        return True
+
+    def expire_campaign(self, campaign_id):
+        try:
+            self.campaigns_table.update_item(
+                Key={'campaign_id': campaign_id},
+                UpdateExpression="SET #status = :expired",
+                ConditionExpression="attribute_exists(campaign_id) AND #status <> :expired",
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':expired': EXPIRED}
+            )
+        except ClientError as e:
+            if _conditional_failed(e):
+                return False
+            raise
+        return True
+
+    def assign_campaign(self, user_ids, campaign_id, assigned_at):
+        # One assignment item per targeted user, written in 25-item batches
+        return write_assignments(self.assignments_table, user_ids, campaign_id, assigned_at)
+
+    def prune_assignments(self, campaign_ids):
+        # Assignments are keyed by user, so finding a campaign's rows is a
+        # filtered parallel scan; it only runs in the background after expiry
+        deleted = 0
+        campaign_ids = list(campaign_ids)
+        with self.assignments_table.batch_writer() as batch:
+            for i in range(0, len(campaign_ids), PRUNE_FILTER_IDS):
+                values = {f":c{j}": cid for j, cid in enumerate(campaign_ids[i:i + PRUNE_FILTER_IDS])}
+                for items in parallel_scan(self.assignments_table, ProjectionExpression="user_id, assigned_key",
+                                           FilterExpression=" OR ".join(f"campaign_id = {name}" for name in values),
+                                           ExpressionAttributeValues=values):
+                    for item in items:
+                        batch.delete_item(Key={'user_id': item['user_id'], 'assigned_key': item['assigned_key']})
+                        deleted += 1
+        return deleted
+
+    def newest_assignments(self, user_id, limit, before=None):
+        return newest_assignments(self.assignments_table, user_id, limit, before)
+
+    def claim_deliveries(self, campaign_id, user_ids):
+        # A launch resumed elsewhere can overlap one still running, so each
+        # claim is a conditional put only one of them wins. The batch read
+        # first skips users a replayed page already claimed, without a write.
+        keys = {delivery_key(campaign_id, user_id): user_id for user_id in user_ids}
+        claimed = batch_get(self.dynamodb, self.deliveries_table.name, 'delivery_key', keys,
+                            projection="delivery_key")
+
+        def claim(key):
+            try:
+                with_retries(lambda: self.deliveries_table.put_item(
+                    Item={'delivery_key': key, 'campaign_id': campaign_id, 'user_id': keys[key]},
+                    ConditionExpression="attribute_not_exists(delivery_key)"))
+            except ClientError as e:
+                if _conditional_failed(e):
+                    return False
+                raise
+            return True
+
+        pending = [key for key in keys if key not in claimed]
+        with ThreadPoolExecutor(max_workers=CLAIM_WORKERS, thread_name_prefix="delivery-claims") as pool:
+            won = list(pool.map(claim, pending))
+        return [keys[key] for key, ok in zip(pending, won) if ok]
+
+    # Purchases
+
+    def record_purchase(self, user_id, product_id, purchased_at):
+        self.purchases_table.put_item(Item=purchase_item(user_id, product_id, purchased_at))
+
+    def recent_purchases(self, user_id, limit):
+        return recent_purchases(self.purchases_table, user_id, limit)
+
+    def purchase_pages(self):
+        for items in parallel_scan(self.purchases_table, ProjectionExpression="user_id, product_id"):
+            yield [(item['user_id'], item['product_id']) for item in items]
+
+    # Products
+
+    def list_products(self):
+        return [item for page in scan_pages(self.products_table) for item in page]
+
+    def get_product(self, product_id):
+        return self.products_table.get_item(Key={'product_id': product_id}).get('Item')
+
+    def put_products(self, products):
+        with self.products_table.batch_writer(overwrite_by_pkeys=['product_id']) as batch:
+            for product in products:
+                batch.put_item(Item=to_dynamo(product))
+
+    def increment_product_purchases(self, product_id):
+        # Atomic ADD instead of read-modify-write, so concurrent buys all count
+        try:
+            self.products_table.update_item(
+                Key={'product_id': product_id},
+                UpdateExpression="ADD purchases :one",
+                ConditionExpression="attribute_exists(product_id)",
+                ExpressionAttributeValues={':one': 1}
+            )
+        except ClientError as e:
+            if _conditional_failed(e):
+                return False
+            raise
+        return True
+
+    def stats(self):
+        return {"backend": self.name, "shards": self.shards, "activity": self.activity_buffer.stats()}
+
+    def close(self):
+        self.activity_buffer.stop()
@@ -0,0 +1,265 @@
+import bisect
+import collections
+import copy
+import time
+
+from activity_aging import seen_at
+from activity_store import ActivityStore
+from assignments import assignment_key
+from purchases import purchase_key
+from campaign_scheduler import EXPIRED
+from concurrency import AtomicCounter, LockStripes
+from scoring import CHUNK_SIZE, FEATURES
+from segment_index import SegmentIndex
+from storage import StorageBackend
+from storage.seed import PRODUCTS
+
+
+class MemoryBackend(StorageBackend):
+    """Everything in this process: lost on restart, nothing to provision.
+
+    Activity lives in a columnar ActivityStore and segment placement in a
+    SegmentIndex updated on every increment. Safe under a threaded server:
+    ids come from atomic counters and per-key state (usernames, campaigns,
+    a user's assignments, product counters) is guarded by lock stripes.
+    For several worker processes, serve one of these from a state server
+    (storage/state_server.py).
+    """
+
+    name = "memory"
+
+    def __init__(self, model, products=PRODUCTS, chunk_size=CHUNK_SIZE):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.users = {}
+        self.users_by_username = {}  # username -> user, for O(1) signup/login lookups
+        self.admins = {}
+        self.activity = ActivityStore()
+        self.segments = SegmentIndex(model)
+        self.campaigns = {}
+        self.assignments = collections.defaultdict(list)  # user_id -> sorted [(assigned_key, campaign_id)]
+        self.purchases = collections.defaultdict(list)  # user_id -> sorted [(purchased_key, product_id)]
+        self.deliveries = collections.defaultdict(set)  # campaign_id -> user_ids sent (or being sent) to
+        self.products = {}
+        self._user_seq = AtomicCounter()
+        self._campaign_seq = AtomicCounter()
+        self._placement_seq = AtomicCounter()
+        self._stripes = LockStripes()
+        self.put_products(products)
+
+    # Users and admins
+
+    def create_user(self, username, password):
+        with self._stripes(("user", username)):
+            if username in self.users_by_username:
+                return None
+            user_id = str(self._user_seq.next())  # auto-increment ID
+            user = {"user_id": user_id, "username": username, "password": password}
+            self.users[user_id] = user
+            self.users_by_username[username] = user
+        self.put_activity({user_id: {"offers_opened": 0, "offers_clicked": 0, "purchases": 0,
+                                     "last_open_days": 0, "total_visits": 1}})
+        return user
+
+    def get_user_by_username(self, username):
+        return self.users_by_username.get(username)
+
+    def get_users(self, user_ids):
+        return {user_id: self.users[user_id] for user_id in user_ids if user_id in self.users}
+
+    def create_admin(self, username, password):
+        with self._stripes(("admin", username)):
+            if username in self.admins:
+                return False
+            self.admins[username] = {"username": username, "password": password}
+            return True
+
+    def get_admin(self, username):
+        return self.admins.get(username)
+
+    # Activity
+
+    def get_activity(self, user_ids):
+        found = {}
+        for user_id in user_ids:
+            activity = self.activity.get(user_id)
+            if activity is not None:
+                found[user_id] = activity
+        return found
+
+    def put_activity(self, activities):
+        now = time.time()
+        for user_id, activity in activities.items():
+            values = {name: activity[name] for name in FEATURES if name in activity}
+            last_seen = seen_at(activity, now)
+            if not self.activity.add(user_id, last_seen=last_seen, **values):
+                self.activity.set(user_id, last_seen=last_seen, **values)
+        self._place(list(activities))
+
+    def increment_activity_many(self, increments):
+        for user_id, entry in increments.items():
+            # Like DynamoDB's ADD, a missing user starts from zero counters
+            self.activity.add(user_id, offers_opened=0, offers_clicked=0, purchases=0, total_visits=0)
+            deltas = {name: delta for name, delta in entry.items() if name != "seen"}
+            self.activity.increment(user_id, seen=entry.get("seen", False), **deltas)
+        self._place(list(increments))
+
+    def _place(self, user_ids):
+        # The seq is taken after the caller's writes and before the read, so
+        # the newest placement of a user always reflects every finished write
+        if user_ids:
+            seq = self._placement_seq.next()
+            self.segments.update_features(user_ids, self.activity.features(user_ids), seq)
+
+    def rescore_all(self):
+        seq = self._placement_seq.next()
+        user_ids, features = self.activity.snapshot()
+        self.segments.update_features(user_ids, features, seq)
+
+    def age_activity(self, now=None):
+        changed = self.activity.age(time.time() if now is None else now, self.chunk_size)
+        for i in range(0, len(changed), self.chunk_size):
+            self._place(changed[i:i + self.chunk_size])
+        return {"scanned": len(self.activity), "updated": len(changed)}
+
+    def get_segments(self, user_ids):
+        return self.segments.profiles(user_ids)
+
+    def segment_target_pages(self, segment, checkpoint=None):
+        # Keyset pages over the sorted targets; the checkpoint is the last
+        # user_id written, so users joining or leaving the segment before a
+        # resume don't shift where it picks up
+        targets = sorted(self.segments.segment_targets(segment))
+        start = bisect.bisect_right(targets, checkpoint) if checkpoint is not None else 0
+        for offset in range(start, len(targets), self.chunk_size):
+            page = targets[offset:offset + self.chunk_size]
+            yield page, page[-1]
+
+    # Campaigns and assignments
+
+    def create_campaign(self, campaign):
+        campaign = dict(campaign, campaign_id=str(self._campaign_seq.next()))  # unique auto-increment ID
+        self.campaigns[campaign["campaign_id"]] = campaign
+        return dict(campaign)
+
+    def get_campaigns(self, campaign_ids):
+        return {cid: dict(self.campaigns[cid]) for cid in campaign_ids if cid in self.campaigns}
+
+    def list_campaigns(self):
+        return [copy.deepcopy(campaign) for campaign in list(self.campaigns.values())]
+
+    def save_launch_progress(self, campaign_id, status, progress):
+        with self._stripes(("campaign", campaign_id)):
+            campaign = self.campaigns[campaign_id]
+            campaign["status"] = status
+            campaign["launch_progress"] = copy.deepcopy(progress)
+            campaign["progress_updated_at"] = time.time()
+
+    def claim_launch(self, campaign_id, seen, now):
+        with self._stripes(("campaign", campaign_id)):
+            campaign = self.campaigns.get(campaign_id)
+            if campaign is None or campaign.get("progress_updated_at") != seen:
+                return False
+            campaign["progress_updated_at"] = now
+            return True
+
+    def expire_campaign(self, campaign_id):
+        with self._stripes(("campaign", campaign_id)):
+            campaign = self.campaigns.get(campaign_id)
+            if campaign is None or campaign.get("status") == EXPIRED:
+                return False
+            campaign["status"] = EXPIRED
+            return True
+
+    def assign_campaign(self, user_ids, campaign_id, assigned_at):
+        key = assignment_key(campaign_id, assigned_at)
+        entry = (key, campaign_id)
+        count = 0
+        for lock, group in self._stripes.group(user_ids):
+            with lock:
+                for user_id in group:
+                    offers = self.assignments[user_id]
+                    i = bisect.bisect_left(offers, entry)
+                    if i == len(offers) or offers[i] != entry:
+                        offers.insert(i, entry)
+                    count += 1
+        return count
+
+    def prune_assignments(self, campaign_ids):
+        campaign_ids = set(campaign_ids)
+        deleted = 0
+        for lock, group in self._stripes.group(list(self.assignments)):
+            with lock:
+                for user_id in group:
+                    offers = self.assignments.get(user_id)
+                    if not offers:
+                        continue
+                    kept = [entry for entry in offers if entry[1] not in campaign_ids]
+                    if len(kept) != len(offers):
+                        deleted += len(offers) - len(kept)
+                        self.assignments[user_id] = kept
+        return deleted
+
+    def newest_assignments(self, user_id, limit, before=None):
+        with self._stripes(user_id):
+            offers = self.assignments.get(user_id, [])
+            end = bisect.bisect_left(offers, (before,)) if before else len(offers)
+            page = offers[max(end - limit, 0):end][::-1]
+        next_before = page[-1][0] if page and end - limit > 0 else None
+        return [campaign_id for _, campaign_id in page], next_before
+
+    def claim_deliveries(self, campaign_id, user_ids):
+        with self._stripes(("deliveries", campaign_id)):
+            claimed = self.deliveries[campaign_id]
+            new = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in claimed]
+            claimed.update(new)
+        return new
+
+    # Purchases
+
+    def record_purchase(self, user_id, product_id, purchased_at):
+        with self._stripes(user_id):
+            bisect.insort(self.purchases[user_id], (purchase_key(product_id, purchased_at), product_id))
+
+    def recent_purchases(self, user_id, limit):
+        with self._stripes(user_id):
+            history = self.purchases.get(user_id, [])
+            return [product_id for _, product_id in reversed(history[-limit:])] if limit > 0 else []
+
+    def purchase_pages(self):
+        for lock, group in self._stripes.group(list(self.purchases)):
+            with lock:
+                page = [(user_id, product_id) for user_id in group for _, product_id in self.purchases[user_id]]
+            yield page
+
+    # Products
+
+    def list_products(self):
+        return [dict(product) for product in self.products.values()]
+
+    def get_product(self, product_id):
+        product = self.products.get(product_id)
+        return dict(product) if product is not None else None
+
+    def put_products(self, products):
+        for product in products:
+            self.products[product["product_id"]] = dict(product)
+
+    def increment_product_purchases(self, product_id):
+        with self._stripes(("product", product_id)):
+            product = self.products.get(product_id)
+            if product is None:
+                return False
+            product["purchases"] = product.get("purchases", 0) + 1
+            return True
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "users": len(self.users),
+            "campaigns": len(self.campaigns),
+            "activity_rows": len(self.activity),
+            "purchases": sum(len(history) for history in list(self.purchases.values())),
+            "deliveries": sum(len(sent) for sent in list(self.deliveries.values())),
+            "segments": self.segments.sizes()
+        }
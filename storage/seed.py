@@ -0,0 +1,113 @@
+"""Starter product catalog loaded into empty memory and SQLite stores."""
+
+
+PRODUCTS = [
+    {
+        "product_id": "1",
+        "name": "Boat Headphones",
+        "price": 2500,
+        "description": "Wireless headphones with deep bass and long battery life",
+        "category": "Electronics",
+        "tags": ["audio", "headphones", "wireless"],
+        "target_audience": ["students", "working"],
+        "image": "product1.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "2",
+        "name": "Smart Watch",
+        "price": 2000,
+        "description": "Fitness smartwatch with heart rate monitoring",
+        "category": "Wearables",
+        "tags": ["fitness", "watch", "health"],
+        "target_audience": ["working"],
+        "image": "product2.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "3",
+        "name": "JBL Bluetooth Speaker",
+        "price": 3000,
+        "description": "Portable Bluetooth speaker with powerful sound and deep bass",
+        "category": "Electronics",
+        "tags": ["audio", "speaker", "bluetooth", "portable"],
+        "target_audience": ["students", "working"],
+        "image": "product3.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "4",
+        "name": "Dell Laptop",
+        "price": 55000,
+        "description": "High-performance Dell laptop suitable for work, study, and programming",
+        "category": "Computers",
+        "tags": ["laptop", "dell", "computer", "work"],
+        "target_audience": ["students", "working"],
+        "image": "product4.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "5",
+        "name": "Dell Bluetooth Mouse",
+        "price": 1500,
+        "description": "Wireless Bluetooth mouse with smooth tracking and ergonomic design",
+        "category": "Computer Accessories",
+        "tags": ["mouse", "bluetooth", "dell", "accessories"],
+        "target_audience": ["students", "working"],
+        "image": "product5.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "6",
+        "name": "Classmate Pens",
+        "price": 100,
+        "description": "Hardcover writing journal for notes, planning, and daily journaling",
+        "category": "Stationery",
+        "tags": ["journal", "writing", "notes", "planner"],
+        "target_audience": ["students", "working"],
+        "image": "product6.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "7",
+        "name": "Writing Journal",
+        "price": 300,
+        "description": "Smooth writing pens ideal for exams, notes, and everyday use",
+        "category": "Stationery",
+        "tags": ["pens", "writing", "classmate", "stationery"],
+        "target_audience": ["students"],
+        "image": "product7.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "8",
+        "name": "Camel Water Colours",
+        "price": 250,
+        "description": "Water colour set perfect for painting, sketching, and art projects",
+        "category": "Art Supplies",
+        "tags": ["art", "painting", "watercolours", "camel"],
+        "target_audience": ["students", "artists"],
+        "image": "product8.jpg",
+        "views": 0,
+        "purchases": 0
+    },
+    {
+        "product_id": "9",
+        "name": "Laptop Bag",
+        "price": 700,
+        "description": "Durable and stylish laptop bag with padded compartments",
+        "category": "Accessories",
+        "tags": ["laptop", "bag", "travel", "office"],
+        "target_audience": ["students", "working"],
+        "image": "product9.jpg",
+        "views": 0,
+        "purchases": 0
+    }
+]
@@ -0,0 +1,518 @@
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from activity_aging import aged_days, seen_at
+from assignments import assignment_key
+from purchases import purchase_key
+from campaign_scheduler import EXPIRED
+from scoring import CHUNK_SIZE, FEATURES
+from segment_index import predict_segments
+from storage import StorageBackend
+from storage.seed import PRODUCTS
+
+
+DEFAULT_PATH = "campaigns.db"
+
+# Host parameters per IN (...) query, well under SQLite's limit
+IN_BATCH = 500
+
+# Lock wait before a writer gives up with "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# Assignment rows deleted per write transaction when pruning, so requests
+# don't wait behind one huge delete
+PRUNE_BATCH = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS admins (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS activity (
+    user_id TEXT PRIMARY KEY,
+    offers_opened INTEGER NOT NULL DEFAULT 0,
+    offers_clicked INTEGER NOT NULL DEFAULT 0,
+    purchases INTEGER NOT NULL DEFAULT 0,
+    last_open_days INTEGER NOT NULL DEFAULT 999,
+    total_visits INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL,
+    customer_profile INTEGER,
+    send_campaign INTEGER,
+    target_segment INTEGER
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS activity_target ON activity (target_segment, user_id)
+    WHERE target_segment IS NOT NULL;
+CREATE TABLE IF NOT EXISTS campaigns (
+    campaign_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    segment INTEGER NOT NULL,
+    status TEXT,
+    data TEXT NOT NULL,
+    launch_progress TEXT,
+    progress_updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    user_id TEXT NOT NULL,
+    assigned_key TEXT NOT NULL,
+    campaign_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, assigned_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS assignments_campaign ON assignments (campaign_id);
+CREATE TABLE IF NOT EXISTS deliveries (
+    campaign_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (campaign_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS purchases (
+    user_id TEXT NOT NULL,
+    purchased_key TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, purchased_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    purchases INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_COUNTERS = ", ".join(FEATURES)
+
+
+def _chunks(values, size=IN_BATCH):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _placeholders(values):
+    return ", ".join("?" * len(values))
+
+
+class SQLiteBackend(StorageBackend):
+    """One SQLite file in WAL mode, for a single node.
+
+    WAL lets request threads read while one writer commits; each thread
+    gets its own connection. Every activity increment re-scores the users
+    it touched in the same transaction and stores their segment placement,
+    with a partial index on target_segment that a launch pages through.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, model, path=DEFAULT_PATH, products=PRODUCTS, chunk_size=CHUNK_SIZE):
+        self.model = model
+        self.path = path
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(activity)")]
+        if "last_seen" not in columns:
+            # Files created before recency aging: date each user's last visit
+            # from their last_open_days, so the aging pass covers them too
+            with _Transaction(conn):
+                conn.execute("ALTER TABLE activity ADD COLUMN last_seen REAL")
+                now = time.time()
+                rows = conn.execute("SELECT user_id, last_open_days FROM activity").fetchall()
+                conn.executemany("UPDATE activity SET last_seen = ? WHERE user_id = ?",
+                                 [(seen_at(dict(row), now), row["user_id"]) for row in rows])
+        if conn.execute("SELECT 1 FROM products LIMIT 1").fetchone() is None:
+            self.put_products(products)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: autocommit, transactions are opened explicitly
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, safe against corruption
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _write(self):
+        return _Transaction(self._conn())
+
+    # Users and admins
+
+    def create_user(self, username, password):
+        with self._write() as conn:
+            try:
+                cursor = conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
+            except sqlite3.IntegrityError:
+                return None
+            user_id = str(cursor.lastrowid)
+            self._put_activity(conn, {user_id: {"offers_opened": 0, "offers_clicked": 0, "purchases": 0,
+                                                "last_open_days": 0, "total_visits": 1}})
+        return {"user_id": user_id, "username": username, "password": password}
+
+    def get_user_by_username(self, username):
+        row = self._conn().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return self._user(row) if row else None
+
+    def get_users(self, user_ids):
+        found = {}
+        for chunk in _chunks(user_ids):
+            rows = self._conn().execute(f"SELECT * FROM users WHERE user_id IN ({_placeholders(chunk)})", chunk)
+            for row in rows:
+                user = self._user(row)
+                found[user["user_id"]] = user
+        return found
+
+    def _user(self, row):
+        return {"user_id": str(row["user_id"]), "username": row["username"], "password": row["password"]}
+
+    def create_admin(self, username, password):
+        with self._write() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO admins (username, password) VALUES (?, ?)",
+                                  (username, password))
+            return cursor.rowcount == 1
+
+    def get_admin(self, username):
+        row = self._conn().execute("SELECT * FROM admins WHERE username = ?", (username,)).fetchone()
+        return dict(row) if row else None
+
+    # Activity
+
+    def get_activity(self, user_ids):
+        found = {}
+        for chunk in _chunks(user_ids):
+            rows = self._conn().execute(
+                f"SELECT user_id, {_COUNTERS} FROM activity WHERE user_id IN ({_placeholders(chunk)})", chunk)
+            for row in rows:
+                found[row["user_id"]] = {name: row[name] for name in FEATURES}
+        return found
+
+    def put_activity(self, activities):
+        with self._write() as conn:
+            self._put_activity(conn, activities)
+
+    def _put_activity(self, conn, activities):
+        now = time.time()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO activity (user_id, {_COUNTERS}, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(user_id, *(activity.get(name, 0) for name in FEATURES), seen_at(activity, now))
+             for user_id, activity in activities.items()]
+        )
+        self._place(conn, list(activities))
+
+    def increment_activity_many(self, increments):
+        if not increments:
+            return
+        now = time.time()
+        with self._write() as conn:
+            # Like DynamoDB's ADD, a missing user starts from zero counters
+            conn.executemany("INSERT OR IGNORE INTO activity (user_id) VALUES (?)", [(uid,) for uid in increments])
+            conn.executemany(
+                "UPDATE activity SET offers_opened = offers_opened + ?, offers_clicked = offers_clicked + ?, "
+                "purchases = purchases + ?, total_visits = total_visits + ?, "
+                "last_open_days = CASE WHEN ? THEN 0 ELSE last_open_days END, "
+                "last_seen = CASE WHEN ? THEN ? ELSE last_seen END WHERE user_id = ?",
+                [(entry.get("offers_opened", 0), entry.get("offers_clicked", 0), entry.get("purchases", 0),
+                  entry.get("total_visits", 0), bool(entry.get("seen")), bool(entry.get("seen")), now, user_id)
+                 for user_id, entry in increments.items()]
+            )
+            self._place(conn, list(increments))
+
+    def _place(self, conn, user_ids):
+        # Re-score users inside the caller's write transaction, so a
+        # concurrent increment can't store a placement from older counters
+        rows = []
+        for chunk in _chunks(user_ids):
+            rows.extend(conn.execute(
+                f"SELECT user_id, {_COUNTERS}, customer_profile, send_campaign, target_segment "
+                f"FROM activity WHERE user_id IN ({_placeholders(chunk)})", chunk).fetchall())
+        return self._store_placements(conn, rows)
+
+    def _store_placements(self, conn, rows):
+        if not rows:
+            return 0
+        user_ids = [row["user_id"] for row in rows]
+        profiles, sends, eligible = predict_segments(self.model, [dict(row) for row in rows], user_ids)
+        changed = []
+        for row, profile, send, ok in zip(rows, profiles, sends, eligible):
+            placement = (profile, send, profile if ok else None)
+            if (row["customer_profile"], row["send_campaign"], row["target_segment"]) != placement:
+                changed.append((*placement, row["user_id"]))
+        conn.executemany(
+            "UPDATE activity SET customer_profile = ?, send_campaign = ?, target_segment = ? WHERE user_id = ?",
+            changed
+        )
+        return len(changed)
+
+    def rescore_all(self):
+        """Re-place every user, chunk_size rows per transaction. Returns the number changed.
+
+        A swap listener can call this from inside _place, with this thread's
+        connection mid-transaction, where BEGIN would fail. The pass then
+        runs on its own thread (and connection), starting once the caller
+        commits, and this returns None.
+        """
+        if self._conn().in_transaction:
+            threading.Thread(target=self.rescore_all, name="sqlite-rescore", daemon=True).start()
+            return None
+        changed = 0
+        last = ""
+        while True:
+            with self._write() as conn:
+                rows = conn.execute(
+                    f"SELECT user_id, {_COUNTERS}, customer_profile, send_campaign, target_segment "
+                    f"FROM activity WHERE user_id > ? ORDER BY user_id LIMIT ?", (last, self.chunk_size)).fetchall()
+                if not rows:
+                    return changed
+                changed += self._store_placements(conn, rows)
+            last = rows[-1]["user_id"]
+
+    def age_activity(self, now=None):
+        """Age chunk_size rows at a time: read outside any write lock, write only rows that changed.
+
+        Each UPDATE requires last_seen to be what was read, so a visit
+        committed in between keeps its reset.
+        """
+        now = time.time() if now is None else now
+        result = {"scanned": 0, "updated": 0, "skipped": 0}
+        last = ""
+        while True:
+            rows = self._conn().execute(
+                "SELECT user_id, last_open_days, last_seen FROM activity "
+                "WHERE user_id > ? AND last_seen IS NOT NULL ORDER BY user_id LIMIT ?",
+                (last, self.chunk_size)).fetchall()
+            if not rows:
+                return result
+            last = rows[-1]["user_id"]
+            result["scanned"] += len(rows)
+            last_seen = np.array([row["last_seen"] for row in rows], dtype=np.float64)
+            current = np.array([row["last_open_days"] for row in rows])
+            days, changed = aged_days(last_seen, current, now)
+            updates = [(int(days[i]), rows[i]["user_id"], rows[i]["last_seen"])
+                       for i in np.flatnonzero(changed).tolist()]
+            if not updates:
+                continue
+            with self._write() as conn:
+                updated = conn.executemany(
+                    "UPDATE activity SET last_open_days = ? WHERE user_id = ? AND last_seen = ?", updates).rowcount
+                # Users a visit got to first were re-placed by that visit; re-placing them again is harmless
+                self._place(conn, [user_id for _, user_id, _ in updates])
+            result["updated"] += updated
+            result["skipped"] += len(updates) - updated
+
+    def get_segments(self, user_ids):
+        found = {}
+        for chunk in _chunks(user_ids):
+            rows = self._conn().execute(
+                f"SELECT user_id, customer_profile FROM activity WHERE user_id IN ({_placeholders(chunk)}) "
+                "AND customer_profile IS NOT NULL", chunk)
+            for row in rows:
+                found[row["user_id"]] = row["customer_profile"]
+        return found
+
+    def segment_target_pages(self, segment, checkpoint=None):
+        # Keyset pagination on the partial index; the checkpoint is the last user_id written
+        last = checkpoint or ""
+        while True:
+            rows = self._conn().execute(
+                "SELECT user_id FROM activity WHERE target_segment = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+                (segment, last, self.chunk_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1]["user_id"]
+            yield [row["user_id"] for row in rows], last
+
+    # Campaigns and assignments
+
+    def create_campaign(self, campaign):
+        data = {k: v for k, v in campaign.items() if k not in ("campaign_id", "status", "launch_progress")}
+        with self._write() as conn:
+            cursor = conn.execute("INSERT INTO campaigns (segment, status, data) VALUES (?, ?, ?)",
+                                  (campaign["segment"], campaign.get("status"), json.dumps(data)))
+        return dict(campaign, campaign_id=str(cursor.lastrowid))
+
+    def get_campaigns(self, campaign_ids):
+        found = {}
+        for chunk in _chunks(campaign_ids):
+            rows = self._conn().execute(
+                f"SELECT * FROM campaigns WHERE campaign_id IN ({_placeholders(chunk)})", chunk)
+            for row in rows:
+                campaign = self._campaign(row)
+                found[campaign["campaign_id"]] = campaign
+        return found
+
+    def list_campaigns(self):
+        return [self._campaign(row) for row in self._conn().execute("SELECT * FROM campaigns ORDER BY campaign_id")]
+
+    def _campaign(self, row):
+        campaign = json.loads(row["data"])
+        campaign.update(campaign_id=str(row["campaign_id"]), segment=row["segment"], status=row["status"],
+                        progress_updated_at=row["progress_updated_at"])
+        if row["launch_progress"]:
+            campaign["launch_progress"] = json.loads(row["launch_progress"])
+        return campaign
+
+    def save_launch_progress(self, campaign_id, status, progress):
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE campaigns SET status = ?, launch_progress = ?, progress_updated_at = ? WHERE campaign_id = ?",
+                (status, json.dumps(progress), time.time(), campaign_id))
+
+    def claim_launch(self, campaign_id, seen, now):
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE campaigns SET progress_updated_at = ? WHERE campaign_id = ? AND progress_updated_at IS ?",
+                (now, campaign_id, seen))
+            return cursor.rowcount == 1
+
+    def expire_campaign(self, campaign_id):
+        with self._write() as conn:
+            cursor = conn.execute("UPDATE campaigns SET status = ? WHERE campaign_id = ? AND status IS NOT ?",
+                                  (EXPIRED, campaign_id, EXPIRED))
+            return cursor.rowcount == 1
+
+    def assign_campaign(self, user_ids, campaign_id, assigned_at):
+        key = assignment_key(campaign_id, assigned_at)
+        rows = [(user_id, key, campaign_id) for user_id in user_ids]
+        with self._write() as conn:
+            conn.executemany("INSERT OR IGNORE INTO assignments (user_id, assigned_key, campaign_id) VALUES (?, ?, ?)",
+                             rows)
+        return len(rows)
+
+    def prune_assignments(self, campaign_ids):
+        deleted = 0
+        for chunk in _chunks(campaign_ids):
+            while True:
+                with self._write() as conn:
+                    cursor = conn.execute(
+                        "DELETE FROM assignments WHERE (user_id, assigned_key) IN ("
+                        f"SELECT user_id, assigned_key FROM assignments WHERE campaign_id IN ({_placeholders(chunk)}) "
+                        "LIMIT ?)", (*chunk, PRUNE_BATCH))
+                deleted += cursor.rowcount
+                if cursor.rowcount < PRUNE_BATCH:
+                    break
+        return deleted
+
+    def newest_assignments(self, user_id, limit, before=None):
+        query = "SELECT assigned_key, campaign_id FROM assignments WHERE user_id = ?"
+        params = [user_id]
+        if before:
+            query += " AND assigned_key < ?"
+            params.append(before)
+        # One extra row tells whether there is an older page
+        rows = self._conn().execute(query + " ORDER BY assigned_key DESC LIMIT ?", (*params, limit + 1)).fetchall()
+        next_before = rows[limit - 1]["assigned_key"] if len(rows) > limit else None
+        return [row["campaign_id"] for row in rows[:limit]], next_before
+
+    def claim_deliveries(self, campaign_id, user_ids):
+        new = []
+        for chunk in _chunks(dict.fromkeys(user_ids)):
+            # RETURNING gives back only the rows the insert didn't ignore
+            with self._write() as conn:
+                rows = conn.execute(
+                    "INSERT OR IGNORE INTO deliveries (campaign_id, user_id) VALUES "
+                    f"{', '.join('(?, ?)' for _ in chunk)} RETURNING user_id",
+                    [value for user_id in chunk for value in (campaign_id, user_id)]).fetchall()
+            inserted = {row["user_id"] for row in rows}
+            new += [user_id for user_id in chunk if user_id in inserted]
+        return new
+
+    # Purchases
+
+    def record_purchase(self, user_id, product_id, purchased_at):
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO purchases (user_id, purchased_key, product_id) VALUES (?, ?, ?)",
+                         (user_id, purchase_key(product_id, purchased_at), product_id))
+
+    def recent_purchases(self, user_id, limit):
+        rows = self._conn().execute(
+            "SELECT product_id FROM purchases WHERE user_id = ? ORDER BY purchased_key DESC LIMIT ?", (user_id, limit))
+        return [row["product_id"] for row in rows]
+
+    def purchase_pages(self):
+        # Keyset pagination on the primary key
+        last = ("", "")
+        while True:
+            rows = self._conn().execute(
+                "SELECT user_id, purchased_key, product_id FROM purchases WHERE (user_id, purchased_key) > (?, ?) "
+                "ORDER BY user_id, purchased_key LIMIT ?", (*last, self.chunk_size)).fetchall()
+            if not rows:
+                return
+            last = (rows[-1]["user_id"], rows[-1]["purchased_key"])
+            yield [(row["user_id"], row["product_id"]) for row in rows]
+
+    # Products
+
+    def list_products(self):
+        return [self._product(row) for row in self._conn().execute("SELECT * FROM products ORDER BY rowid")]
+
+    def get_product(self, product_id):
+        row = self._conn().execute("SELECT * FROM products WHERE product_id = ?", (product_id,)).fetchone()
+        return self._product(row) if row else None
+
+    def _product(self, row):
+        return dict(json.loads(row["data"]), product_id=row["product_id"], purchases=row["purchases"])
+
+    def put_products(self, products):
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO products (product_id, data, purchases) VALUES (?, ?, ?)",
+                [(product["product_id"], json.dumps(product), product.get("purchases", 0)) for product in products]
+            )
+
+    def increment_product_purchases(self, product_id):
+        with self._write() as conn:
+            cursor = conn.execute("UPDATE products SET purchases = purchases + 1 WHERE product_id = ?", (product_id,))
+            return cursor.rowcount == 1
+
+    def stats(self):
+        conn = self._conn()
+        segments = conn.execute(
+            "SELECT customer_profile, COUNT(*) AS members, COUNT(target_segment) AS targets "
+            "FROM activity GROUP BY customer_profile").fetchall()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "users": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+            "campaigns": conn.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0],
+            "activity_rows": conn.execute("SELECT COUNT(*) FROM activity").fetchone()[0],
+            "segments": {row["customer_profile"]: {"members": row["members"], "targets": row["targets"]}
+                         for row in segments},
+            "connections": len(self._connections)
+        }
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolling back on error.
+
+    IMMEDIATE takes the write lock up front, so two writers queue on
+    busy_timeout instead of deadlocking when both upgrade from a read.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
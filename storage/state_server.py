@@ -0,0 +1,259 @@
+"""Share one in-memory dataset between several app worker processes.
+
+A state server process holds a MemoryBackend and serves it over a local
+socket; each worker uses StateServerBackend, which forwards every
+StorageBackend call to it. The MemoryBackend's own locking makes the
+calls safe across all workers' threads, and ids stay unique because only
+the server allocates them.
+
+Run the server, then point the workers at it:
+    python -m storage.state_server --address 127.0.0.1:7070
+    STORAGE_BACKEND=state_server STATE_SERVER_ADDRESS=127.0.0.1:7070 gunicorn -w 4 app:app
+
+The server scores users with its own model registry (watching the same
+model file as the workers), so A/B splits set on a worker's /admin/model
+do not reach it. It also runs the recency aging job
+(ACTIVITY_AGING_INTERVAL seconds, a day by default), once for all workers.
+"""
+import argparse
+import itertools
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+
+from storage import StorageBackend
+
+
+DEFAULT_ADDRESS = "127.0.0.1:7070"
+
+# Shared secret for the connection handshake; set STATE_SERVER_AUTHKEY in production
+DEFAULT_AUTHKEY = "campaign-state"
+
+# Calls a worker may make; everything else on the backend stays private
+REMOTE_METHODS = frozenset((
+    "create_user", "get_user_by_username", "get_users", "create_admin", "get_admin",
+    "get_activity", "put_activity", "increment_activity_many", "flush_activity", "rescore_all", "age_activity",
+    "get_segments", "record_purchase", "recent_purchases",
+    "create_campaign", "get_campaigns", "list_campaigns", "save_launch_progress", "claim_launch",
+    "expire_campaign", "assign_campaign", "prune_assignments", "newest_assignments", "claim_deliveries",
+    "list_products", "get_product", "put_products", "increment_product_purchases", "stats"
+))
+
+# Generator methods, served a page per "next" call
+REMOTE_ITERATORS = frozenset(("segment_target_pages", "purchase_pages"))
+
+
+def parse_address(address):
+    """"host:port" for TCP, anything with a "/" for a Unix socket path."""
+    if "/" in address:
+        return address
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class StateServer:
+    """Serves a backend's REMOTE_METHODS to StateServerBackend clients, a thread per connection."""
+
+    def __init__(self, backend, address=DEFAULT_ADDRESS, authkey=DEFAULT_AUTHKEY):
+        self.backend = backend
+        self.listener = Listener(parse_address(address), authkey=authkey.encode())
+        self.address = self.listener.address
+        self.connections = 0
+        self.calls = 0
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception:
+                continue  # failed handshake
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def start(self):
+        """serve_forever() on a daemon thread; returns self."""
+        threading.Thread(target=self.serve_forever, name="state-server", daemon=True).start()
+        return self
+
+    def _serve(self, conn):
+        # Launch and purchase pages are generators, kept open per connection between "next" calls
+        iterators = {}
+        ids = itertools.count()
+        with conn:
+            while True:
+                try:
+                    op, name, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                self.calls += 1
+                try:
+                    if op == "call" and name in REMOTE_METHODS:
+                        result = getattr(self.backend, name)(*args, **kwargs)
+                    elif op == "iter" and name in REMOTE_ITERATORS:
+                        result = next(ids)
+                        iterators[result] = getattr(self.backend, name)(*args, **kwargs)
+                    elif op == "next":
+                        result = next(iterators[name], None)
+                        if result is None:
+                            del iterators[name]
+                    elif op == "close":
+                        iterators.pop(name, None)
+                        result = None
+                    else:
+                        raise AttributeError(f"{name!r} is not served")
+                    reply = ("ok", result)
+                except Exception as e:
+                    reply = ("error", e)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def stats(self):
+        return {"address": self.address, "connections": self.connections, "calls": self.calls}
+
+    def close(self):
+        self.listener.close()
+
+
+def _remote(name):
+    def call(self, *args, **kwargs):
+        return self._call("call", name, args, kwargs)
+    call.__name__ = name
+    call.__doc__ = getattr(StorageBackend, name).__doc__
+    return call
+
+
+class StateServerBackend(StorageBackend):
+    """StorageBackend that forwards to a StateServer. One connection per thread."""
+
+    name = "state_server"
+
+    def __init__(self, model=None, address=DEFAULT_ADDRESS, authkey=DEFAULT_AUTHKEY):
+        # The server scores users, so the worker's model isn't used here
+        self.address = parse_address(address)
+        self.authkey = authkey.encode()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, authkey=self.authkey)
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _call(self, op, name, args=(), kwargs=None):
+        conn = self._connection()
+        try:
+            conn.send((op, name, args, kwargs or {}))
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # Server restarted or went away: reconnect on the next call
+            self._local.conn = None
+            raise
+        if status == "error":
+            raise result
+        return result
+
+    create_user = _remote("create_user")
+    get_user_by_username = _remote("get_user_by_username")
+    get_users = _remote("get_users")
+    create_admin = _remote("create_admin")
+    get_admin = _remote("get_admin")
+
+    get_activity = _remote("get_activity")
+    put_activity = _remote("put_activity")
+    increment_activity_many = _remote("increment_activity_many")
+    flush_activity = _remote("flush_activity")
+
+    def rescore_all(self):
+        # The server re-scores when its own registry swaps models; one
+        # re-score per swap instead of one per worker
+        pass
+
+    age_activity = _remote("age_activity")
+
+    get_segments = _remote("get_segments")
+
+    def segment_target_pages(self, segment, checkpoint=None):
+        return self._pages("segment_target_pages", (segment, checkpoint))
+
+    def _pages(self, name, args=()):
+        iterator = self._call("iter", name, args)
+        exhausted = False
+        try:
+            while True:
+                page = self._call("next", iterator)
+                if page is None:
+                    exhausted = True
+                    return
+                yield page
+        finally:
+            if not exhausted:
+                self._call("close", iterator)
+
+    create_campaign = _remote("create_campaign")
+    get_campaigns = _remote("get_campaigns")
+    list_campaigns = _remote("list_campaigns")
+    save_launch_progress = _remote("save_launch_progress")
+    claim_launch = _remote("claim_launch")
+    expire_campaign = _remote("expire_campaign")
+    assign_campaign = _remote("assign_campaign")
+    prune_assignments = _remote("prune_assignments")
+    newest_assignments = _remote("newest_assignments")
+    claim_deliveries = _remote("claim_deliveries")
+
+    record_purchase = _remote("record_purchase")
+    recent_purchases = _remote("recent_purchases")
+
+    def purchase_pages(self):
+        return self._pages("purchase_pages")
+
+    list_products = _remote("list_products")
+    get_product = _remote("get_product")
+    put_products = _remote("put_products")
+    increment_product_purchases = _remote("increment_product_purchases")
+
+    def stats(self):
+        stats = self._call("call", "stats")
+        stats.update(backend=self.name, served_by=stats.get("backend"), address=str(self.address))
+        return stats
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve an in-memory dataset to several app workers.")
+    parser.add_argument("--address", default=os.environ.get("STATE_SERVER_ADDRESS", DEFAULT_ADDRESS),
+                        help="host:port, or a Unix socket path")
+    args = parser.parse_args()
+
+    from activity_aging import AGING_INTERVAL, AgingJob
+    from model_registry import BackgroundRescore, ModelRegistry
+    from prediction_cache import CachedModel
+    from storage.memory import MemoryBackend
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    registry = ModelRegistry(os.path.join(base_dir, "campaign_model.pkl"))
+    backend = MemoryBackend(CachedModel(registry))
+    registry.on_swap(BackgroundRescore(backend.rescore_all))
+    AgingJob(backend, float(os.environ.get("ACTIVITY_AGING_INTERVAL", AGING_INTERVAL))).start()
+    server = StateServer(backend, args.address, os.environ.get("STATE_SERVER_AUTHKEY", DEFAULT_AUTHKEY))
+    print(f"Serving in-memory state on {server.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
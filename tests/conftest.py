@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app's top-level modules the way the benchmarks do, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def busy_switching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # threads interleave far more often than under real load
+    yield
+    sys.setswitchinterval(interval)
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from activity_buffer import ActivityAggregator
+from benchmarks.fake_aws import FakeTable
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def table():
+    table = FakeTable("UserActivity", "user_id")
+    table.load([{"user_id": "u1", "total_visits": 1, "offers_opened": 0, "last_open_days": 9}])
+    return table
+
+
+def test_deltas_coalesce_into_one_write_per_user(table):
+    aggregator = ActivityAggregator(table, max_pending=100, max_staleness=60)
+    for _ in range(10):
+        aggregator.add("u1", total_visits=1, offers_opened=2)
+    aggregator.add("u1", seen=True)
+    aggregator.add("u2", purchases=1)
+    assert table.calls["update_item"] == 0 and aggregator.stats()["pending_users"] == 2
+
+    aggregator.flush()
+    assert table.calls["update_item"] == 2
+    u1 = table._items["u1"]
+    assert (u1["total_visits"], u1["offers_opened"], u1["last_open_days"]) == (11, 20, 0)
+    assert abs(u1["last_seen"] - time.time()) < 5
+    assert table._items["u2"]["purchases"] == 1 and "last_seen" not in table._items["u2"]
+    assert aggregator.stats() == {"pending_users": 0, "adds": 12, "writes": 2, "flushes": 1, "errors": 0}
+    aggregator.stop()
+
+
+def test_flushes_when_max_pending_users_are_buffered(table):
+    aggregator = ActivityAggregator(table, max_pending=5, max_staleness=60)
+    for i in range(4):
+        aggregator.add(f"p{i}", total_visits=1)
+    time.sleep(0.1)
+    assert table.calls["update_item"] == 0
+    aggregator.add("p4", total_visits=1)
+    assert wait_until(lambda: table.calls["update_item"] == 5)
+    assert aggregator.stats()["flushes"] == 1
+    aggregator.stop()
+
+
+def test_no_delta_waits_longer_than_max_staleness(table):
+    aggregator = ActivityAggregator(table, max_pending=1000, max_staleness=0.2)
+    started = time.monotonic()
+    aggregator.add("u1", offers_clicked=1)
+    assert table.calls["update_item"] == 0
+    assert wait_until(lambda: table.calls["update_item"] == 1)
+    assert 0.15 <= time.monotonic() - started < 2
+    assert table._items["u1"]["offers_clicked"] == 1
+    aggregator.stop()
+
+
+def test_zero_staleness_writes_through(table):
+    flushed = []
+    aggregator = ActivityAggregator(table, max_staleness=0, on_flush=flushed.append)
+    aggregator.add("u1", total_visits=1, seen=True)
+    assert table._items["u1"]["total_visits"] == 2 and table._items["u1"]["last_open_days"] == 0
+    assert [item["user_id"] for items in flushed for item in items] == ["u1"]
+    assert aggregator._thread is None  # no flusher needed
+    aggregator.add("u1")  # nothing to write
+    assert table.calls["update_item"] == 1
+
+
+def test_failed_writes_are_requeued(table):
+    update = table.update_item
+    failures = []
+
+    def fail_first(**kwargs):
+        if not failures:
+            failures.append(kwargs["Key"])
+            raise RuntimeError("throttled")
+        return update(**kwargs)
+
+    table.update_item = fail_first
+    flushed = []
+    aggregator = ActivityAggregator(table, max_staleness=60, on_flush=flushed.append)
+    aggregator.add("u1", total_visits=2)
+    aggregator.flush()
+    assert aggregator.stats()["errors"] == 1 and aggregator.stats()["pending_users"] == 1
+    assert flushed == []
+
+    aggregator.add("u1", total_visits=1)
+    aggregator.stop()  # drains what's left
+    assert table._items["u1"]["total_visits"] == 4
+    assert len(flushed) == 1 and flushed[0][0]["total_visits"] == 4
+
+
+def test_on_flush_hook_errors_do_not_lose_writes(table):
+    def broken(items):
+        raise ValueError("hook")
+
+    aggregator = ActivityAggregator(table, max_staleness=60, on_flush=broken)
+    aggregator.add("u1", total_visits=1)
+    aggregator.add("u2", total_visits=1)
+    aggregator.stop()
+    assert table._items["u1"]["total_visits"] == 2 and table._items["u2"]["total_visits"] == 1
+    assert aggregator.stats()["pending_users"] == 0
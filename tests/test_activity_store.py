@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+
+from activity_aging import DAY, NEVER_SEEN_DAYS
+from activity_store import ActivityStore
+from scoring import DEFAULT_ACTIVITY, FEATURES
+
+
+def test_users_get_defaults_and_are_added_once():
+    store = ActivityStore()
+    assert store.add("u1", purchases=4) is True
+    assert store.add("u1", purchases=9) is False
+    assert store.get("u1") == dict(DEFAULT_ACTIVITY, purchases=4)
+    assert store.get("nobody") is None and "u1" in store and len(store) == 1
+    assert store.increment("nobody", total_visits=1) is False
+    assert store.set("nobody", purchases=1) is False
+
+
+def test_growing_keeps_rows_and_order():
+    store = ActivityStore(capacity=4)
+    for i in range(100):
+        store.add(f"u{i}", offers_opened=i, total_visits=2 * i)
+    assert store.user_ids == [f"u{i}" for i in range(100)]
+    view = store.view()
+    assert view.shape == (100, len(FEATURES))
+    assert all(view[:, col].flags["C_CONTIGUOUS"] for col in range(len(FEATURES)))  # one block per feature
+    assert view[:, FEATURES.index("offers_opened")].tolist() == list(range(100))
+    assert store.column("total_visits").tolist() == [2 * i for i in range(100)]
+
+
+def test_views_see_later_updates_without_copying():
+    store = ActivityStore()
+    store.add("u1")
+    view = store.view()
+    store.increment("u1", offers_clicked=3, purchases=1)
+    store.set("u1", total_visits=7)
+    assert view[0, FEATURES.index("offers_clicked")] == 3 and view[0, FEATURES.index("total_visits")] == 7
+    assert np.shares_memory(view, store.column("purchases"))
+
+    user_ids, snapshot = store.snapshot()
+    store.add("u2")
+    assert user_ids == ["u1"] and len(snapshot) == 1  # added users don't show
+
+
+def test_features_in_the_asked_order_with_defaults_for_unknown_users():
+    store = ActivityStore()
+    store.add("a", purchases=1)
+    store.add("b", purchases=2)
+    features = store.features(["b", "nobody", "a"])
+    col = FEATURES.index("purchases")
+    assert features[:, col].tolist() == [2, DEFAULT_ACTIVITY["purchases"], 1]
+    assert features[1].tolist() == [DEFAULT_ACTIVITY[name] for name in FEATURES]
+    features[0, col] = 99  # a copy
+    assert store.get("b")["purchases"] == 2
+    assert store.features([]).shape == (0, len(FEATURES))
+
+
+def test_seen_resets_days_and_age_counts_them_back_up():
+    now = time.time()
+    store = ActivityStore()
+    store.add("away", last_seen=now - 3 * DAY, last_open_days=3)
+    store.add("never", last_open_days=NEVER_SEEN_DAYS)
+    store.add("back", last_seen=now - 9 * DAY, last_open_days=9)
+    store.increment("back", seen=True, total_visits=1)
+    assert store.get("back")["last_open_days"] == 0
+
+    later = now + 2.5 * DAY
+    assert store.age(later, chunk_size=2) == ["away", "back"]
+    assert store.get("away")["last_open_days"] == 5
+    assert store.get("back")["last_open_days"] == 2
+    assert store.get("never")["last_open_days"] == NEVER_SEEN_DAYS
+    assert store.age(later) == []  # nothing left to change
@@ -0,0 +1,89 @@
+import os
+import time
+from decimal import Decimal
+
+import pytest
+
+from activity_aging import DAY, NEVER_SEEN_DAYS, AgingJob, age_table, seen_at
+from benchmarks.fake_aws import FakeTable
+from migrate_last_seen import backfill
+from scoring import load_model
+from storage.memory import MemoryBackend
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "campaign_model.pkl")
+
+NOW = 1_700_000_000.0
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return load_model(MODEL_PATH)
+
+
+def boto3_item(user_id, **values):
+    # boto3 reads every DynamoDB number back as a Decimal
+    item = {"user_id": user_id, "offers_opened": 3, "offers_clicked": 1, "purchases": 0, "total_visits": 4}
+    item.update(values)
+    return {name: Decimal(value) if isinstance(value, (int, float)) else value for name, value in item.items()}
+
+
+def test_seen_at_takes_decimals():
+    assert seen_at({"last_open_days": Decimal(3)}, NOW) == NOW - 3 * DAY
+    assert seen_at({"last_seen": Decimal(12345)}, NOW) == 12345.0
+    assert seen_at({"last_open_days": Decimal(NEVER_SEEN_DAYS)}, NOW) is None
+    assert seen_at({}, NOW) is None
+
+
+def test_backfill_dates_decimal_items():
+    table = FakeTable("UserActivity", "user_id", page_items=2)
+    table.load([boto3_item("a", last_open_days=3), boto3_item("b", last_open_days=NEVER_SEEN_DAYS),
+                boto3_item("c", last_open_days=0, last_seen=NOW - 100)])
+
+    assert backfill(table, NOW) == (1, 1)
+    assert table._items["a"]["last_seen"] == int(NOW - 3 * DAY)
+    assert "last_seen" not in table._items["b"]
+    assert table._items["c"]["last_seen"] == Decimal(NOW - 100)  # already set, left alone
+
+
+def test_age_table_ages_decimal_items(model):
+    table = FakeTable("UserActivity", "user_id", page_items=2)
+    table.load([boto3_item("stale", last_open_days=0, last_seen=NOW - 5 * DAY - 1),
+                boto3_item("fresh", last_open_days=0, last_seen=NOW - 60),
+                boto3_item("never", last_open_days=NEVER_SEEN_DAYS)])
+
+    result = age_table(table, model, NOW, segments=2, workers=2)
+    assert result == {"scanned": 2, "updated": 1, "skipped": 0}
+    assert table._items["stale"]["last_open_days"] == 5
+    assert "customer_profile" in table._items["stale"]
+    assert table._items["fresh"]["last_open_days"] == 0
+
+
+def test_age_table_skips_users_who_visit_mid_run(model):
+    table = FakeTable("UserActivity", "user_id")
+    table.load([boto3_item("u1", last_open_days=0, last_seen=NOW - 9 * DAY)])
+    scan = table.scan
+
+    def visit_during_scan(**kwargs):
+        response = scan(**kwargs)
+        table.update_item(Key={"user_id": "u1"}, UpdateExpression="SET last_seen = :s, last_open_days = :z",
+                          ExpressionAttributeValues={":s": Decimal(NOW), ":z": Decimal(0)})
+        return response
+
+    table.scan = visit_during_scan
+    assert age_table(table, model, NOW, segments=1, workers=1)["skipped"] == 1
+    assert table._items["u1"]["last_open_days"] == 0
+
+
+def test_aging_job_ages_memory_backend(model):
+    backend = MemoryBackend(model)
+    backend.put_activity({"away": {"last_open_days": 2, "total_visits": 3},
+                          "never": {"last_open_days": NEVER_SEEN_DAYS}})
+    job = AgingJob(backend, interval=0)
+
+    assert job.run_once(time.time() + 3 * DAY) == {"scanned": 2, "updated": 1}
+    activity = backend.get_activity(["away", "never"])
+    assert activity["away"]["last_open_days"] == 5
+    assert activity["never"]["last_open_days"] == NEVER_SEEN_DAYS
+    assert job.runs == 1
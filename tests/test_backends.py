@@ -0,0 +1,258 @@
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmarks.bench_backends import make_backend
+from benchmarks.fake_aws import TABLE_INDEXES, TABLES, FakeDynamoDB, FakeTable
+from model_registry import BackgroundRescore
+from scoring import FEATURES, load_model
+from segment_index import predict_segments
+from storage import create_backend
+from storage.seed import PRODUCTS
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "campaign_model.pkl")
+
+# Small pages, so launches and resumes cross page boundaries on every backend
+PAGE = 16
+
+PARITY_BACKENDS = ("memory", "sqlite", "dynamodb")
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+class OneSegmentModel:
+    """A stand-in for a newly deployed model: every user in `segment`, all sent to."""
+
+    def __init__(self, segment):
+        self.segment = segment
+
+    def predict(self, features):
+        return np.column_stack([np.ones(len(features), dtype=int), np.full(len(features), self.segment)])
+
+
+@pytest.fixture(scope="module")
+def model():
+    return load_model(MODEL_PATH)
+
+
+@pytest.fixture
+def workdir():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def paged_backend(name, model, workdir):
+    if name == "dynamodb":
+        dynamodb = FakeDynamoDB([FakeTable(table, *keys, page_items=PAGE, indexes=TABLE_INDEXES.get(table))
+                                 for table, keys in TABLES.items()])
+        backend = create_backend(name, model, dynamodb=dynamodb)
+        backend.put_products(PRODUCTS)
+        return backend
+    if name == "sqlite":
+        return create_backend(name, model, path=os.path.join(workdir, "test.db"), chunk_size=PAGE)
+    return create_backend(name, model, chunk_size=PAGE)
+
+
+@pytest.fixture(params=PARITY_BACKENDS)
+def backend(request, model, workdir):
+    backend = paged_backend(request.param, model, workdir)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def dynamodb(model, workdir):
+    backend = make_backend("dynamodb", model, workdir, 0.0)
+    yield backend
+    backend.close()
+
+
+def activities(n):
+    return {f"u{i:03d}": {"offers_opened": i % 40, "offers_clicked": i % 13, "purchases": i % 5,
+                          "last_open_days": i % 30, "total_visits": i % 9} for i in range(n)}
+
+
+def targets(backend, segment):
+    return sorted(user_id for user_ids, _ in backend.segment_target_pages(segment) for user_id in user_ids)
+
+
+def test_dynamodb_rescores_every_user_after_a_swap(dynamodb):
+    backend = dynamodb
+    backend.put_activity(activities(200))
+    assert len(targets(backend, 3)) < 200
+
+    # The registry swaps the model the backend scores with, then tells the listener
+    backend.model = OneSegmentModel(3)
+    rescorer = BackgroundRescore(backend.rescore_all)
+    rescorer(SimpleNamespace(version="v2"))
+    deadline = time.monotonic() + 10
+    while rescorer.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert rescorer.stats() == {"running": False, "runs": 1, "errors": 0}
+    assert targets(backend, 3) == sorted(activities(200))
+    assert all(targets(backend, segment) == [] for segment in (0, 1, 2))
+    assert backend.rescore_all() == 0  # already current: nothing rewritten
+
+
+def test_dynamodb_signup_writes_all_or_nothing(dynamodb, monkeypatch):
+    tables = dynamodb.dynamodb._target.tables
+    user = dynamodb.create_user("ada", "pw")
+    assert dynamodb.get_user_by_username("ada") == user
+    assert user["user_id"] in dynamodb.get_activity([user["user_id"]])
+    assert dynamodb.create_user("ada", "other") is None
+    assert len(tables["Users"]) == 1 and len(tables["UserActivity"]) == 1
+
+    # A signup whose Users put fails leaves no claimed username behind
+    taken = {"user_id": "fixed", "username": "someone", "password": "pw"}
+    tables["Users"].load([taken])
+    monkeypatch.setattr("storage.dynamodb.uuid.uuid4", lambda: "fixed")
+    with pytest.raises(ClientError):
+        dynamodb.create_user("grace", "pw")
+    assert dynamodb.get_user_by_username("grace") is None
+    assert tables["Users"]._items["fixed"] == taken and "fixed" not in tables["UserActivity"]._items
+
+
+def test_dynamodb_signup_retries_a_conflicting_transaction(dynamodb, monkeypatch):
+    fake = dynamodb.dynamodb._target
+    transact = fake.transact_write_items
+    calls = []
+
+    def conflict_once(TransactItems):
+        calls.append(TransactItems)
+        if len(calls) == 1:
+            raise ClientError({"Error": {"Code": "TransactionCanceledException", "Message": ""},
+                               "CancellationReasons": [{"Code": "TransactionConflict"}, {"Code": "None"},
+                                                       {"Code": "None"}]}, "TransactWriteItems")
+        return transact(TransactItems=TransactItems)
+
+    monkeypatch.setattr(fake, "transact_write_items", conflict_once)
+    assert dynamodb.create_user("ada", "pw")["username"] == "ada"
+    assert len(calls) == 2 and dynamodb.get_user_by_username("ada") is not None
+
+
+def test_users_and_admins(backend):
+    user = backend.create_user("ada", "pw")
+    assert backend.create_user("ada", "other") is None
+    assert backend.get_user_by_username("ada") == user
+    assert backend.get_user_by_username("nobody") is None
+    assert backend.get_users([user["user_id"], "missing"]) == {user["user_id"]: user}
+    assert backend.get_activity([user["user_id"]])[user["user_id"]]["total_visits"] == 1
+
+    assert backend.create_admin("root", "pw") is True
+    assert backend.create_admin("root", "pw") is False
+    assert backend.get_admin("root")["password"] == "pw"
+
+
+def test_activity_increments_and_placement(backend, model):
+    backend.put_activity(activities(50))
+    backend.increment_activity("u001", offers_opened=2, total_visits=1)
+    backend.increment_activity_many({"u001": {"offers_clicked": 1, "seen": True},
+                                     "u002": {"purchases": 3, "seen": False}})
+    backend.flush_activity()
+
+    activity = backend.get_activity(["u001", "u002"])
+    assert {name: int(activity["u001"][name]) for name in FEATURES} == {
+        "offers_opened": 3, "offers_clicked": 2, "purchases": 1, "last_open_days": 0, "total_visits": 2}
+    assert int(activity["u002"]["purchases"]) == 5
+
+    # Placements match a fresh scoring of the final counters
+    final = backend.get_activity(sorted(activities(50)))
+    ids = sorted(final)
+    profiles, _, eligible = predict_segments(model, [final[user_id] for user_id in ids], ids)
+    assert {k: int(v) for k, v in backend.get_segments(ids).items()} == dict(zip(ids, profiles))
+    for segment in range(4):
+        assert targets(backend, segment) == [user_id for user_id, profile, ok in zip(ids, profiles, eligible)
+                                             if ok and profile == segment]
+
+
+def test_launch_pages_resume_from_any_checkpoint(backend):
+    backend.put_activity(activities(200))
+    segment = max(range(4), key=lambda segment: len(targets(backend, segment)))
+    everyone = targets(backend, segment)
+    pages = list(backend.segment_target_pages(segment))
+    assert len(pages) > 2
+
+    for i, (_, checkpoint) in enumerate(pages):
+        done = [user_id for user_ids, _ in pages[:i + 1] for user_id in user_ids]
+        rest = [user_id for user_ids, _ in backend.segment_target_pages(segment, checkpoint) for user_id in user_ids]
+        assert sorted(done + rest) == everyone
+
+
+def test_campaign_launch_progress(backend):
+    campaign = backend.create_campaign({"name": "Autumn", "segment": 2, "status": "Scheduled"})
+    campaign_id = campaign["campaign_id"]
+    assert backend.get_campaigns([campaign_id, "missing"])[campaign_id]["name"] == "Autumn"
+    assert [c["campaign_id"] for c in backend.list_campaigns()] == [campaign_id]
+
+    backend.save_launch_progress(campaign_id, "Targeting", {"processed": 32, "checkpoint": "u031"})
+    saved = backend.get_campaigns([campaign_id])[campaign_id]
+    assert saved["status"] == "Targeting" and saved["launch_progress"]["checkpoint"] == "u031"
+    seen = saved["progress_updated_at"]
+    assert backend.claim_launch(campaign_id, seen, 1e12) is True
+    assert backend.claim_launch(campaign_id, seen, 1e12 + 1) is False  # another process got there first
+
+    assert backend.expire_campaign(campaign_id) is True
+    assert backend.expire_campaign(campaign_id) is False
+    assert backend.get_campaigns([campaign_id])[campaign_id]["status"] == "Expired"
+
+
+def test_assignments_newest_first_and_pruned(backend):
+    campaign_ids = [backend.create_campaign({"name": f"c{i}", "segment": 0})["campaign_id"] for i in range(5)]
+    for i, campaign_id in enumerate(campaign_ids):
+        backend.assign_campaign(["u1", "u2"], campaign_id, f"2024-01-0{i + 1}T00:00:00+00:00")
+    backend.assign_campaign(["u1"], campaign_ids[0], "2024-01-01T00:00:00+00:00")  # a replayed page
+
+    newest, before = backend.newest_assignments("u1", 3)
+    assert newest == campaign_ids[:1:-1] and before is not None
+    rest, before = backend.newest_assignments("u1", 3, before=before)
+    assert rest == campaign_ids[1::-1] and before is None
+
+    assert backend.prune_assignments(campaign_ids[3:]) == 4
+    assert backend.newest_assignments("u2", 10)[0] == campaign_ids[2::-1]
+
+
+def test_deliveries_claimed_once(backend):
+    assert backend.claim_deliveries("c1", ["u1", "u2", "u2"]) == ["u1", "u2"]
+    assert sorted(backend.claim_deliveries("c1", ["u2", "u3"])) == ["u3"]
+    assert backend.claim_deliveries("c2", ["u1"]) == ["u1"]
+
+
+def test_purchases_and_products(backend):
+    backend.record_purchase("u1", "1", "2024-01-01T00:00:00+00:00")
+    backend.record_purchase("u1", "2", "2024-01-03T00:00:00+00:00")
+    backend.record_purchase("u2", "1", "2024-01-02T00:00:00+00:00")
+    assert backend.recent_purchases("u1", 5) == ["2", "1"]
+    assert backend.recent_purchases("u1", 1) == ["2"]
+    assert sorted(pair for page in backend.purchase_pages() for pair in page) == [("u1", "1"), ("u1", "2"),
+                                                                                    ("u2", "1")]
+
+    assert sorted(p["product_id"] for p in backend.list_products()) == sorted(p["product_id"] for p in PRODUCTS)
+    before = int(backend.get_product("1").get("purchases", 0))
+    assert backend.increment_product_purchases("1") is True
+    assert backend.increment_product_purchases("no-such-product") is False
+    assert int(backend.get_product("1")["purchases"]) == before + 1
+    assert backend.get_product("no-such-product") is None
+
+
+def test_backends_target_the_same_users(model, workdir):
+    found = {}
+    for name in PARITY_BACKENDS:
+        backend = paged_backend(name, model, workdir)
+        try:
+            backend.put_activity(activities(300))
+            for i in range(0, 300, 7):
+                backend.increment_activity(f"u{i:03d}", seen=True, total_visits=2, offers_opened=1)
+            backend.flush_activity()
+            found[name] = {segment: targets(backend, segment) for segment in range(4)}
+        finally:
+            backend.close()
+    assert found["sqlite"] == found["memory"] and found["dynamodb"] == found["memory"]
+    assert sum(len(users) for users in found["memory"].values()) > 0
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+import app
+from cache import TTLCache
+from campaign_scheduler import CampaignScheduler
+from storage.memory import MemoryBackend
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+def test_get_many_fetches_only_the_misses_in_one_call():
+    cache = TTLCache(maxsize=100, ttl=60)
+    fetched = []
+
+    def fetch(keys):
+        fetched.append(list(keys))
+        return {key: key.upper() for key in keys if key != "gone"}
+
+    assert cache.get_many(["a", "b", "a"], fetch) == {"a": "A", "b": "B"}
+    assert cache.get_many(["b", "c", "gone"], fetch) == {"b": "B", "c": "C"}
+    assert fetched == [["a", "b"], ["c", "gone"]]
+    assert cache.get_many(["gone"], fetch) == {}  # misses aren't cached
+    assert cache.stats()["hits"] == 1 and cache.stats()["size"] == 3
+
+
+def test_entries_expire_and_the_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts b, read longest ago
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    time.sleep(0.06)
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_home_reads_campaigns_in_one_batch_then_from_the_cache(monkeypatch):
+    backend = MemoryBackend(app.model)
+    monkeypatch.setattr(app, "backend", backend)
+    monkeypatch.setattr(app, "campaign_cache", TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(app, "scheduler", CampaignScheduler(on_expire=app.expire_campaigns))
+    user = backend.create_user("ada", "pw")
+    campaign_ids = [backend.create_campaign({"name": f"Offer {i}", "segment": 0, "offer": f"{i}% off",
+                                             "start_time": "", "end_time": ""})["campaign_id"] for i in range(5)]
+    for i, campaign_id in enumerate(campaign_ids):
+        backend.assign_campaign([user["user_id"]], campaign_id, f"2024-01-0{i + 1}T00:00:00+00:00")
+
+    reads = []
+    get_campaigns = backend.get_campaigns
+    monkeypatch.setattr(backend, "get_campaigns", lambda ids: reads.append(list(ids)) or get_campaigns(ids))
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user["user_id"]
+        session["username"] = user["username"]
+
+    first = client.get("/home")
+    assert first.status_code == 200
+    assert all(f"Offer {i}".encode() in first.data for i in range(5))
+    assert reads == [campaign_ids[::-1]]  # newest first, one batch get
+
+    assert client.get("/home").status_code == 200
+    assert len(reads) == 1  # the repeat view doesn't touch storage for campaigns
@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from campaign_scheduler import (ACTIVE, EXPIRED, UPCOMING, CampaignScheduler, campaign_zone, localize_form_time,
+                                parse_campaign_time)
+
+T0 = parse_campaign_time("2026-03-01T12:00+00:00")
+HOUR = 3600
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def campaign(campaign_id, start=None, end=None, **fields):
+    return dict(fields, campaign_id=campaign_id, start_time=iso(start) if start is not None else "",
+                end_time=iso(end) if end is not None else "")
+
+
+@pytest.fixture
+def scheduled():
+    clock = Clock(T0)
+    calls = {"activated": [], "expired": []}
+    scheduler = CampaignScheduler(on_expire=calls["expired"].append, clock=clock,
+                                  on_activate=calls["activated"].append)
+    return scheduler, clock, calls
+
+
+def test_campaigns_activate_and_expire_on_their_window(scheduled):
+    scheduler, clock, calls = scheduled
+    assert scheduler.add(campaign("now", end=T0 + 2 * HOUR)) == ACTIVE
+    assert scheduler.add(campaign("later", start=T0 + HOUR, end=T0 + 3 * HOUR)) == UPCOMING
+    assert scheduler.add(campaign("open", start=T0 - HOUR)) == ACTIVE
+    assert scheduler.active_ids == {"now", "open"}
+    assert calls["activated"] == [["now"], ["open"]]
+    assert scheduler.next_due() == T0 + HOUR
+
+    clock.now = T0 + HOUR
+    assert scheduler.advance() == []
+    assert scheduler.state("later") == ACTIVE and calls["activated"][-1] == ["later"]
+
+    clock.now = T0 + 2 * HOUR + 1
+    assert scheduler.advance() == ["now"]
+    assert scheduler.active_ids == {"later", "open"} and calls["expired"] == [["now"]]
+
+    clock.now = T0 + 10 * HOUR
+    assert scheduler.advance() == ["later"]
+    assert scheduler.active_ids == {"open"}  # no end_time: never expires
+    assert scheduler.stats()["campaigns"] == {UPCOMING: 0, ACTIVE: 1, EXPIRED: 2}
+
+
+def test_campaign_that_ends_before_it_is_seen_never_activates(scheduled):
+    scheduler, clock, calls = scheduled
+    clock.now = T0 + 5 * HOUR
+    assert scheduler.add(campaign("missed", start=T0, end=T0 + HOUR)) == EXPIRED
+    assert calls["expired"] == [["missed"]] and "missed" not in scheduler.active_ids
+
+
+def test_expired_status_and_repeat_adds(scheduled):
+    scheduler, clock, calls = scheduled
+    assert scheduler.add(campaign("done", status=EXPIRED)) == EXPIRED
+    assert calls == {"activated": [], "expired": []}
+    scheduler.add(campaign("c1", start=T0 + HOUR))
+    scheduler.sync([campaign("c1", start=T0 - HOUR), campaign("c2")])
+    assert scheduler.state("c1") == UPCOMING  # already tracked: not re-read
+    assert scheduler.state("c2") == ACTIVE
+
+
+def test_form_times_take_the_browser_offset():
+    assert localize_form_time("2026-03-01T09:00", "+05:30") == "2026-03-01T09:00+05:30"
+    assert parse_campaign_time(localize_form_time("2026-03-01T09:00", "+05:30")) == \
+        parse_campaign_time("2026-03-01T03:30+00:00")
+    assert localize_form_time("2026-03-01T09:00", "-08:00") == "2026-03-01T09:00-08:00"
+
+
+def test_form_times_fall_back_to_the_campaign_zone():
+    berlin = campaign_zone("Europe/Berlin")
+    assert localize_form_time("2026-01-15T09:00", None, berlin) == "2026-01-15T09:00+01:00"
+    assert localize_form_time("2026-07-15T09:00", None, berlin) == "2026-07-15T09:00+02:00"  # summer time
+    assert localize_form_time("2026-01-15T09:00", "+01:00:00.5", berlin) == "2026-01-15T09:00+01:00"
+    assert localize_form_time("2026-01-15T09:00") == "2026-01-15T09:00+00:00"
+    assert campaign_zone("UTC") is timezone.utc and campaign_zone("") is timezone.utc
+
+
+def test_form_times_left_alone_when_not_local():
+    assert localize_form_time("2026-01-15T09:00+03:00", "+05:00") == "2026-01-15T09:00+03:00"
+    assert localize_form_time("", "+05:00") == ""
+    assert localize_form_time("soon", "+05:00") == "soon"
+    assert parse_campaign_time("2026-01-15T09:00") == parse_campaign_time("2026-01-15T09:00+00:00")
+    assert parse_campaign_time("soon") is None and parse_campaign_time(None) is None
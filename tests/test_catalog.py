@@ -0,0 +1,120 @@
+import copy
+
+import pytest
+
+import app
+from catalog import ProductCatalog
+from storage.memory import MemoryBackend
+from storage.seed import PRODUCTS
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Store:
+    """What storage would return for list_products()."""
+
+    def __init__(self):
+        self.products = copy.deepcopy(PRODUCTS)
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        return copy.deepcopy(self.products)
+
+
+def test_reload_without_changes_keeps_the_version_and_etags():
+    store = Store()
+    catalog = ProductCatalog(store, refresh_interval=0)
+    etag = catalog.product_etag("1")
+    catalog.refresh()
+    assert catalog.current().version == 1 and catalog.product_etag("1") == etag
+    # Another process holding the same catalog derives the same ETags
+    assert ProductCatalog(Store(), refresh_interval=0).product_etag("1") == etag
+
+
+def test_counter_change_moves_only_that_products_etag():
+    store, clock = Store(), Clock()
+    catalog = ProductCatalog(store, refresh_interval=0, clock=clock)
+    etags = {p["product_id"]: catalog.product_etag(p["product_id"]) for p in PRODUCTS}
+    modified = catalog.product_modified("1")
+
+    clock.now += 60
+    store.products[0]["purchases"] = store.products[0].get("purchases", 0) + 1
+    catalog.refresh()
+    assert catalog.current().version == 1  # counters aren't part of the snapshot
+    assert catalog.product_etag("1") != etags["1"] and catalog.product_modified("1") == modified + 60
+    assert all(catalog.product_etag(pid) == etag for pid, etag in etags.items() if pid != "1")
+
+
+def test_static_change_is_a_new_version_and_notifies_only_the_change():
+    store = Store()
+    catalog = ProductCatalog(store, refresh_interval=0)
+    changes = []
+    catalog.on_change(lambda changed, removed: changes.append((sorted(changed), removed)))
+    etag = catalog.product_etag("2")
+
+    store.products[1]["price"] += 100
+    removed = store.products.pop()["product_id"]
+    catalog.refresh()
+    assert catalog.current().version == 2
+    assert changes == [(sorted(p["product_id"] for p in PRODUCTS), []), (["2"], [removed])]
+    assert catalog.product_etag("2") != etag and catalog.product(removed) is None
+
+
+def test_bump_shows_at_once_and_survives_a_stale_reload():
+    store = Store()
+    catalog = ProductCatalog(store, refresh_interval=0)
+    before = catalog.product("1")["purchases"]
+    catalog.bump("1")
+    assert catalog.product("1")["purchases"] == before + 1
+    catalog.refresh()  # storage hasn't seen the buy yet
+    assert catalog.product("1")["purchases"] == before + 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    backend = MemoryBackend(app.model)
+    monkeypatch.setattr(app, "backend", backend)
+    monkeypatch.setattr(app, "catalog", ProductCatalog(lambda: backend.list_products(), refresh_interval=0))
+    user = backend.create_user("shopper", "pw")
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user["user_id"]
+        session["username"] = user["username"]
+    return client
+
+
+def test_product_page_revalidates_to_304(client):
+    first = client.get("/product/1")
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+    etag = first.headers["ETag"]
+
+    again = client.get("/product/1", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b"" and again.headers["ETag"] == etag
+    since = client.get("/product/1", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+    # A buy changes the page (purchase count), so the next view is a full one
+    client.post("/buy/1")
+    after = client.get("/product/1", headers={"If-None-Match": etag})
+    assert after.status_code == 200 and after.headers["ETag"] != etag
+
+
+def test_home_revalidates_to_304_until_the_catalog_changes(client):
+    first = client.get("/home")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get("/home", headers={"If-None-Match": etag}).status_code == 304
+
+    app.backend.products["1"]["name"] = "Renamed headphones"
+    app.catalog.refresh()
+    changed = client.get("/home", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
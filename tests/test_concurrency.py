@@ -0,0 +1,114 @@
+import os
+import threading
+
+import pytest
+
+from activity_store import ActivityStore
+from concurrency import AtomicCounter
+from prediction_cache import CachedModel
+from storage.memory import MemoryBackend
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "campaign_model.pkl")
+
+THREADS = 8
+ROUNDS = 500
+DELTAS = {"offers_opened": 1, "offers_clicked": 2, "purchases": 1, "total_visits": 3}
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+def run_threads(target, threads=THREADS):
+    """Runs target(i) on `threads` threads started together; returns their results in order."""
+    results = [None] * threads
+    errors = []
+    barrier = threading.Barrier(threads)
+
+    def run(i):
+        try:
+            barrier.wait()
+            results[i] = target(i)
+        except Exception as e:
+            errors.append(e)
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    assert not errors, errors
+    return results
+
+
+@pytest.fixture(scope="module")
+def model():
+    return CachedModel(MODEL_PATH)
+
+
+def test_atomic_counter_never_repeats(busy_switching):
+    counter = AtomicCounter()
+    results = run_threads(lambda i: [counter.next() for _ in range(ROUNDS)])
+    values = [value for result in results for value in result]
+    assert sorted(values) == list(range(1, THREADS * ROUNDS + 1))
+    assert counter.value == THREADS * ROUNDS
+
+
+def test_activity_store_keeps_every_increment(busy_switching):
+    store = ActivityStore()
+    hot = [f"u{i}" for i in range(3)]
+    for user_id in hot:
+        store.add(user_id, offers_opened=0, offers_clicked=0, purchases=0, total_visits=0)
+
+    def work(i):
+        for n in range(ROUNDS):
+            store.increment(hot[(i + n) % len(hot)], seen=n % 2 == 0, **DELTAS)
+
+    run_threads(work)
+    total = {name: sum(store.get(user_id)[name] for user_id in hot) for name in DELTAS}
+    assert total == {name: delta * THREADS * ROUNDS for name, delta in DELTAS.items()}
+
+
+def test_memory_backend_loses_no_updates(busy_switching, model):
+    backend = MemoryBackend(model)
+    hot_ids = [backend.create_user(f"hot{i}", "pw")["user_id"] for i in range(4)]
+    product_id = next(iter(backend.products))
+    activity_before = backend.get_activity(hot_ids)
+    purchases_before = backend.get_product(product_id).get("purchases", 0)
+
+    def work(i):
+        campaign = backend.create_campaign({"name": f"t{i}", "segment": 0, "status": "Scheduled"})
+        contended = backend.create_user("everyone-wants-this-name", "pw") is not None
+        users = [backend.create_user(f"t{i}-{n}", "pw")["user_id"] for n in range(20)]
+        for n in range(ROUNDS // 5):
+            backend.increment_activity(hot_ids[n % len(hot_ids)], **DELTAS)
+            backend.increment_product_purchases(product_id)
+        backend.assign_campaign(hot_ids, campaign["campaign_id"], "2024-01-01T00:00:00")
+        return campaign["campaign_id"], contended, users
+
+    results = run_threads(work)
+    campaign_ids = [campaign_id for campaign_id, _, _ in results]
+    user_ids = hot_ids + [user_id for _, _, users in results for user_id in users]
+
+    assert sum(contended for _, contended, _ in results) == 1
+    assert len(set(user_ids)) == len(user_ids) and len(set(campaign_ids)) == THREADS
+    activity = backend.get_activity(hot_ids)
+    for name, delta in DELTAS.items():
+        added = sum(activity[user_id][name] - activity_before[user_id][name] for user_id in hot_ids)
+        assert added == delta * THREADS * (ROUNDS // 5), name
+    assert backend.get_product(product_id)["purchases"] == purchases_before + THREADS * (ROUNDS // 5)
+    for user_id in hot_ids:
+        assert sorted(backend.newest_assignments(user_id, THREADS)[0]) == sorted(campaign_ids)
+
+
+def test_overlapping_claims_claim_each_user_once(busy_switching):
+    backend = MemoryBackend(model=None)
+    user_ids = [f"u{i}" for i in range(2000)]
+
+    def work(i):
+        # Every thread claims every user, a chunk at a time from its own starting point
+        order = user_ids[i * 250:] + user_ids[:i * 250]
+        return [user_id for start in range(0, len(order), 100)
+                for user_id in backend.claim_deliveries("c1", order[start:start + 100])]
+
+    results = run_threads(work)
+    claimed = [user_id for result in results for user_id in result]
+    assert sorted(claimed) == sorted(user_ids)
@@ -0,0 +1,141 @@
+import os
+import threading
+
+import pytest
+
+from benchmarks.fake_aws import FakeSNS
+from delivery import CampaignDelivery, RateLimiter, idempotency_key
+from scoring import load_model
+from storage.memory import MemoryBackend
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "campaign_model.pkl")
+
+TOPIC = "arn:aws:sns:us-east-1:000000000000:campaign-deliveries"
+
+CAMPAIGN = {"campaign_id": "c1", "name": "Autumn", "subject": "Hi {username}", "offer": "20% off until {end_time} {x}",
+            "end_time": "2030-01-01T00:00+00:00"}
+
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return load_model(MODEL_PATH)
+
+
+@pytest.fixture
+def backend(model):
+    return MemoryBackend(model)
+
+
+def delivery(backend, client, campaign=CAMPAIGN, topic=TOPIC, **kwargs):
+    return CampaignDelivery(backend, client, topic, campaign, rate=0, workers=4, **kwargs)
+
+
+def test_retried_failures_reach_everyone_exactly_once(backend):
+    sns = FakeSNS(fail_every=7)
+    sender = delivery(backend, sns)
+    user_ids = [f"u{i}" for i in range(1200)]  # more than one ledger chunk
+    assert sender.deliver(user_ids) == (1200, 0)
+    assert set(sns.recipients) == set(user_ids) and max(sns.recipients.values()) == 1
+    stats = sender.stats()
+    assert stats["retries"] > 0 and stats["failed"] == 0 and stats["skipped"] == 0
+
+
+def test_replayed_and_overlapping_pages_send_nothing_twice(backend):
+    sns = FakeSNS()
+    sender = delivery(backend, sns)
+    assert sender.deliver([f"u{i}" for i in range(30)]) == (30, 0)
+    assert sender.deliver([f"u{i}" for i in range(30)]) == (0, 0)  # a replayed page
+
+    # A resumed launch in another process, its first page overlapping the last
+    resumed = delivery(backend, sns)
+    assert resumed.deliver([f"u{i}" for i in range(20, 50)]) == (20, 0)
+    assert resumed.stats()["skipped"] == 10
+    assert len(sns.recipients) == 50 and max(sns.recipients.values()) == 1
+
+
+def test_concurrent_senders_split_the_users(backend):
+    sns = FakeSNS()
+    user_ids = [f"u{i}" for i in range(2000)]
+    senders = [delivery(backend, sns) for _ in range(4)]
+    threads = [threading.Thread(target=sender.deliver, args=(user_ids,)) for sender in senders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(sender.delivered for sender in senders) == 2000
+    assert set(sns.recipients) == set(user_ids) and max(sns.recipients.values()) == 1
+
+
+def test_sender_faults_are_not_retried(backend):
+    class RejectsOne(FakeSNS):
+        def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+            bad = [e for e in PublishBatchRequestEntries if e["MessageAttributes"]["user_id"]["StringValue"] == "u3"]
+            rest = [e for e in PublishBatchRequestEntries if e not in bad]
+            response = super().publish_batch(TopicArn, rest)
+            response["Failed"] += [{"Id": e["Id"], "Code": "InvalidParameter", "SenderFault": True} for e in bad]
+            return response
+
+    sns = RejectsOne()
+    sender = delivery(backend, sns)
+    assert sender.deliver([f"u{i}" for i in range(10)]) == (9, 1)
+    assert sns.calls["publish_batch"] == 1 and "u3" not in sns.recipients
+    assert sender.deliver(["u3"]) == (0, 0)  # claimed: lost, never sent twice
+
+
+def test_messages_are_rendered_per_user(backend):
+    user = backend.create_user("ada", "pw")
+    sns = FakeSNS()
+    delivery(backend, sns).deliver([user["user_id"], "no-such-user"])
+    by_user = {m["MessageAttributes"]["user_id"]["StringValue"]: m for m in sns.messages}
+    assert by_user[user["user_id"]]["Subject"] == "Hi ada"
+    assert by_user["no-such-user"]["Subject"] == "Hi there"
+    # Unknown placeholders are left as written
+    assert by_user[user["user_id"]]["Message"] == "20% off until 2030-01-01T00:00+00:00 {x}"
+    assert "MessageDeduplicationId" not in by_user[user["user_id"]]
+
+
+def test_fifo_topics_get_the_idempotency_key(backend):
+    sns = FakeSNS()
+    delivery(backend, sns, campaign=dict(CAMPAIGN, subject="Hi"), topic=TOPIC + ".fifo").deliver(["u1"])
+    [message] = sns.messages
+    assert message["MessageDeduplicationId"] == idempotency_key("c1", "u1") == "c1:u1"
+    assert message["MessageGroupId"] == "u1"
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_rate_limiter_holds_the_send_rate():
+    time = FakeTime()
+    limiter = RateLimiter(64, burst=16, clock=time.clock, sleep=time.sleep)
+    for _ in range(33):
+        limiter.acquire(16)
+    # 528 messages at 64/s, less the initial burst of 16
+    assert time.now == 8.0
+
+    time.now += 60  # idle: only a burst's worth builds up
+    started = time.now
+    for _ in range(5):
+        limiter.acquire(16)
+    assert time.now - started == 1.0
+
+
+def test_rate_zero_is_uncapped():
+    time = FakeTime()
+    limiter = RateLimiter(0, clock=time.clock, sleep=time.sleep)
+    for _ in range(1000):
+        limiter.acquire(10)
+    assert time.slept == []
@@ -0,0 +1,172 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+from benchmarks.fake_aws import FakeSNS
+from campaign_scheduler import ACTIVE, UPCOMING, CampaignScheduler
+from launch_jobs import DELIVERED, SCHEDULED, TARGETING
+from notifications import NotificationDispatcher
+from storage.memory import MemoryBackend
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def launch_app(monkeypatch):
+    """The app on a fresh memory backend with users in every segment, a fake SNS and a hand-driven scheduler."""
+    backend = MemoryBackend(app.model, chunk_size=7)
+    backend.put_activity({f"u{i}": {"offers_opened": i % 40, "offers_clicked": i % 13, "purchases": i % 5,
+                                    "last_open_days": i % 30, "total_visits": i % 9} for i in range(300)})
+    sns = FakeSNS()
+    clock = Clock()
+    scheduler = CampaignScheduler(on_expire=app.expire_campaigns, clock=clock,
+                                  on_activate=lambda campaign_ids: app.start_due_launches(campaign_ids))
+    monkeypatch.setattr(app, "backend", backend)
+    monkeypatch.setattr(app, "notifier", NotificationDispatcher(sns, app.SNS_TOPIC_ARN))
+    monkeypatch.setattr(app, "scheduler", scheduler)
+    monkeypatch.setattr(app, "launch_runner", app.LaunchJobRunner(workers=2))
+    monkeypatch.setattr(app, "DELIVERY_RATE", 0)
+    return backend, sns, clock
+
+
+def busiest_segment(backend):
+    return max(range(4), key=lambda segment: len(backend.segments.segment_targets(segment)))
+
+
+def post_campaign(segment, start, end):
+    name = {v: k for k, v in app.HTML_TO_INT.items()}[segment]
+    response = app.app.test_client().post("/launch-campaign", data={
+        "name": "Autumn sale", "type": "email", "subject": "Hi {username}", "offer": "20% off",
+        "segment": name, "start_time": start.strftime("%Y-%m-%dT%H:%M"), "start_time_offset": "+00:00",
+        "end_time": end.strftime("%Y-%m-%dT%H:%M"), "end_time_offset": "+00:00", "send_rate": "0"})
+    assert response.status_code == 302
+    return max(app.backend.campaigns, key=int)
+
+
+def wait_for(campaign_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while app.launch_runner.running(campaign_id) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return app.launch_runner.get(campaign_id)
+
+
+def test_future_campaign_sends_nothing_until_it_starts(launch_app):
+    backend, sns, clock = launch_app
+    segment = busiest_segment(backend)
+    targets = set(backend.segments.segment_targets(segment))
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    campaign_id = post_campaign(segment, start, start + timedelta(days=1))
+
+    assert app.scheduler.state(campaign_id) == UPCOMING
+    assert app.launch_runner.get(campaign_id) is None
+    app.resume_interrupted_launches(backend.list_campaigns())  # not stale-resumed early either
+    time.sleep(0.1)
+    assert not sns.recipients and not backend.deliveries[campaign_id]
+    assert backend.campaigns[campaign_id]["status"] == SCHEDULED
+
+    clock.now = start.timestamp() + 1
+    app.scheduler.advance()
+    progress = wait_for(campaign_id)
+    assert app.scheduler.state(campaign_id) == ACTIVE
+    assert progress.status == DELIVERED and progress.delivered == len(targets)
+    assert set(sns.recipients) == targets and max(sns.recipients.values()) == 1
+
+
+def test_live_campaign_is_sent_at_once(launch_app):
+    backend, sns, clock = launch_app
+    segment = busiest_segment(backend)
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+    campaign_id = post_campaign(segment, start, start + timedelta(days=1))
+
+    progress = wait_for(campaign_id)
+    assert progress.status == DELIVERED
+    assert set(sns.recipients) == set(backend.segments.segment_targets(segment))
+
+
+def test_activation_is_launched_by_one_process(launch_app):
+    backend, sns, clock = launch_app
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    campaign_id = post_campaign(busiest_segment(backend), start, start + timedelta(days=1))
+    clock.now = start.timestamp() + 1
+    app.scheduler.advance()
+    wait_for(campaign_id)
+
+    # Another worker's scheduler seeing the same activation finds it claimed
+    sent = sum(sns.recipients.values())
+    app.launch_runner.jobs.clear()
+    app.start_due_launches([campaign_id])
+    assert app.launch_runner.get(campaign_id) is None and sum(sns.recipients.values()) == sent
+
+
+class ProcessDied(BaseException):
+    """Not an Exception, so the job runner can't mark the launch Failed: it just stops."""
+
+
+def test_interrupted_launch_resumes_from_its_checkpoint(launch_app, monkeypatch):
+    backend, sns, clock = launch_app
+    segment = busiest_segment(backend)
+    targets = set(backend.segments.segment_targets(segment))
+    assert len(targets) > 4 * backend.chunk_size
+
+    # The process dies after sending its third page, before saving that page's checkpoint
+    save = backend.save_launch_progress
+    died = threading.Event()
+
+    def die_on_third_page(campaign_id, status, progress):
+        if progress["processed"] >= 3 * backend.chunk_size:
+            died.set()
+            raise ProcessDied()
+        save(campaign_id, status, progress)
+
+    monkeypatch.setattr(backend, "save_launch_progress", die_on_third_page)
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+    campaign_id = post_campaign(segment, start, start + timedelta(days=1))
+    assert died.wait(10)
+    monkeypatch.setattr(backend, "save_launch_progress", save)
+
+    campaign = backend.campaigns[campaign_id]
+    assert campaign["status"] == TARGETING and campaign["launch_progress"]["processed"] == 2 * backend.chunk_size
+    sent = set(sns.recipients)
+    assert len(sent) == 3 * backend.chunk_size
+
+    # Another process starts up: nothing is resumed while the launch still looks alive
+    monkeypatch.setattr(app, "launch_runner", app.LaunchJobRunner(workers=2))
+    app.resume_interrupted_launches(backend.list_campaigns())
+    assert app.launch_runner.get(campaign_id) is None
+
+    campaign["progress_updated_at"] -= app.LAUNCH_STALE_SECONDS + 1
+    app.resume_interrupted_launches(backend.list_campaigns())
+    progress = wait_for(campaign_id)
+    assert progress.status == DELIVERED and backend.campaigns[campaign_id]["status"] == DELIVERED
+
+    # Picked up where it left off: the replayed third page reaches no one twice
+    assert set(sns.recipients) == targets and max(sns.recipients.values()) == 1
+    assert all(backend.newest_assignments(user_id, 5)[0] == [campaign_id] for user_id in targets)
+
+    app.resume_interrupted_launches(backend.list_campaigns())  # finished: not resumed again
+    assert app.launch_runner.get(campaign_id) is progress
+
+
+def test_form_times_stored_in_the_admins_time_zone(launch_app):
+    backend, sns, clock = launch_app
+    response = app.app.test_client().post("/launch-campaign", data={
+        "name": "Local sale", "type": "email", "subject": "Hi", "offer": "10% off", "segment": "loyal",
+        "start_time": "2030-01-15T09:00", "start_time_offset": "+05:30",
+        "end_time": "2030-01-16T09:00", "end_time_offset": "", "send_rate": ""})
+    assert response.status_code == 302
+    campaign = backend.campaigns[max(backend.campaigns, key=int)]
+    assert campaign["start_time"] == "2030-01-15T09:00+05:30"
+    # No offset from the browser: CAMPAIGN_TIMEZONE (UTC here)
+    assert campaign["end_time"] == "2030-01-16T09:00+00:00"
+    assert app.scheduler.next_due() == datetime(2030, 1, 15, 3, 30, tzinfo=timezone.utc).timestamp()
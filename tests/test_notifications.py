@@ -0,0 +1,94 @@
+import pytest
+
+from benchmarks.fake_aws import FakeSNS
+from notifications import PUBLISH_BATCH_SIZE, NotificationDispatcher, publish_with_retries
+
+TOPIC = "arn:aws:sns:us-east-1:000000000000:test"
+
+
+class RecordingSNS(FakeSNS):
+    """FakeSNS that remembers each publish_batch call's size."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batch_sizes = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        with self._lock:
+            self.batch_sizes.append(len(PublishBatchRequestEntries))
+        return super().publish_batch(TopicArn, PublishBatchRequestEntries)
+
+
+class SenderFaultSNS:
+    """Rejects entries whose message is "bad" as the caller's fault, accepts the rest."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.calls += 1
+        ok = [{'Id': e['Id'], 'MessageId': e['Id']} for e in PublishBatchRequestEntries if e['Message'] != "bad"]
+        bad = [{'Id': e['Id'], 'Code': 'InvalidParameter', 'SenderFault': True}
+               for e in PublishBatchRequestEntries if e['Message'] == "bad"]
+        return {'Successful': ok, 'Failed': bad}
+
+
+class DownSNS:
+    def __init__(self):
+        self.calls = 0
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.calls += 1
+        raise ConnectionError("SNS unreachable")
+
+
+def entries(n, message="hi"):
+    return [{'Id': str(i), 'Subject': "s", 'Message': message} for i in range(n)]
+
+
+def dispatch(client, messages, **kwargs):
+    dispatcher = NotificationDispatcher(client, TOPIC, batch_wait=0.01, **kwargs)
+    for i in range(messages):
+        assert dispatcher.send("subject", f"message {i}")
+    dispatcher.stop()
+    return dispatcher.stats()
+
+
+def test_dispatcher_splits_into_batches_of_ten():
+    sns = RecordingSNS()
+    stats = dispatch(sns, 95, workers=1)
+    assert stats["sent"] == 95 and stats["failed"] == 0
+    assert max(sns.batch_sizes) <= PUBLISH_BATCH_SIZE
+    assert sum(sns.batch_sizes) == 95 == len(sns.messages)
+    assert stats["batches"] == len(sns.batch_sizes)
+
+
+def test_retryable_failures_are_resent_until_delivered():
+    sns = FakeSNS(fail_every=3)
+    stats = dispatch(sns, 40, workers=2)
+    assert stats["sent"] == 40 and stats["failed"] == 0 and stats["retries"] > 0
+    assert sorted(m['Message'] for m in sns.messages) == sorted(f"message {i}" for i in range(40))
+
+
+def test_sender_faults_count_as_failed_without_retrying():
+    sns = SenderFaultSNS()
+    result = publish_with_retries(sns, TOPIC, entries(3) + [{'Id': "3", 'Subject': "s", 'Message': "bad"}])
+    assert sorted(result.sent) == ["0", "1", "2"]
+    assert result.failed == ["3"]
+    assert sns.calls == 1 and result.retries == 0
+
+
+def test_entries_still_failing_after_max_retries_are_counted(monkeypatch):
+    monkeypatch.setattr("notifications.backoff", lambda attempt: None)
+    sns = DownSNS()
+    result = publish_with_retries(sns, TOPIC, entries(4), max_retries=2)
+    assert result.sent == [] and sorted(result.failed) == ["0", "1", "2", "3"]
+    assert sns.calls == 3 and result.retries == 2 and result.calls == 0
+
+
+def test_counters_add_up_with_many_workers(busy_switching):
+    sns = FakeSNS(fail_every=11)
+    stats = dispatch(sns, 3000, workers=8, max_queue=3000)
+    assert stats["sent"] == 3000 == sns.published
+    assert stats["failed"] == 0
+    assert stats["batches"] == sns.calls["publish_batch"]
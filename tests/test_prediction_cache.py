@@ -0,0 +1,82 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+
+from model_registry import ModelRegistry
+from prediction_cache import CachedModel, saturation_caps
+from scoring import FEATURES, load_dataset_features, load_model
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "campaign_model.pkl")
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return load_model(MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return load_dataset_features().astype(np.float64)
+
+
+def test_cached_predictions_match_the_model(model, rows):
+    cached = CachedModel(MODEL_PATH)
+    for start in range(0, len(rows), 50):
+        batch = rows[start:start + 50]
+        np.testing.assert_array_equal(cached.predict(batch), model.predict(batch))
+    np.testing.assert_array_equal(cached.predict(rows[:50]), model.predict(rows[:50]))
+
+    # Only distinct rows were scored, each once
+    stats = cached.stats()
+    assert stats["rows"] == len(rows) + 50 and stats["rows_predicted"] == len(np.unique(rows, axis=0))
+    assert stats["row_hit_rate"] > 0
+
+
+def test_big_batches_skip_the_cache(model, rows):
+    cached = CachedModel(MODEL_PATH, max_batch=64)
+    np.testing.assert_array_equal(cached.predict(rows[:500]), model.predict(rows[:500]))
+    assert cached.stats()["rows_bypassed"] == 500 and cached.stats()["size"] == 0
+
+
+def test_bucketed_keys_match_the_model_on_the_reference_rows(model, rows):
+    caps = saturation_caps(model, rows)
+    assert caps  # the shipped model saturates on at least one column
+    cached = CachedModel(MODEL_PATH, bucket_rows=rows, max_batch=None)
+    np.testing.assert_array_equal(cached.predict(rows), model.predict(rows))
+
+    # Past the cap, every value shares one key
+    col = FEATURES.index(next(iter(caps)))
+    far = np.repeat(rows[:1], 3, axis=0)
+    far[:, col] = [caps[FEATURES[col]] + 1, 10 ** 6, 10 ** 8]
+    before = cached.stats()["rows_predicted"]
+    np.testing.assert_array_equal(cached.predict(far), model.predict(far))
+    assert cached.stats()["rows_predicted"] - before <= 1
+
+
+def test_a_swapped_model_never_sees_old_results(tmp_path, rows):
+    path = str(tmp_path / "campaign_model.pkl")
+    shutil.copy(MODEL_PATH, path)
+    registry = ModelRegistry(path, check_interval=0)
+    cached = CachedModel(registry)
+    old = cached.predict(rows[:50])
+    old_version = registry.current().version
+
+    with open(MODEL_PATH, "rb") as f:
+        sklearn_model = pickle.load(f)
+    for estimator in sklearn_model.estimators_:
+        estimator.coef_ = -estimator.coef_
+        estimator.intercept_ = -estimator.intercept_
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(sklearn_model, f)
+    os.replace(path + ".tmp", path)
+
+    new = cached.predict(rows[:50])
+    assert registry.current().version != old_version
+    np.testing.assert_array_equal(new, load_model(path).predict(rows[:50]))
+    assert not np.array_equal(new, old)
+    np.testing.assert_array_equal(cached.predict(rows[:50], old_version), old)  # still kept and cached
@@ -0,0 +1,154 @@
+import random
+
+import numpy as np
+import pytest
+
+import app
+from catalog import ProductCatalog
+from product_index import ProductIndex, as_list, words
+from storage.memory import MemoryBackend
+
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+CATEGORIES = ["Electronics", "Books", "Home", "Sports"]
+TAGS = ["wireless", "audio", "kitchen", "outdoor", "gift", "smart"]
+AUDIENCES = ["students", "working", "families", "seniors"]
+NAMES = ["Boat", "Lamp", "Speaker", "Kettle", "Novel", "Ball", "Watch"]
+
+
+def random_products(n, seed=7):
+    rng = random.Random(seed)
+    prices = rng.sample(range(1, 5000), n)  # distinct, so a price sort has one right order
+    products = []
+    for i in range(n):
+        product = {"product_id": str(i), "name": f"{rng.choice(NAMES)} {rng.choice(NAMES)}",
+                   "description": f"A {rng.choice(TAGS)} thing", "category": rng.choice(CATEGORIES),
+                   "tags": rng.sample(TAGS, rng.randint(0, 3)), "target_audience": rng.sample(AUDIENCES, 2)}
+        if i % 11:
+            product["price"] = prices[i]  # with some unpriced products
+        products.append(product)
+    return products
+
+
+def brute_force(products, q="", category=None, tag=None, audience=None, min_price=None, max_price=None,
+                sort=""):
+    """The ids a linear scan finds, in the order search() should return them."""
+    def text(product):
+        return {w for field in ("name", "description", "category", "tags", "target_audience")
+                for value in as_list(product.get(field)) for w in words(value)}
+
+    def lowered(values):
+        return {str(value).lower() for value in as_list(values)}
+
+    found = []
+    for product in products:
+        price = float(product["price"]) if "price" in product else np.nan
+        if not set(words(q)) <= text(product):
+            continue
+        if category and category.lower() not in lowered(product["category"]):
+            continue
+        if tag and tag.lower() not in lowered(product["tags"]):
+            continue
+        if audience and audience.lower() not in lowered(product["target_audience"]):
+            continue
+        if (min_price is not None or max_price is not None) and not (
+                (min_price is None or price >= min_price) and (max_price is None or price <= max_price)):
+            continue
+        found.append((int(product["product_id"]), price, product["product_id"]))
+    if sort == "price":
+        found.sort(key=lambda f: (np.isnan(f[1]), f[1], f[0]))
+    elif sort == "-price":
+        found.sort(key=lambda f: (np.isnan(f[1]), -f[1] if not np.isnan(f[1]) else 0, f[0]))
+    return [product_id for _, _, product_id in found]
+
+
+QUERIES = [
+    {},
+    {"q": "boat"},
+    {"q": "lamp speaker"},
+    {"q": "LAMP", "category": "home"},
+    {"tag": "wireless", "audience": "Students"},
+    {"min_price": 1000, "max_price": 2500},
+    {"max_price": 800, "sort": "price"},
+    {"sort": "-price"},
+    {"sort": "price"},
+    {"q": "watch", "min_price": 2000, "sort": "-price"},
+    {"category": "Books", "tag": "gift", "sort": "price"},
+    {"q": "nosuchword"},
+]
+
+
+@pytest.mark.parametrize("query", QUERIES, ids=str)
+def test_search_matches_a_linear_scan(query):
+    products = random_products(300)
+    index = ProductIndex()
+    index.update(products)
+    expected = brute_force(products, **query)
+    total, ids = index.search(limit=1000, **query)
+    assert (total, ids) == (len(expected), expected)
+
+    # Pages concatenate back to the full result
+    pages = [index.search(limit=25, offset=offset, **query)[1] for offset in range(0, len(expected), 25)]
+    assert sum(pages, []) == expected
+
+
+def test_updates_and_removals_touch_only_their_products():
+    products = random_products(200)
+    index = ProductIndex()
+    index.update(products)
+    index.search("boat", sort="price")  # builds the cached lists a change has to invalidate
+
+    changed = dict(products[5], name="Zeppelin", price=1)
+    products[5] = changed
+    removed = [products.pop(10)["product_id"], products.pop(20)["product_id"]]
+    added = {"product_id": "new", "name": "Zeppelin deluxe", "category": "Home", "price": 99999}
+    index.update([changed, added], removed)
+    products.append(added)
+
+    assert len(index) == 199
+    assert index.search("zeppelin", sort="price") == (2, ["5", "new"])
+    boats = brute_force(products, q="boat")
+    assert index.search("boat", limit=1000) == (len(boats), boats)
+    assert index.search(sort="-price", limit=1)[1] == ["new"]
+    assert not set(removed) & set(index.search(limit=1000)[1])
+
+    # Freed doc ids are reused without leaking the removed product's words
+    index.update([{"product_id": "reused", "name": "Plain"}])
+    assert index.search("plain") == (1, ["reused"])
+    index.remove(["reused", "new"])
+    assert index.search("plain") == (0, []) and len(index) == 198
+
+
+def test_bad_sort_is_rejected():
+    with pytest.raises(ValueError):
+        ProductIndex().search(sort="name")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    backend = MemoryBackend(app.model)
+    catalog = ProductCatalog(lambda: backend.list_products(), refresh_interval=0)
+    index = ProductIndex()
+    catalog.on_change(lambda changed, removed: index.update(changed.values(), removed))
+    monkeypatch.setattr(app, "backend", backend)
+    monkeypatch.setattr(app, "catalog", catalog)
+    monkeypatch.setattr(app, "product_index", index)
+    return app.app.test_client()
+
+
+def test_search_route(client):
+    everything = client.get("/products/search?limit=100").get_json()
+    assert everything["total"] == len(app.backend.list_products())
+
+    wireless = client.get("/products/search?q=wireless&sort=price").get_json()
+    prices = [p["price"] for p in wireless["products"]]
+    assert wireless["total"] == len(prices) > 0 and prices == sorted(prices)
+
+    # The index follows catalog reloads
+    app.backend.products["1"]["name"] = "Zeppelin"
+    app.catalog.refresh()
+    assert [p["product_id"] for p in client.get("/products/search?q=zeppelin").get_json()["products"]] == ["1"]
+
+    assert client.get("/products/search?sort=name").status_code == 400
+    assert client.get("/products/search?min_price=cheap").status_code == 400
+    assert client.get("/products/search?offset=-1").status_code == 400
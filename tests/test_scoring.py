@@ -0,0 +1,66 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from benchmarks.fake_aws import FakeTable
+from dynamo_scan import parallel_scan, scan_activity
+from scoring import FEATURES, LinearCampaignModel, load_dataset_features, select_targets
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "campaign_model.pkl")
+
+# The model was fit on a DataFrame; plain arrays are what the app passes too
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope="module")
+def sklearn_model():
+    with open(MODEL_PATH, "rb") as f:
+        return pickle.load(f)
+
+
+@pytest.fixture(scope="module")
+def features():
+    rng = np.random.default_rng(0)
+    # The training rows plus random ones well outside them
+    extremes = np.column_stack([rng.integers(0, high, 5000) for high in (200, 200, 100, 1000, 500)])
+    return np.vstack([load_dataset_features(), extremes]).astype(np.float64)
+
+
+def test_vectorized_predict_matches_sklearn(sklearn_model, features):
+    compiled = LinearCampaignModel(sklearn_model)
+    np.testing.assert_array_equal(compiled.predict(features), sklearn_model.predict(features))
+
+
+def test_single_row_predict_matches_sklearn(sklearn_model, features):
+    compiled = LinearCampaignModel(sklearn_model)
+    for row in features[:50]:
+        np.testing.assert_array_equal(compiled.predict(row), sklearn_model.predict(row.reshape(1, -1)))
+
+
+@pytest.mark.parametrize("segment", [0, 1, 2, 3])
+def test_select_targets_matches_per_user_sklearn(sklearn_model, features, segment):
+    items = [(str(i), dict(zip(FEATURES, row.tolist()))) for i, row in enumerate(features)]
+    expected = []
+    for (user_id, activity), (send, profile) in zip(items, sklearn_model.predict(features)):
+        # The launch rule, one user at a time
+        if profile == segment and (send == 1 or activity["total_visits"] >= 2):
+            expected.append(user_id)
+    compiled = LinearCampaignModel(sklearn_model)
+    assert list(select_targets(compiled, items, segment, chunk_size=777)) == expected
+
+
+def test_parallel_scan_yields_every_item_once():
+    table = FakeTable("UserActivity", "user_id", page_items=37)
+    table.load({"user_id": str(i), **{f: i % 7 for f in FEATURES}} for i in range(2000))
+    seen = [item["user_id"] for page in parallel_scan(table, segments=4) for item in page]
+    assert sorted(seen) == sorted(str(i) for i in range(2000))
+
+
+def test_scan_activity_projects_model_features():
+    table = FakeTable("UserActivity", "user_id", page_items=50)
+    table.load({"user_id": str(i), "username": "x", **{f: 1 for f in FEATURES}} for i in range(120))
+    pairs = list(scan_activity(table, segments=3))
+    assert len(pairs) == 120
+    assert all(set(activity) <= set(FEATURES) | {"user_id"} for _, activity in pairs)